@@ -1 +1 @@
-__all__ = ["multiplex_structures","citation_net"]
\ No newline at end of file
+__all__ = ["multiplex_structures","citation_net","array_utils","dates","bipartite_index","social_bias","snapshot","id_table","db_stream","pipeline","sharded_reader","collab_builder","collab_timeline","collab_distances","citation_trajectory","property_mapping","neighbourhood","time_views"]
\ No newline at end of file
@@ -0,0 +1,136 @@
+#!/usr/bin/python
+
+##Author: Rene Pfitzner
+##Updates: Vahan Nanumyan
+
+#This module implements numpy helpers shared by the bulk (array based) code paths
+
+import itertools
+import numpy
+
+
+################################################################
+## Function to get the edges of a graph as arrays
+def edge_arrays(graph):
+    '''Returns source, target and edge index arrays of all edges of graph.'''
+    try:
+        edges = graph.get_edges([graph.edge_index])
+    except TypeError: #older graph-tool versions always return the edge index as third column
+        edges = graph.get_edges()
+    edges = numpy.asarray(edges, dtype=numpy.int64).reshape(-1, 3)
+    return edges[:, 0], edges[:, 1], edges[:, 2]
+
+
+def in_edge_arrays(graph, vertices):
+    '''Returns, for every in-edge of the vertices (indices) of graph, the position of its target in vertices and its edge index.'''
+    vertices = numpy.asarray(vertices, dtype=numpy.int64)
+    if len(vertices) == 0:
+        return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+    #only vertices with in-edges are visited
+    degrees = numpy.asarray(graph.get_in_degrees(vertices), dtype=numpy.int64)
+    cited = numpy.flatnonzero(degrees > 0)
+    index = [numpy.zeros(0, dtype=numpy.int64)]
+    for v in vertices[cited]:
+        try:
+            edges = graph.get_in_edges(v, [graph.edge_index])
+        except TypeError: #older graph-tool versions always return the edge index as third column
+            edges = graph.get_in_edges(v)
+        index.append(numpy.asarray(edges, dtype=numpy.int64).reshape(-1, 3)[:, 2])
+    return numpy.repeat(cited, degrees[cited]), numpy.concatenate(index)
+
+
+################################################################
+## Function to find unique values in order of their first appearance
+def unique_first(values):
+    '''
+    Returns the unique values of the array values in order of first appearance,
+    the positions of these first appearances, and the inverse mapping of values into the unique values.
+    '''
+    uniq, first, inv = numpy.unique(values, return_index=True, return_inverse=True)
+    order = numpy.argsort(first, kind='mergesort')
+    rank = numpy.empty(len(order), dtype=numpy.int64)
+    rank[order] = numpy.arange(len(order), dtype=numpy.int64)
+    return uniq[order], first[order], rank[inv]
+
+
+################################################################
+## Function to encode pairs of vertex indices as single integer keys
+def pair_keys(source, target, n):
+    '''Returns int64 keys source*n+target for pairs of vertex indices smaller than n.'''
+    return numpy.asarray(source, dtype=numpy.int64) * numpy.int64(n) + numpy.asarray(target, dtype=numpy.int64)
+
+
+################################################################
+## Function to expand rows of a CSR structure
+def ragged_ranges(indptr, rows):
+    '''
+    Returns, for every entry of the CSR rows rows (given by indptr), the position of its row in rows and its index into the CSR indices.
+    '''
+    rows = numpy.asarray(rows, dtype=numpy.int64)
+    return ranges(indptr[rows], indptr[rows + 1])
+
+
+def ranges(starts, ends):
+    '''Returns, for every position in the ranges starts[i] <= position < ends[i], the index i of its range and the position.'''
+    starts = numpy.asarray(starts, dtype=numpy.int64)
+    lengths = numpy.asarray(ends, dtype=numpy.int64) - starts
+    row_of = numpy.repeat(numpy.arange(len(starts), dtype=numpy.int64), lengths)
+    offsets = numpy.arange(len(row_of), dtype=numpy.int64) - numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+    return row_of, numpy.repeat(starts, lengths) + offsets
+
+
+################################################################
+## Function to build CSR row pointers
+def indptr_of(rows, n_rows):
+    '''Returns the CSR row pointer for entries with the (sorted) row indices rows.'''
+    indptr = numpy.zeros(n_rows + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(numpy.asarray(rows, dtype=numpy.int64), minlength=n_rows), out=indptr[1:])
+    return indptr
+
+
+################################################################
+## Function to test membership in a sorted array
+def in_sorted(values, sorted_values):
+    '''Returns a boolean mask of the entries of values contained in the sorted array sorted_values.'''
+    values = numpy.asarray(values)
+    if len(sorted_values) == 0:
+        return numpy.zeros(values.shape, dtype=bool)
+    i = numpy.searchsorted(sorted_values, values)
+    i[i == len(sorted_values)] = 0
+    return sorted_values[i] == values
+
+
+def searchsorted_ranges(sorted_values, starts, ends, values):
+    '''
+    Returns, for every i, the first position in starts[i] <= position < ends[i] with sorted_values[position] >= values[i] (ends[i] if none),
+    the ranges of sorted_values being sorted each. Bisects all ranges at once.
+    '''
+    lo = numpy.array(starts, dtype=numpy.int64)
+    hi = numpy.array(ends, dtype=numpy.int64)
+    values = numpy.asarray(values)
+    active = numpy.flatnonzero(lo < hi)
+    while len(active) > 0:
+        mid = (lo[active] + hi[active]) // 2
+        right = sorted_values[mid] < values[active]
+        lo[active[right]] = mid[right] + 1
+        hi[active[~right]] = mid[~right]
+        active = active[lo[active] < hi[active]]
+    return lo
+
+
+################################################################
+## Functions to read delimited text files in chunks
+def line_chunks(f, chunk_size):
+    '''Generator of lists of at most chunk_size lines of the open file f, blank lines are skipped as by sharded_reader.'''
+    lines = (line for line in f if line.strip() != '')
+    while True:
+        chunk = list(itertools.islice(lines, chunk_size))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+
+def split_columns(lines, delimiter, columns):
+    '''Returns a tuple with one string array per column index in columns of the delimited lines, stripped of trailing whitespace.'''
+    tmp = [line.split(delimiter) for line in lines]
+    return tuple(numpy.array([x[column].rstrip() for x in tmp]) for column in columns)
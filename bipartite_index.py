@@ -0,0 +1,237 @@
+#!/usr/bin/python
+
+##Author: Rene Pfitzner
+##Updates: Vahan Nanumyan
+
+#This module implements the interlayer links of the paper-author multiplex as a compact bipartite index.
+#Links are stored twice in CSR form (paper->authors and author->papers) using int32 vertex indices.
+#Links added one at a time are kept in a small pending buffer; new links are merged into the CSR arrays as sorted runs.
+
+import numpy
+
+import array_utils
+
+
+class BipartiteIndex():
+    'Paper-author incidence stored as two CSR arrays of int32 vertex indices'
+
+################################################################
+    #Initialize empty index
+    def __init__(self,n_papers=0,n_authors=0):
+        self.n_papers=int(n_papers)
+        self.n_authors=int(n_authors)
+
+        #paper->authors: authors of paper p are paper_authors[paper_ptr[p]:paper_ptr[p+1]], sorted
+        self.paper_ptr=numpy.zeros(self.n_papers+1,dtype=numpy.int64)
+        self.paper_authors=numpy.zeros(0,dtype=numpy.int32)
+        #author->papers
+        self.author_ptr=numpy.zeros(self.n_authors+1,dtype=numpy.int64)
+        self.author_papers=numpy.zeros(0,dtype=numpy.int32)
+
+        #builder for incremental appends, merged into the CSR arrays by compact()
+        self._pending_authors_of={}
+        self._pending_papers_of={}
+        self._n_pending=0
+        self.min_pending=1<<16
+
+
+################################################################
+    ##
+    #Function to create an index from arrays of links
+    @classmethod
+    def from_pairs(cls,papers,authors,n_papers=0,n_authors=0):
+        '''Returns an index holding the links papers[i]-authors[i], duplicates are dropped.'''
+        index=cls(n_papers,n_authors)
+        index.add_many(papers,authors)
+        return index
+
+
+    ##
+    #Function to create an index from its CSR arrays
+    @classmethod
+    def from_csr(cls,paper_ptr,paper_authors,author_ptr,author_papers):
+        '''Returns an index using the given CSR arrays (e.g. memory mapped) without copying them.'''
+        index=cls()
+        index.paper_ptr=paper_ptr
+        index.paper_authors=paper_authors
+        index.author_ptr=author_ptr
+        index.author_papers=author_papers
+        index.n_papers=len(paper_ptr)-1
+        index.n_authors=len(author_ptr)-1
+        return index
+
+
+################################################################
+    ##
+    #Function to enlarge the vertex ranges
+    def resize(self,n_papers,n_authors):
+        '''Enlarge the index to hold n_papers papers and n_authors authors.'''
+        if n_papers>self.n_papers:
+            self.paper_ptr=numpy.concatenate((self.paper_ptr,numpy.repeat(self.paper_ptr[-1],n_papers-self.n_papers)))
+            self.n_papers=int(n_papers)
+        if n_authors>self.n_authors:
+            self.author_ptr=numpy.concatenate((self.author_ptr,numpy.repeat(self.author_ptr[-1],n_authors-self.n_authors)))
+            self.n_authors=int(n_authors)
+
+
+################################################################
+    ##
+    #Functions to add links
+    def add(self,paper,author):
+        '''Add the link paper-author (vertex indices). Returns False if the link exists already.'''
+        paper=int(paper)
+        author=int(author)
+        if self.has(paper,author):
+            return False
+
+        self._pending_authors_of.setdefault(paper,[]).append(author)
+        self._pending_papers_of.setdefault(author,[]).append(paper)
+        self._n_pending+=1
+        if self._n_pending>max(self.min_pending,len(self.paper_authors)//2):
+            self.compact()
+        return True
+
+
+    def add_many(self,papers,authors):
+        '''Add the links papers[i]-authors[i] (arrays of vertex indices), existing and duplicate links are dropped.'''
+        papers=numpy.asarray(papers,dtype=numpy.int64).ravel()
+        authors=numpy.asarray(authors,dtype=numpy.int64).ravel()
+        self._merge(papers,authors)
+
+
+    def compact(self):
+        '''Merge all pending links into the CSR arrays.'''
+        if self._n_pending>0:
+            self._merge(numpy.zeros(0,dtype=numpy.int64),numpy.zeros(0,dtype=numpy.int64))
+
+
+    def _merge(self,papers,authors):
+        #merge the pending links and the new links into both CSR arrays
+        if self._n_pending>0:
+            pending_papers=numpy.repeat(numpy.fromiter(self._pending_authors_of.keys(),dtype=numpy.int64,count=len(self._pending_authors_of)),
+                                        [len(x) for x in self._pending_authors_of.values()])
+            pending_authors=numpy.fromiter((a for x in self._pending_authors_of.values() for a in x),dtype=numpy.int64,count=self._n_pending)
+            papers=numpy.concatenate((papers,pending_papers))
+            authors=numpy.concatenate((authors,pending_authors))
+            self._pending_authors_of={}
+            self._pending_papers_of={}
+            self._n_pending=0
+        if len(papers)==0:
+            return
+        self.resize(int(papers.max())+1,int(authors.max())+1)
+
+        #sorted run of distinct links not existing already
+        keys=numpy.unique((papers<<32)|authors)
+        papers=keys>>32
+        authors=keys&0xffffffff
+        ends=self.paper_ptr[papers+1]
+        pos=array_utils.searchsorted_ranges(self.paper_authors,self.paper_ptr[papers],ends,authors)
+        exists=pos<ends
+        exists[exists]=self.paper_authors[pos[exists]]==authors[exists]
+        papers,authors,pos=papers[~exists],authors[~exists],pos[~exists]
+        if len(papers)==0:
+            return
+
+        #insert the run into the rows of both CSR arrays, rows are shifted by the number of links inserted before them
+        self.paper_authors=numpy.insert(self.paper_authors,pos,authors.astype(numpy.int32))
+        self.paper_ptr=self.paper_ptr+array_utils.indptr_of(papers,self.n_papers)
+        order=numpy.lexsort((papers,authors))
+        papers=papers[order]
+        authors=authors[order]
+        pos=array_utils.searchsorted_ranges(self.author_papers,self.author_ptr[authors],self.author_ptr[authors+1],papers)
+        self.author_papers=numpy.insert(self.author_papers,pos,papers.astype(numpy.int32))
+        self.author_ptr=self.author_ptr+array_utils.indptr_of(authors,self.n_authors)
+
+
+################################################################
+    ##
+    #Functions to query links
+    def has(self,paper,author):
+        '''True if the link paper-author exists.'''
+        if paper<self.n_papers:
+            row=self.paper_authors[self.paper_ptr[paper]:self.paper_ptr[paper+1]]
+            i=numpy.searchsorted(row,author)
+            if i<len(row) and row[i]==author:
+                return True
+        return author in self._pending_authors_of.get(paper,())
+
+
+    def authors_of(self,paper):
+        '''Returns an int32 array of the authors of paper (vertex index).'''
+        paper=int(paper)
+        if paper<self.n_papers:
+            row=self.paper_authors[self.paper_ptr[paper]:self.paper_ptr[paper+1]]
+        else:
+            row=self.paper_authors[:0]
+        if paper in self._pending_authors_of:
+            row=numpy.concatenate((row,numpy.array(self._pending_authors_of[paper],dtype=numpy.int32)))
+        return row
+
+
+    def papers_of(self,author):
+        '''Returns an int32 array of the papers of author (vertex index).'''
+        author=int(author)
+        if author<self.n_authors:
+            row=self.author_papers[self.author_ptr[author]:self.author_ptr[author+1]]
+        else:
+            row=self.author_papers[:0]
+        if author in self._pending_papers_of:
+            row=numpy.concatenate((row,numpy.array(self._pending_papers_of[author],dtype=numpy.int32)))
+        return row
+
+
+    def n_authors_of(self,papers):
+        '''Returns an array with the number of authors of every paper in the array papers.'''
+        self.compact()
+        return _row_lengths(self.paper_ptr,papers)
+
+
+    def n_papers_of(self,authors):
+        '''Returns an array with the number of papers of every author in the array authors.'''
+        self.compact()
+        return _row_lengths(self.author_ptr,authors)
+
+
+    def paper_csr(self,n_papers=None):
+        '''Returns indptr and indices of the paper->authors CSR arrays, indptr padded to n_papers rows.'''
+        self.compact()
+        if n_papers is not None:
+            self.resize(n_papers,self.n_authors)
+        return self.paper_ptr,self.paper_authors
+
+
+    def author_csr(self,n_authors=None):
+        '''Returns indptr and indices of the author->papers CSR arrays, indptr padded to n_authors rows.'''
+        self.compact()
+        if n_authors is not None:
+            self.resize(self.n_papers,n_authors)
+        return self.author_ptr,self.author_papers
+
+
+    def pairs(self):
+        '''Returns arrays of papers and authors of all links.'''
+        papers=numpy.repeat(numpy.arange(self.n_papers,dtype=numpy.int64),numpy.diff(self.paper_ptr))
+        authors=self.paper_authors.astype(numpy.int64)
+        if self._n_pending>0:
+            pending_papers=numpy.repeat(numpy.fromiter(self._pending_authors_of.keys(),dtype=numpy.int64,count=len(self._pending_authors_of)),
+                                        [len(x) for x in self._pending_authors_of.values()])
+            pending_authors=numpy.fromiter((a for x in self._pending_authors_of.values() for a in x),dtype=numpy.int64,count=self._n_pending)
+            papers=numpy.concatenate((papers,pending_papers))
+            authors=numpy.concatenate((authors,pending_authors))
+        return papers,authors
+
+
+    def __len__(self):
+        return len(self.paper_authors)+self._n_pending
+
+
+##################################################################################################################
+#Define module-wide functions
+
+def _row_lengths(indptr,rows):
+    #number of entries of rows, 0 for rows beyond the index
+    rows=numpy.asarray(rows,dtype=numpy.int64)
+    lengths=numpy.zeros(len(rows),dtype=numpy.int64)
+    inside=rows<len(indptr)-1
+    lengths[inside]=indptr[rows[inside]+1]-indptr[rows[inside]]
+    return lengths
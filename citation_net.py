@@ -11,11 +11,20 @@ import csv
 import itertools
 import random
 import time
+import copy
+import numpy
+import multiprocessing
 
 import psycopg2
 import sys
 import datetime
-from dateutil import parser
+
+import array_utils
+import dates
+import db_stream
+import id_table
+import sharded_reader
+from pipeline import pipelined
 ######################################################################################################
 
 class PaperCitationNet():
@@ -25,14 +34,33 @@ class PaperCitationNet():
     def __init__(self):
         #create empty citation_net
         self.graph = gt.Graph(directed=True)
-        self.graph.vertex_properties['year']=self.graph.new_vertex_property('object')
+        self.graph.vertex_properties['year']=self.graph.new_vertex_property(dates.DATE_TYPE)
         self.graph.vertex_properties['_graphml_vertex_id']=self.graph.new_vertex_property('string')
-        self.graph.edge_properties['year']=self.graph.new_edge_property('object')        
+        self.graph.edge_properties['year']=self.graph.new_edge_property(dates.DATE_TYPE)
+        
+        #paper id -> vertex index
+        self._citation_ids = id_table.InternTable()
         
-        self._citation_graphml_vertex_id_to_gt_id = {}
+        #sorted keys of the citations for bulk inserts, see _citation_key_index()
+        self._citation_keys = None
     
 ###############################################################
-    def read_edgelist(self,citation_file,delimiter=' ',cited_column=0,citing_column=1,header=True):
+    def read_edgelist(self,citation_file,delimiter=' ',cited_column=0,citing_column=1,header=True,bulk=False,chunk_size=1000000,pipeline=False,processes=1):
+        '''
+        Reads citations from an edge list file.
+        With bulk=True the file is read in chunks of chunk_size lines and all citations are inserted at once, 
+        with the same result as the line by line reader.
+        With pipeline=True (implies bulk=True) the chunks are read and split by a producer thread while the previous chunk is mapped to vertices.
+        With processes!=1 (None for all cores) the file is parsed in parallel by worker processes, see sharded_reader.parse_file.
+        '''
+        if processes!=1:
+            tables,indices,ordinals=sharded_reader.parse_file(citation_file,delimiter,[[cited_column,citing_column]],header=header,processes=processes)
+            gt_ids=self._paper_gt_ids_of(tables[0])[indices[0]]
+            self._add_citation_arrays(gt_ids[:,0],gt_ids[:,1])
+            return
+        if bulk==True or pipeline==True:
+            self._read_edgelist_bulk(citation_file,delimiter,cited_column,citing_column,header,chunk_size,pipeline)
+            return
         
         with open(citation_file,'r') as f:
             if header==True:
@@ -41,6 +69,9 @@ class PaperCitationNet():
             t_prev=time.time()
             t_cum=0
             for line in f:
+                #blank lines are skipped, as by the bulk and parallel readers
+                if line.strip()=='':
+                    continue
                 cou+=1
                 if cou-10000*(cou/10000)==0:
                     print 'Lines read: '+str(cou)
@@ -71,7 +102,39 @@ class PaperCitationNet():
                     #print "should be new: "+cited_paper+' '+citing_paper
                     pass
                     
+    ##
+    #Bulk version of read_edgelist
+    def _read_edgelist_bulk(self,citation_file,delimiter,cited_column,citing_column,header,chunk_size,pipeline=False):
+        cited_chunks=[]
+        citing_chunks=[]
+        with open(citation_file,'r') as f:
+            if header==True:
+                header_text=f.readline()
+            split=lambda lines: array_utils.split_columns(lines,delimiter,[cited_column,citing_column])
+            if pipeline==True:
+                chunks=pipelined(array_utils.line_chunks(f,chunk_size),split)
+            else:
+                chunks=itertools.imap(split,array_utils.line_chunks(f,chunk_size))
             
+            cou=0
+            t_prev=time.time()
+            t_cum=0
+            for cited_papers,citing_papers in chunks:
+                cou+=len(cited_papers)
+                
+                #map paper ids to vertex indices, creating missing papers in order of appearance
+                cited_gt,citing_gt=self._paper_gt_ids(cited_papers,citing_papers)
+                cited_chunks.append(cited_gt)
+                citing_chunks.append(citing_gt)
+                
+                print 'Lines read: '+str(cou)
+                t=time.time()
+                t_cum+=t-t_prev
+                t_prev=t
+                print 'Time passed: '+str(t_cum)
+        
+        if len(cited_chunks)>0:
+            self._add_citation_arrays(numpy.concatenate(cited_chunks),numpy.concatenate(citing_chunks))
         
         
 ###############################################################    
@@ -81,11 +144,9 @@ class PaperCitationNet():
 ###############################################################
     def read_graphml(self,citation_file,citation_meta):
         self.graph = gt.load_graph(citation_file)
-        self.graph.vertex_properties['year']=self.graph.new_vertex_property('object')
+        self.graph.vertex_properties['year']=self.graph.new_vertex_property(dates.DATE_TYPE)
         
-        self._citation_graphml_vertex_id_to_gt_id = {}
-        for v in self.graph.vertices(): 
-            self._citation_graphml_vertex_id_to_gt_id[self.graph.vertex_properties['_graphml_vertex_id'][v]]=int(self.graph.vertex_index[v])
+        self._citation_ids = id_table.InternTable.from_strings([self.graph.vertex_properties['_graphml_vertex_id'][v] for v in self.graph.vertices()])
         
         f=open(citation_meta,'r')
         dialect=csv.Sniffer().sniff(f.readline())
@@ -106,24 +167,42 @@ class PaperCitationNet():
                 year = int(tmp[2].rstrip())
                 year = parse_date(year)
 
-                try:
-                    paper_obj = self.graph.vertex(self._citation_graphml_vertex_id_to_gt_id[paper_tmp])
-                except KeyError:
+                paper_gt = self._citation_ids.index(paper_tmp)
+                if paper_gt>=0:
+                    paper_obj = self.graph.vertex(paper_gt)
+                else:
                     paper_obj = self.add_paper(paper_tmp,year)    
                 
-                self.graph.vertex_properties['year'][paper_obj]=year
+                self.graph.vertex_properties['year'][paper_obj]=dates.to_ordinal(year)
         
-        self.min_year=min(self.graph.vertex_properties['year'].get_array())
-        self.max_year=max(self.graph.vertex_properties['year'].get_array())
+        self.min_year,self.max_year=dates.year_span(self.graph.vertex_properties['year'].a)
 
 
 
 ###############################################################
     # CIT - Add a method to read from database
-    def read_db(self, conn, sql, cited_column=1, citing_column=0):
-        """CITING and CITED defaults are the opposite of read_edgelist()!"""
+    def read_db(self, conn, sql, cited_column=1, citing_column=0, stream=False, batch_size=100000, pipeline=False):
+        """
+        CITING and CITED defaults are the opposite of read_edgelist()!
+        With stream=True the rows are fetched in batches of batch_size rows from a server side cursor
+        and every batch is inserted at once, conn may then also be an open DB-API connection.
+        With pipeline=True (implies stream=True) batches are fetched and decoded by a producer thread while the previous batch is inserted.
+        """
         print 'Make sure that the SQL query returns cited-doi, citing-doi rows'
 
+        if stream==True or pipeline==True:
+            batches=db_stream.fetch_batches(conn,sql,batch_size)
+            decode=lambda rows: (numpy.array([row[cited_column].rstrip() for row in rows]),
+                                 numpy.array([row[citing_column].rstrip() for row in rows]))
+            if pipeline==True:
+                batches=pipelined(batches,decode)
+            else:
+                batches=itertools.imap(decode,batches)
+            for cited_papers,citing_papers in batches:
+                cited_gt,citing_gt=self._paper_gt_ids(cited_papers,citing_papers)
+                self._add_citation_arrays(cited_gt,citing_gt)
+            return
+
         conn = psycopg2.connect( **conn )
         cur = conn.cursor()
         cur.execute( sql )
@@ -171,17 +250,14 @@ class PaperCitationNet():
     def add_paper(self,paper_id,year):
         '''Add a paper with paper_id (str), publication year (any standard date format)'''    
         #try whether paper exists already in citation network
-        try:
-            self._citation_graphml_vertex_id_to_gt_id[paper_id]
+        if paper_id in self._citation_ids:
             raise PaperIDExistsAlreadyError() #stop execution here with this error
-        except KeyError:
-            pass
     
         #add new paper to citation network and additional data structures
         new_paper=self.graph.add_vertex()
-        self._citation_graphml_vertex_id_to_gt_id[paper_id]=self.graph.vertex_index[new_paper]
+        self._citation_ids.append(paper_id)
         self.graph.vertex_properties['_graphml_vertex_id'][new_paper]=paper_id
-        self.graph.vertex_properties['year'][new_paper]=parse_date(year)
+        self.graph.vertex_properties['year'][new_paper]=dates.parse_ordinal(year)
         return new_paper
     
 
@@ -190,14 +266,9 @@ class PaperCitationNet():
     #Funtion to add citation to citation network
     def add_citation(self,cited_paper,citing_paper):
         '''Add citation between two paper in citation network.'''
-        try:
-            cited_paper_gt=self._citation_graphml_vertex_id_to_gt_id[cited_paper]
-        except KeyError:
-            raise NoSuchPaperError()
-        
-        try:
-            citing_paper_gt=self._citation_graphml_vertex_id_to_gt_id[citing_paper]
-        except KeyError:
+        cited_paper_gt=self._citation_ids.index(cited_paper)
+        citing_paper_gt=self._citation_ids.index(citing_paper)
+        if cited_paper_gt<0 or citing_paper_gt<0:
             raise NoSuchPaperError()
 
         if self.graph.edge(cited_paper_gt,citing_paper_gt)==None:
@@ -209,13 +280,97 @@ class PaperCitationNet():
             raise CitationExistsAlreadyError()
 
 
+    ################################################################
+    ##
+    #Function to add many citations at once
+    def add_citations_many(self,cited_papers,citing_papers):
+        '''
+        Add citations between the papers in the sequences cited_papers and citing_papers (str). 
+        Missing papers are added without year, existing and duplicate citations are dropped.
+        '''
+        cited_gt,citing_gt=self._paper_gt_ids(numpy.asarray(cited_papers),numpy.asarray(citing_papers))
+        self._add_citation_arrays(cited_gt,citing_gt)
+
+
+    ##
+    #Helper function mapping paper id arrays to vertex indices, adding missing papers
+    def _paper_gt_ids(self,cited_papers,citing_papers):
+        #papers are added in the order in which they appear, i.e. cited paper before citing paper per row
+        all_papers=numpy.column_stack((cited_papers,citing_papers)).ravel()
+        uniq,first,inverse=array_utils.unique_first(all_papers)
+        gt_ids=self._paper_gt_ids_of(uniq)[inverse].reshape(-1,2)
+        return gt_ids[:,0],gt_ids[:,1]
+
+
+    ##
+    #Helper function mapping an array of distinct paper ids to vertex indices, missing papers are added in the order of the array
+    def _paper_gt_ids_of(self,uniq):
+        uniq=uniq.tolist()
+        gt_ids=self._citation_ids.lookup_many(uniq)
+        new_papers=numpy.flatnonzero(gt_ids<0)
+        
+        if len(new_papers)>0:
+            n_old=self.graph.num_vertices()
+            new_ids=[uniq[k] for k in new_papers.tolist()]
+            gt_ids[new_papers]=self._citation_ids.extend(new_ids)
+            self.graph.add_vertex(len(new_papers))
+            vertex_id=self.graph.vertex_properties['_graphml_vertex_id']
+            for v in xrange(n_old,n_old+len(new_ids)):
+                vertex_id[self.graph.vertex(v)]=self._citation_ids[v]
+        return gt_ids
+
+
+    ##
+    #Helper function inserting citations given as vertex index arrays
+    def _add_citation_arrays(self,cited_gt,citing_gt):
+        #keep first occurrence of every citation only
+        keys=_citation_keys(cited_gt,citing_gt)
+        keys,first,inverse=array_utils.unique_first(keys)
+        
+        #drop citations existing already
+        old_keys=self._citation_key_index()
+        keys=keys[~array_utils.in_sorted(keys,old_keys)]
+        if len(keys)==0:
+            return
+        
+        n_old=self.graph.num_edges()
+        contiguous=self.graph.edge_index_range==n_old
+        self.graph.add_edge_list(numpy.column_stack((keys>>32,keys&0xffffffff)))
+        
+        #citations inherit the year of the citing paper, new edges follow the old ones unless edges were removed before
+        year=self.graph.edge_properties['year']
+        if contiguous:
+            year.a[n_old:n_old+len(keys)]=self.graph.vertex_properties['year'].a[keys&0xffffffff]
+        else:
+            source,target,index=array_utils.edge_arrays(self.graph)
+            new=array_utils.in_sorted(_citation_keys(source,target),numpy.sort(keys))
+            year.a[index[new]]=self.graph.vertex_properties['year'].a[target[new]]
+        
+        #merge the sorted new keys into the index
+        keys=numpy.sort(keys)
+        self._citation_keys=numpy.insert(old_keys,numpy.searchsorted(old_keys,keys),keys)
+        self._citation_keys_state=(id(self.graph),self.graph.num_edges())
+
+
+    ##
+    #Helper function returning the sorted keys of all citations (see _citation_keys), 
+    #kept by _add_citation_arrays and rebuilt if the citations were changed otherwise
+    def _citation_key_index(self):
+        state=(id(self.graph),self.graph.num_edges())
+        if getattr(self,'_citation_keys',None) is None or self._citation_keys_state!=state:
+            source,target,index=array_utils.edge_arrays(self.graph)
+            self._citation_keys=numpy.sort(_citation_keys(source,target))
+            self._citation_keys_state=state
+        return self._citation_keys
+
+
         
 ################################################################
     ##
     #Function to get vertex_id's from vertex objects
     def vertex_id(self,iterable_of_vertices):
-        'Returns an iterator of vertex id strings of the vertex objects specified in iterable_of_vertices'
-        return itertools.imap(lambda x: self.graph.vertex_properties['_graphml_vertex_id'][x],iterable_of_vertices)
+        'Returns an iterator of vertex id strings of the vertex objects (or vertex indices) specified in iterable_of_vertices'
+        return itertools.imap(lambda x: self._citation_ids[int(x)],iterable_of_vertices)
 
 
 ##########################################################################################################################
@@ -224,234 +379,323 @@ class MolloyReedCitationInstance(PaperCitationNet):
     'A class for Molloy-Reed shuffled citation graphs'
      
 ##########################################################   
-    def __init__(self,citation_net):
-        '''This calculates ONE random alternative multiplex, with citations reshuffled, such that a) time is still respected and b) degrees are kept the same.'''
-        ############
-        
-        #initialize new graph that will hold the shuffled realization
-        self.graph=citation_net.graph.copy()
-        
-        ##first we create the necessary data structures
-        #keep track of empty in- and out-links of nodes in a double dictionary; the outer keys (year), are very few
-        #This will be a few kb data structure, plus content to-be-filled below
-        #outer key: year
-        #inner key: _empty_in_links
-        
-        #self.min_year=min(self.graph.vertex_properties['year'].get_array())
-        #self.max_year=max(self.graph.vertex_properties['year'].get_array())
-        
+    def __init__(self,citation_net,seed=None):
+        '''
+        This calculates ONE random alternative multiplex, with citations reshuffled, such that a) time is still respected and b) degrees are kept the same.
+        seed (int or random.Random) makes the realization reproducible. See shuffle_citations().
+        '''
         self.min_year=citation_net.min_year
         self.max_year=citation_net.max_year
         
-        max_in_degree = int(max(self.graph.degree_property_map('in').get_array()))
-        max_out_degree = int(max(self.graph.degree_property_map('out').get_array()))
-
-        self._empty_in_links={}
-        self._empty_out_links={}
-        
-        for y in range(self.min_year,self.max_year+1):
-            self._empty_in_links[y]={}
-            for k in xrange(max_in_degree+1):
-                self._empty_in_links[y][k]=[]
-            self._empty_out_links[y]={}
-            for k in xrange(max_out_degree+1):
-                self._empty_out_links[y][k]=[]
-    
-        #create property map
-        self._vertex_empty_in_links = self.graph.new_vertex_property('int')
-        self._vertex_empty_out_links = self.graph.new_vertex_property('int')
-    
-        #initialize _empty_in_links and _empty_out_links list as well as property map
-        for v in self.graph.vertices():
-            v_year = self.graph.vertex_properties['year'][v]
-            v_in = v.in_degree()
-            v_out = v.out_degree()
-            if v_in>0:
-                self._empty_in_links[v_year][v.in_degree()].append(v)
-                self._vertex_empty_in_links[v] = v.in_degree()
-            if v_out>0:
-                self._empty_out_links[v_year][v.out_degree()].append(v)
-                self._vertex_empty_out_links[v] = v.out_degree()
+        source,target,index=array_utils.edge_arrays(citation_net.graph)
+        vertex_years=dates.years(citation_net.graph.vertex_properties['year'].a)
+        new_source,new_target=shuffle_citations(source,target,vertex_years,seed)
         
-        #cut all edges
+        #initialize new graph that will hold the shuffled realization
+        self.graph=citation_net.graph.copy()
+        self._citation_ids=copy.deepcopy(citation_net._citation_ids)
         self.graph.clear_edges()
+        self.graph.add_edge_list(numpy.column_stack((new_source,new_target)))
         
-        ###########
-        #then we define internal functions needed for the algorithm
-        ###
-        def select_free_out(year):
-            #get list of list of all youngest nodes with empty out-links (i.e. with k>0 !!)
-            #flatten this list of lists
-            all_youngest = list(itertools.chain.from_iterable(self._empty_out_links[year].values()[1:]))
-            try:
-                x = random.choice(all_youngest)
-                return x
-            except IndexError: #when list is empty
-                raise NoFreeOutLinksError()
-        
-        ###
-        def select_free_in(year,exclude_node):
-            #get list of list of all nodes with empty in-links (i.e. with k>0 !!) from years > year
-            #flatten this list of lists
-            #if no exclude_node list is specified, then select from all possible
-            if exclude_node == None:
-                all_youngest=[]
-                for i in range(year+1,self.max_year+1):
-                    all_youngest.extend(list(itertools.chain.from_iterable(self._empty_in_links[i].values()[1:])))
-                try:
-                    y = random.choice(all_youngest)
-                    return y
-                except IndexError: #when list is empty
-                    raise NoFreeInLinksError()
-            #if exclude_node list is specified, then remove these nodes from the choice
-            else:
-                all_youngest=[]
-                for i in range(year+1,self.max_year+1):
-                    all_youngest.extend(list(itertools.chain.from_iterable(self._empty_in_links[i].values()[1:])))
-                for ex in exclude_node:
-                    try:
-                        all_youngest.remove(ex)
-                    except ValueError:
-                        pass
-                try:
-                    y = random.choice(all_youngest)
-                    return y
-                except IndexError: #when list is empty
-                    raise NoFreeInLinksError()
-                
-                
-        ###
-        def cut(year):
-            all_occupied=[]
-            for i in range(year+1,self.max_year+1):
-                all_occupied.extend(self._empty_in_links[i].values()[0])
-            try:
-                y = random.choice(all_occupied)
-            except IndexError: #when list is empty ... should not be possible ... 
-                raise BadError()
-            
-            #choose an edge
-            all_in_nodes = []
-            for v in y.in_neighbours():
-                all_in_nodes.append(v) 
-            x = random.choice(all_in_nodes)
-            #change empty_link properties
-            y_year=self.graph.vertex_properties['year'][y]
-            
-            self._empty_in_links[y_year][self._vertex_empty_in_links[y]].remove(y)
-            self._vertex_empty_in_links[y]+=1
-            self._empty_in_links[y_year][self._vertex_empty_in_links[y]].append(y)
-            
-            x_year=self.graph.vertex_properties['year'][x]
-            
-            self._empty_out_links[x_year][self._vertex_empty_out_links[x]].remove(x)
-            self._vertex_empty_out_links[x]+=1
-            self._empty_out_links[x_year][self._vertex_empty_out_links[x]].append(x)
-            
-            #remove_edge
-            self.graph.remove_edge(self.graph.edge(x,y))
-            
-            #return            
-            return x,y
-        
-        ##
-        def new_edge(out_link_node,in_link_node):
-            #change empty_in_link and empty_out_link properties accordingly
-            in_link_node_year = self.graph.vertex_properties['year'][in_link_node]
-            
-            self._empty_in_links[in_link_node_year][self._vertex_empty_in_links[in_link_node]].remove(in_link_node)
-            self._vertex_empty_in_links[in_link_node]-=1
-            self._empty_in_links[in_link_node_year][self._vertex_empty_in_links[in_link_node]].append(in_link_node)
-            
-            out_link_node_year = self.graph.vertex_properties['year'][out_link_node]
-            
-            self._empty_out_links[out_link_node_year][self._vertex_empty_out_links[out_link_node]].remove(out_link_node)
-            self._vertex_empty_out_links[out_link_node]-=1
-            self._empty_out_links[out_link_node_year][self._vertex_empty_out_links[out_link_node]].append(out_link_node)
-            
-            #write new edge
-            self.graph.add_edge(out_link_node,in_link_node)
-            
-        
-        ############
-        #then we go on with actually shuffling edges
-        all_years = range(self.min_year,self.max_year+1)
-        try:
-            #find youngest year of nodes that have empty out-links
-            year_index = 0
-            while True:
-                try:
-                    year = all_years[year_index]
-                except IndexError: #Error occurs if all possible years are exhausted
-                    raise ExhaustedPossibleYearsError()
-                    
-                try:
-                    out_link_node = select_free_out(year)
-                
-                    while True:
-                        try:
-                            #exclude self node and all already neighbors from choice of where to link to
-                            exclude_nodes_from_choice=[out_link_node]
-                            exclude_nodes_from_choice.extend(list(out_link_node.out_neighbours()))
-                            in_link_node=select_free_in(year,exclude_nodes_from_choice)
-                            year_index=0
-                            break
-                        except NoFreeInLinksError: #if no older than "year" in-link is free ...
-                            #cut a suitable in-link
-                            in_link_node = cut(year)[1]
-                            year_index=0
-                            break
-
-                    #write new edge
-                    new_edge(out_link_node,in_link_node)
-                
-                except NoFreeOutLinksError: #when list is empty, second line above
-                    year_index+=1
-                #         
-        except ExhaustedPossibleYearsError:
-            print('Finished shuffling!')
-            print ('Old edges:')
-            for e in citation_net.graph.edges():
-                print e
-            print ('New edges:')
-            for e in self.graph.edges():
-                print e
-            check_citation_causality(self.graph)
+        #citations inherit the year of the citing paper
+        source,target,index=array_utils.edge_arrays(self.graph)
+        self.graph.edge_properties['year'].a[index]=self.graph.vertex_properties['year'].a[target]
+        print 'Finished shuffling!'
                 
 ###############################################################################################################################
 ##define global functions
 
+#int64 keys cited << 32 | citing of citations, independent of the number of papers
+def _citation_keys(cited,citing):
+    return (numpy.asarray(cited,dtype=numpy.int64)<<32)|numpy.asarray(citing,dtype=numpy.int64)
+
+
 #check causality constraint of citation network
-def check_citation_causality(citation_net):
+def check_citation_causality(citation_net,as_array=False,remove=False,resolution='date',bias_counter=None):
+    '''
+    Checks that every cited paper is older than the citing paper (citation_net is a citation graph).
+    By default returns a list of strings of the edges with causality problems (None if there are none).
+    With as_array=True, returns the edge indices of the problematic citations and their counts by type, see causality_violations().
+    With remove=True, the problematic citations are removed from citation_net, an edge filter set on it is kept.
+    The removed citations are recorded in bias_counter (social_bias.BiasCounter) if given.
+    resolution='year' compares calendar years instead of dates.
+    '''
     print 'Causality check ...'
-    print 'Returns list of edges with causality problems...'
-    problems = []
-    for e in citation_net.edges():
-        s = e.source()
-        t = e.target()
-        if citation_net.vertex_properties['year'][s]>=citation_net.vertex_properties['year'][t]:
-            problems.append(str(e))
+    source,target,index=array_utils.edge_arrays(citation_net)
+    violating,counts=causality_violations(source,target,citation_net.vertex_properties['year'].a,resolution)
+    problems=index[violating]
     
+    if remove==True and len(problems)>0:
+        keep=citation_net.new_edge_property('bool')
+        keep.a=True
+        keep.a[problems]=False
+        #replace the filter of the caller while purging, its filtered edges are kept
+        edge_filter,inverted=citation_net.get_edge_filter()
+        citation_net.set_edge_filter(keep)
+        citation_net.purge_edges()
+        if edge_filter is not None:
+            citation_net.set_edge_filter(edge_filter,inverted=inverted)
+        else:
+            citation_net.set_edge_filter(None)
+        if bias_counter is not None:
+            bias_counter.remove_citations(source[violating],target[violating])
+        print len(problems), ' citations with causality problems removed.'
+    
+    if as_array==True:
+        return problems,counts
+    
+    print 'Returns list of edges with causality problems...'
     if len(problems)>0:
         print len(problems), ' causality Problems detected!'
-        return problems
+        return ['(%d, %d)' % (s,t) for s,t in itertools.izip(source[violating].tolist(),target[violating].tolist())]
     else:
         print 'No causality problems!'
         return
 
+def causality_violations(source,target,vertex_dates,resolution='date'):
+    '''
+    Returns a boolean mask of the citations source->target that do not go forward in time, 
+    i.e. where the cited paper is not older than the citing paper, and a dictionary counting them by type:
+    'same' (same date, or same year for resolution='year'), 'backwards' (cited paper younger than citing paper) 
+    and 'unknown' (at least one of the dates is unknown).
+    A citation of a paper with unknown date by a paper with known date goes forward in time and is not a violation,
+    the key 'undated' counts all citations with an unknown date at either end, violating or not.
+    vertex_dates are the day ordinals of all papers.
+    '''
+    vertex_dates=numpy.asarray(vertex_dates)
+    if resolution=='year':
+        vertex_dates=dates.years(vertex_dates)
+    cited_dates=vertex_dates[source]
+    citing_dates=vertex_dates[target]
+    violating=cited_dates>=citing_dates
+    undated=(cited_dates==dates.UNKNOWN_DATE)|(citing_dates==dates.UNKNOWN_DATE)
+    unknown=violating&undated
+    same=violating&~unknown&(cited_dates==citing_dates)
+    counts={'same':int(numpy.count_nonzero(same)),
+            'backwards':int(numpy.count_nonzero(violating&~unknown&~same)),
+            'unknown':int(numpy.count_nonzero(unknown)),
+            'undated':int(numpy.count_nonzero(undated))}
+    return violating,counts
+
+#################################################
+#Molloy-Reed shuffling of citations respecting time
+def shuffle_citations(cited,citing,vertex_years,seed=None):
+    '''
+    Returns arrays (cited, citing) of randomly rewired citations, such that 
+    a) in- and out-degrees of all papers are kept, 
+    b) every citing paper is from a later (calendar) year than the cited paper and 
+    c) there are no self-citations and multiple citations.
+    vertex_years holds the calendar year of every paper (0 for unknown), seed is an int or random.Random.
+    
+    Free citation stubs are kept in pools per year. Stubs are drawn uniformly and removed in O(1), 
+    cumulative per-year counts select the year of citing stubs. The earliest year with free cited stubs is served first; 
+    if none of the free citing stubs of later years is admissible, an existing citation of a later paper is cut and rewired.
+    '''
+    if isinstance(seed,random.Random):
+        rng=seed
+    else:
+        rng=random.Random(seed)
+    
+    cited=numpy.asarray(cited,dtype=numpy.int64)
+    citing=numpy.asarray(citing,dtype=numpy.int64)
+    vertex_years=numpy.asarray(vertex_years,dtype=numpy.int64)
+    n=len(vertex_years)
+    if len(cited)==0:
+        return cited,citing
+    
+    out_degree=numpy.bincount(cited,minlength=n)
+    in_degree=numpy.bincount(citing,minlength=n)
+    if numpy.any((out_degree+in_degree>0)&(vertex_years==0)):
+        raise UnknownYearError()
+    min_year=int(vertex_years[vertex_years>0].min())
+    n_years=int(vertex_years.max())-min_year+1
+    vertex_t=numpy.where(vertex_years>0,vertex_years-min_year,0)
+    
+    #stub pools: the stubs of year t are pool[start[t]:start[t+1]], the first free[t] of them are free
+    def pool(degree):
+        stubs=numpy.repeat(numpy.arange(n,dtype=numpy.int64),degree)
+        stubs=stubs[numpy.argsort(vertex_t[stubs],kind='mergesort')]
+        counts=numpy.bincount(vertex_t[stubs],minlength=n_years)
+        start=numpy.concatenate(([0],numpy.cumsum(counts)))
+        return stubs.tolist(),start.tolist(),counts.tolist()
+    
+    out_pool,out_start,out_free=pool(out_degree)
+    in_target,in_start,in_free=pool(in_degree)
+    in_source=[0]*len(in_target) #cited paper of filled citing stubs
+    out_counts=_YearCounts(out_free)
+    in_free_counts=_YearCounts(in_free)
+    in_filled_counts=_YearCounts([0]*n_years)
+    vertex_t=vertex_t.tolist()
+    
+    edges=set()
+    
+    def sample(counts,t,offset,admissible):
+        #draw a stub of a year later than t from counts, returns its pool position and year or (None,None)
+        first=counts.prefix(t+1)
+        available=counts.total-first
+        if available==0:
+            return None,None
+        for attempt in xrange(32):
+            k=first+rng.randrange(available)
+            year=counts.find(k)
+            position=in_start[year]+offset(year)+k-counts.prefix(year)
+            if admissible(position):
+                return position,year
+        #few admissible stubs left, collect them all
+        candidates=[(position,year) for year in xrange(t+1,n_years) 
+                    for position in xrange(in_start[year]+offset(year),in_start[year]+offset(year)+counts.count(year)) if admissible(position)]
+        if len(candidates)==0:
+            return None,None
+        return rng.choice(candidates)
+    
+    while out_counts.total>0:
+        #cited stub from the earliest year with free stubs
+        t=out_counts.find(0)
+        i=out_start[t]+rng.randrange(out_free[t])
+        x=out_pool[i]
+        out_free[t]-=1
+        out_pool[i]=out_pool[out_start[t]+out_free[t]]
+        out_counts.add(t,-1)
+        
+        admissible=lambda position: x*n+in_target[position] not in edges
+        position,year=sample(in_free_counts,t,lambda year: 0,admissible)
+        if position is not None:
+            #fill free citing stub: move it to the end of the free stubs of its year
+            in_free[year]-=1
+            last=in_start[year]+in_free[year]
+            in_target[position],in_target[last]=in_target[last],in_target[position]
+            in_source[last]=x
+            in_free_counts.add(year,-1)
+            in_filled_counts.add(year,1)
+            edges.add(x*n+in_target[last])
+        else:
+            #cut a citation of a later paper and rewire it to x
+            position,year=sample(in_filled_counts,t,lambda year: in_free[year],admissible)
+            if position is None:
+                raise BadError()
+            z=in_source[position]
+            edges.remove(z*n+in_target[position])
+            in_source[position]=x
+            edges.add(x*n+in_target[position])
+            #the cited stub of z is free again
+            tz=vertex_t[z]
+            out_pool[out_start[tz]+out_free[tz]]=z
+            out_free[tz]+=1
+            out_counts.add(tz,1)
+    
+    in_source=numpy.array(in_source,dtype=numpy.int64)
+    in_target=numpy.array(in_target,dtype=numpy.int64)
+    return in_source,in_target
+
+
+class _YearCounts():
+    'Per-year stub counts with cumulative sums (Fenwick tree)'
+    
+    def __init__(self,counts):
+        self.n=len(counts)
+        self.counts=list(counts)
+        self.total=sum(counts)
+        self.tree=[0]*(self.n+1)
+        for i in xrange(self.n):
+            self.add(i,counts[i],False)
+    
+    def add(self,i,delta,update_count=True):
+        if update_count:
+            self.counts[i]+=delta
+            self.total+=delta
+        i+=1
+        while i<=self.n:
+            self.tree[i]+=delta
+            i+=i&(-i)
+    
+    def count(self,i):
+        return self.counts[i]
+    
+    def prefix(self,i):
+        #sum of the counts of years < i
+        s=0
+        while i>0:
+            s+=self.tree[i]
+            i-=i&(-i)
+        return s
+    
+    def find(self,k):
+        #year containing the k-th stub (0-based) in cumulative order
+        i=0
+        step=1
+        while step*2<=self.n:
+            step*=2
+        while step>0:
+            if i+step<=self.n and self.tree[i+step]<=k:
+                i+=step
+                k-=self.tree[i]
+            step//=2
+        return i
+
+
 #################################################
-#date parser
-def parse_date(timestmp):
-    if timestmp is None:
-        return None
+#Ensembles of Molloy-Reed shuffled citations
+
+#arrays of the current ensemble, inherited by forked pool workers
+_ensemble_state = {}
+
+def molloy_reed_ensemble(citation_net,n_instances,statistic=None,processes=1,seed=None):
+    '''
+    Generate n_instances Molloy-Reed shuffled versions of citation_net (a PaperCitationNet) with a pool of processes worker processes.
+    Every instance uses its own random stream derived from seed, results are returned in the order of the instances.
+    Without statistic, returns a list of (cited, citing) arrays of the shuffled citations.
+    Otherwise statistic(cited, citing) is evaluated on every instance as it is generated and only the mean and 
+    the standard deviation of its (array) values over the ensemble are returned.
+    '''
+    source,target,index=array_utils.edge_arrays(citation_net.graph)
+    _ensemble_state.clear()
+    _ensemble_state.update(cited=source,citing=target,statistic=statistic,
+                           vertex_years=dates.years(citation_net.graph.vertex_properties['year'].a),
+                           seed=random.Random(seed).getrandbits(64))
+    pool=None
     try:
-        # if the year is not provided, this will assign '1', which will be detected in data analysis
-        d = parser.parse(str(timestmp), default=datetime.datetime(1, 1, 1, 0, 0))
-        return d.date()
-    except:  
-        print "Error when reading date:", sys.exc_info()[0]
-        print timestmp
-        raise
+        if processes==1:
+            instances=itertools.imap(_ensemble_instance,xrange(n_instances))
+        else:
+            pool=multiprocessing.Pool(processes)
+            #in order of the instances, so that results and summation order depend on seed only
+            instances=pool.imap(_ensemble_instance,xrange(n_instances))
+        
+        if statistic is None:
+            return list(instances)
+        
+        #running mean and variance (Welford)
+        count=0
+        for value in instances:
+            value=numpy.asarray(value,dtype=numpy.float64)
+            count+=1
+            if count==1:
+                mean=numpy.zeros(value.shape)
+                m2=numpy.zeros(value.shape)
+            delta=value-mean
+            mean+=delta/count
+            m2+=delta*(value-mean)
+        if count==0:
+            return None,None
+        return mean,numpy.sqrt(m2/count)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        _ensemble_state.clear()
+
+
+def _ensemble_instance(i):
+    rng=random.Random((_ensemble_state['seed']<<32)+i)
+    cited,citing=shuffle_citations(_ensemble_state['cited'],_ensemble_state['citing'],_ensemble_state['vertex_years'],rng)
+    if _ensemble_state['statistic'] is None:
+        return cited,citing
+    return _ensemble_state['statistic'](cited,citing)
+
+
+#################################################
+#date parser, see dates.parse_date for the recognized formats
+parse_date = dates.parse_date
 
 
             
@@ -470,6 +714,9 @@ class ExhaustedPossibleYearsError(Exception):
 class BadError(Exception):
     pass
 
+class UnknownYearError(Exception):
+    pass
+
 class PaperIDExistsAlreadyError(Exception):
     pass
     
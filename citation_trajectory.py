@@ -0,0 +1,162 @@
+#!/usr/bin/python
+
+##Author: Rene Pfitzner
+##Updates: Vahan Nanumyan
+
+#This module implements yearly citation trajectories of papers as sparse paper x years-since-publication count matrix.
+#Entry (p, d) is the number of citations paper p received d calendar years after its publication year.
+#The matrix is stored in CSR form: the years of row p are offsets[ptr[p]:ptr[p+1]] (sorted), their counts counts[ptr[p]:ptr[p+1]].
+#Citations with unknown dates and citations dated before the publication of the cited paper are not counted.
+#Appended citation batches are kept as pending coordinate arrays and merged into the CSR arrays in bulk.
+#A trajectory can be saved as directory of .npy files and memory mapped on load.
+
+import os
+import numpy
+
+import array_utils
+import dates
+
+
+class CitationTrajectory():
+    'Citation counts per paper and year since publication, stored as CSR arrays'
+
+################################################################
+    #Initialize empty trajectory
+    def __init__(self,n_papers=0):
+        self.n_papers=int(n_papers)
+        self.ptr=numpy.zeros(self.n_papers+1,dtype=numpy.int64)
+        self.offsets=numpy.zeros(0,dtype=numpy.int16)
+        self.counts=numpy.zeros(0,dtype=numpy.int32)
+
+        #appended citations, merged into the CSR arrays by compact()
+        self._pending=[]
+        self._n_pending=0
+        self.min_pending=1<<20
+
+
+################################################################
+    ##
+    #Functions to create a trajectory
+    @classmethod
+    def from_citations(cls,cited,citation_dates,publication_dates,n_papers=0):
+        '''
+        Returns the trajectory of the citations of the papers cited[i] (vertex indices) at day ordinals citation_dates[i],
+        publication_dates being the day ordinals of all papers (indexed by vertex index).
+        '''
+        trajectory=cls(max(n_papers,len(publication_dates)))
+        trajectory.append(cited,citation_dates,publication_dates)
+        trajectory.compact()
+        return trajectory
+
+
+    @classmethod
+    def from_csr(cls,ptr,offsets,counts):
+        '''Returns a trajectory using the given CSR arrays (e.g. memory mapped) without copying them.'''
+        trajectory=cls()
+        trajectory.ptr=ptr
+        trajectory.offsets=offsets
+        trajectory.counts=counts
+        trajectory.n_papers=len(ptr)-1
+        return trajectory
+
+
+################################################################
+    ##
+    #Functions to add citations
+    def append(self,cited,citation_dates,publication_dates):
+        '''
+        Add the citations of the papers cited[i] at day ordinals citation_dates[i], publication_dates being the day ordinals
+        of all papers (indexed by vertex index). Returns the number of citations counted.
+        '''
+        cited=numpy.asarray(cited,dtype=numpy.int64)
+        citation_years=dates.years(citation_dates)
+        publication_years=dates.years(numpy.asarray(publication_dates)[cited])
+        offsets=citation_years-publication_years
+        counted=(citation_years!=0)&(publication_years!=0)&(offsets>=0)
+        self.n_papers=max(self.n_papers,len(publication_dates))
+        if numpy.count_nonzero(counted)>0:
+            self._pending.append((cited[counted],offsets[counted]))
+            self._n_pending+=numpy.count_nonzero(counted)
+            if self._n_pending>max(self.min_pending,len(self.counts)//2):
+                self.compact()
+        return int(numpy.count_nonzero(counted))
+
+
+    def compact(self):
+        '''Merge the pending citations into the CSR arrays.'''
+        if self._n_pending==0 and len(self.ptr)-1==self.n_papers:
+            return
+        papers=numpy.repeat(numpy.arange(len(self.ptr)-1,dtype=numpy.int64),numpy.diff(self.ptr))
+        offsets=numpy.asarray(self.offsets,dtype=numpy.int64)
+        counts=numpy.asarray(self.counts,dtype=numpy.int64)
+        if self._n_pending>0:
+            papers=numpy.concatenate([papers]+[x[0] for x in self._pending])
+            offsets=numpy.concatenate([offsets]+[x[1] for x in self._pending])
+            counts=numpy.concatenate([counts]+[numpy.ones(len(x[0]),dtype=numpy.int64) for x in self._pending])
+            self._pending=[]
+            self._n_pending=0
+
+        #sum the counts of equal (paper, offset) entries
+        base=int(offsets.max())+1 if len(offsets)>0 else 1
+        keys,inverse=numpy.unique(papers*base+offsets,return_inverse=True)
+        self.counts=numpy.bincount(inverse,weights=counts,minlength=len(keys)).astype(numpy.int32)
+        self.ptr=array_utils.indptr_of(keys//base,self.n_papers)
+        self.offsets=(keys%base).astype(numpy.int16)
+
+
+################################################################
+    ##
+    #Functions to query trajectories
+    def csr(self):
+        '''Returns the CSR arrays ptr, offsets (years since publication) and counts.'''
+        self.compact()
+        return self.ptr,self.offsets,self.counts
+
+
+    def row(self,paper,length=None):
+        '''Returns the dense trajectory of paper: citations received 0, 1, ... years after publication (length entries).'''
+        ptr,offsets,counts=self.csr()
+        offsets=offsets[ptr[paper]:ptr[paper+1]]
+        if length is None:
+            length=int(offsets.max())+1 if len(offsets)>0 else 0
+        trajectory=numpy.zeros(length,dtype=numpy.int64)
+        inside=offsets<length
+        trajectory[offsets[inside]]=counts[ptr[paper]:ptr[paper+1]][inside]
+        return trajectory
+
+
+    def counts_within(self,yd):
+        '''Returns an array with the number of citations of every paper received up to yd years after its publication.'''
+        ptr,offsets,counts=self.csr()
+        papers=numpy.repeat(numpy.arange(self.n_papers,dtype=numpy.int64),numpy.diff(ptr))
+        inside=offsets<=yd
+        return numpy.bincount(papers[inside],weights=counts[inside],minlength=self.n_papers).astype(numpy.int64)
+
+
+    def totals(self):
+        '''Returns an array with the number of counted citations of every paper.'''
+        ptr,offsets,counts=self.csr()
+        papers=numpy.repeat(numpy.arange(self.n_papers,dtype=numpy.int64),numpy.diff(ptr))
+        return numpy.bincount(papers,weights=counts,minlength=self.n_papers).astype(numpy.int64)
+
+
+################################################################
+    ##
+    #Functions to store trajectories
+    def save(self,path):
+        '''Write the CSR arrays into the directory path as .npy files.'''
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for name,array in zip(['ptr','offsets','counts'],self.csr()):
+            #renamed into place, arrays memory mapped from the replaced file stay valid
+            filename=os.path.join(path,'trajectory.'+name+'.npy')
+            with open(filename+'.tmp','wb') as f:
+                numpy.save(f,numpy.ascontiguousarray(array))
+            os.rename(filename+'.tmp',filename)
+
+
+    @classmethod
+    def load(cls,path,mmap=True):
+        '''Returns the trajectory saved in the directory path, memory mapped read-only unless mmap=False.'''
+        arrays=[numpy.load(os.path.join(path,'trajectory.'+name+'.npy'),mmap_mode='r' if mmap else None) for name in ['ptr','offsets','counts']]
+        return cls.from_csr(*arrays)
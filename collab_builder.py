@@ -0,0 +1,116 @@
+#!/usr/bin/python
+
+##Author: Rene Pfitzner
+##Updates: Vahan Nanumyan
+
+#This module implements the array based construction of the collaboration layer from authorship rows (paper, author, date).
+#As with adding the rows one by one, the author of a row collaborates with every author linked to the paper before the row,
+#at the date of the row. The collaboration layer has one edge per pair of authors and date, and first_year_collaborated
+#of all edges of a pair is the earliest date of the pair.
+#Rows are grouped by paper with a stable sort, all pairs are emitted at once and deduplicated, and merged into the sorted table of existing collaborations.
+
+import numpy
+
+import array_utils
+
+
+################################################################
+## Function to emit the collaborations of authorship rows
+def collaboration_pairs(papers, authors, ordinals, paper_ptr, paper_authors):
+    '''
+    Returns arrays (author1, author2, date) of the distinct collaborations (author1 < author2) created by the authorship rows
+    papers[i]-authors[i] at day ordinals[i], taken in order.
+    paper_ptr, paper_authors are the paper->authors CSR arrays of the links existing before the rows.
+    '''
+    papers = numpy.asarray(papers, dtype=numpy.int64)
+    authors = numpy.asarray(authors, dtype=numpy.int64)
+    ordinals = numpy.asarray(ordinals, dtype=numpy.int64)
+    n_rows = len(papers)
+
+    #coauthors linked before the rows
+    linked = numpy.flatnonzero(papers < len(paper_ptr) - 1)
+    row_of, pos = array_utils.ragged_ranges(paper_ptr, papers[linked])
+    row_of = linked[row_of]
+    first = [authors[row_of]]
+    second = [paper_authors[pos].astype(numpy.int64)]
+    date = [ordinals[row_of]]
+
+    #coauthors of earlier rows of the same paper: rows grouped by paper, in order within the groups
+    order = numpy.argsort(papers, kind='mergesort')
+    sorted_papers = papers[order]
+    group_start = numpy.zeros(n_rows, dtype=numpy.int64)
+    if n_rows > 0:
+        starts = numpy.flatnonzero(numpy.concatenate(([True], sorted_papers[1:] != sorted_papers[:-1])))
+        group_start = starts[numpy.searchsorted(starts, numpy.arange(n_rows), side='right') - 1]
+    rank = numpy.arange(n_rows, dtype=numpy.int64) - group_start
+    later = numpy.repeat(numpy.arange(n_rows, dtype=numpy.int64), rank)
+    earlier = numpy.repeat(group_start, rank) + numpy.arange(len(later), dtype=numpy.int64) - numpy.repeat(numpy.cumsum(rank) - rank, rank)
+    first.append(authors[order[later]])
+    second.append(authors[order[earlier]])
+    date.append(ordinals[order[later]])
+
+    first = numpy.concatenate(first)
+    second = numpy.concatenate(second)
+    date = numpy.concatenate(date)
+
+    #undirected pairs of distinct authors, one per date
+    keep = first != second
+    author1 = numpy.minimum(first, second)[keep]
+    author2 = numpy.maximum(first, second)[keep]
+    date = date[keep]
+    order = numpy.lexsort((date, author2, author1))
+    author1 = author1[order]
+    author2 = author2[order]
+    date = date[order]
+    distinct = numpy.ones(len(date), dtype=bool)
+    distinct[1:] = (author1[1:] != author1[:-1]) | (author2[1:] != author2[:-1]) | (date[1:] != date[:-1])
+    return author1[distinct], author2[distinct], date[distinct]
+
+
+################################################################
+## Functions to merge collaborations into existing ones
+def collaboration_keys(author1, author2):
+    '''Returns int64 keys min << 32 | max of the undirected author pairs, independent of the number of authors.'''
+    author1 = numpy.asarray(author1, dtype=numpy.int64)
+    author2 = numpy.asarray(author2, dtype=numpy.int64)
+    return (numpy.minimum(author1, author2) << 32) | numpy.maximum(author1, author2)
+
+
+def collaboration_table(source, target, year):
+    '''Returns the keys (see collaboration_keys) and dates of the collaboration edges source-target with dates year, sorted by key and date, and the order of the edges.'''
+    keys = collaboration_keys(source, target)
+    year = numpy.asarray(year, dtype=numpy.int64)
+    order = numpy.lexsort((year, keys))
+    return keys[order], year[order], order
+
+
+def merge_collaborations(author1, author2, date, table_keys, table_dates):
+    '''
+    Merges the collaborations (author1, author2, date) as returned by collaboration_pairs into the table of existing collaborations
+    (table_keys, table_dates) as returned by collaboration_table, by bisection of the table.
+    Returns the mask of the collaborations not existing already, their insertion positions into the table and their first collaboration dates,
+    and the table ranges (start, end) of the pairs whose first collaboration date is lowered, with the new first dates.
+    '''
+    keys = collaboration_keys(author1, author2)
+    date = numpy.asarray(date, dtype=numpy.int64)
+    starts = numpy.searchsorted(table_keys, keys, side='left')
+    ends = numpy.searchsorted(table_keys, keys, side='right')
+    pos = array_utils.searchsorted_ranges(table_dates, starts, ends, date)
+    exists = pos < ends
+    exists[exists] = table_dates[pos[exists]] == date[exists]
+    new = ~exists
+    keys, date, starts, ends, pos = keys[new], date[new], starts[new], ends[new], pos[new]
+
+    #earliest new date of every pair (keys are sorted by pair and date), the earliest existing one starts its table range
+    pair_start = numpy.ones(len(keys), dtype=bool)
+    pair_start[1:] = keys[1:] != keys[:-1]
+    new_min = date[pair_start]
+    known = starts[pair_start] < ends[pair_start]
+    old_min = numpy.empty(len(new_min), dtype=numpy.int64)
+    old_min.fill(numpy.iinfo(numpy.int64).max)
+    old_min[known] = table_dates[starts[pair_start][known]]
+
+    #existing edges get the new earliest date if it is earlier than all of their pair
+    lowered = known & (new_min < old_min)
+    first = numpy.repeat(numpy.minimum(new_min, old_min), numpy.diff(numpy.append(numpy.flatnonzero(pair_start), len(keys))))
+    return new, pos, first, starts[pair_start][lowered], ends[pair_start][lowered], new_min[lowered]
@@ -0,0 +1,164 @@
+#!/usr/bin/python
+
+##Author: Rene Pfitzner
+##Updates: Vahan Nanumyan
+
+#This module implements the distances in the collaboration network at the formation of new collaborations, over many years.
+#A collaboration first made in year Y is measured in the network of the collaborations first made before Y.
+#The collaborations are stored once as CSR adjacency with every row sorted by first collaboration date, so that the network
+#before any year is a prefix of every row: moving to the next year only moves the row ends, no edge masks are rebuilt.
+#The new collaborations of a year are grouped by source author and one breadth first search per source finds the distances
+#to all of its new collaborators. The (year, source) groups are split into chunks processed by a pool of worker processes.
+
+import multiprocessing
+import numpy
+
+import array_utils
+import dates
+
+
+#distance of unreachable collaborators (and of those beyond max_depth), as graph-tool reports for int distances
+UNREACHABLE = numpy.iinfo(numpy.int32).max
+
+#arrays of the current computation, inherited by forked pool workers
+_state = {}
+
+
+################################################################
+## Function to build the date sorted adjacency
+def dated_adjacency(source, target, first_collaborated, n_authors):
+    '''
+    Returns CSR arrays (indptr, neighbours, dates) of the undirected collaborations source-target,
+    the neighbours of every author sorted by the day ordinal of the first collaboration.
+    '''
+    source = numpy.asarray(source, dtype=numpy.int64)
+    target = numpy.asarray(target, dtype=numpy.int64)
+    first_collaborated = numpy.asarray(first_collaborated, dtype=numpy.int64)
+
+    author = numpy.concatenate((source, target))
+    neighbour = numpy.concatenate((target, source))
+    first = numpy.concatenate((first_collaborated, first_collaborated))
+    order = numpy.lexsort((first, author))
+    return array_utils.indptr_of(author[order], n_authors), neighbour[order].astype(numpy.int32), first[order]
+
+
+################################################################
+## Function to find the row ends of the network before a date
+def _row_ends(cutoff):
+    #cached per worker, tasks come in order of years
+    if _state.get('cutoff') != cutoff:
+        keys = _state['keys']
+        n_authors = len(_state['indptr']) - 1
+        offset = min(max(cutoff - _state['min_date'], 0), _state['span'] - 1)
+        _state['row_end'] = numpy.searchsorted(keys, numpy.arange(n_authors, dtype=numpy.int64) * _state['span'] + offset)
+        _state['cutoff'] = cutoff
+    return _state['row_end']
+
+
+################################################################
+## Function to search breadth first from one author
+def _bfs(source, targets, row_end, distance, max_depth):
+    indptr = _state['indptr']
+    neighbours = _state['neighbours']
+    distance[source] = 0
+    touched = [numpy.array([source], dtype=numpy.int64)]
+    frontier = touched[0]
+    depth = 0
+    while len(frontier) > 0 and (max_depth is None or depth < max_depth):
+        if (distance[targets] != UNREACHABLE).all():
+            break
+        depth += 1
+        row_of, pos = array_utils.ranges(indptr[frontier], row_end[frontier])
+        reached = neighbours[pos]
+        reached = numpy.unique(reached[distance[reached] == UNREACHABLE]).astype(numpy.int64)
+        distance[reached] = depth
+        touched.append(reached)
+        frontier = reached
+    result = distance[targets].copy()
+    distance[numpy.concatenate(touched)] = UNREACHABLE
+    return result
+
+
+################################################################
+## Function to measure the new collaborations of a range of (year, source) groups
+def _distances_range(group_range):
+    first_group, last_group = group_range
+    group_ptr = _state['group_ptr']
+    new_target = _state['new_target']
+    distance = numpy.empty(len(_state['indptr']) - 1, dtype=numpy.int32)
+    distance.fill(UNREACHABLE)
+
+    result = []
+    for g in xrange(first_group, last_group):
+        row_end = _row_ends(int(_state['group_cutoff'][g]))
+        targets = new_target[group_ptr[g]:group_ptr[g+1]]
+        result.append(_bfs(int(_state['group_source'][g]), targets, row_end, distance, _state['max_depth']))
+    if len(result) == 0:
+        return numpy.zeros(0, dtype=numpy.int32)
+    return numpy.concatenate(result)
+
+
+################################################################
+## Function to measure the distances at collaboration formation
+def formation_distances(source, target, edges, first_collaborated, n_authors, years, max_depth=None, processes=1, chunk_size=1000, first_year=1892):
+    '''
+    Returns typed arrays (edges, years, distances) with the distance in the collaboration network between the authors
+    of every collaboration first made in one of the calendar years years (int64 edge index, int32 year, int32 distance).
+    The distance of a collaboration of year Y is measured in the network of the collaborations first made
+    from first_year to Y-1; it is UNREACHABLE for authors not connected within max_depth steps (None for no bound).
+    source, target, edges, first_collaborated describe the collaboration edges (e.g. from array_utils.edge_arrays).
+    The (year, source author) groups are split into chunks of chunk_size groups, processed by a pool of processes workers.
+    '''
+    source = numpy.asarray(source, dtype=numpy.int64)
+    target = numpy.asarray(target, dtype=numpy.int64)
+    edges = numpy.asarray(edges, dtype=numpy.int64)
+    first_collaborated = numpy.asarray(first_collaborated, dtype=numpy.int64)
+    years = sorted(set(int(y) for y in years))
+
+    #network: collaborations from first_year on, rows sorted by date
+    dated = first_collaborated >= dates.year_start(first_year)
+    indptr, neighbours, first = dated_adjacency(source[dated], target[dated], first_collaborated[dated], n_authors)
+    min_date = int(first.min()) if len(first) > 0 else 0
+    span = (int(first.max()) if len(first) > 0 else 0) - min_date + 2
+    author = numpy.repeat(numpy.arange(n_authors, dtype=numpy.int64), numpy.diff(indptr))
+
+    #new collaborations grouped by year and source author
+    new_edges = []
+    new_years = []
+    for year in years:
+        new = numpy.flatnonzero(dates.in_years(first_collaborated, year, year))
+        new_edges.append(new)
+        new_years.append(numpy.repeat(numpy.int64(year), len(new)))
+    new_edges = numpy.concatenate(new_edges) if len(years) > 0 else numpy.zeros(0, dtype=numpy.int64)
+    new_years = numpy.concatenate(new_years) if len(years) > 0 else numpy.zeros(0, dtype=numpy.int64)
+    order = numpy.lexsort((source[new_edges], new_years))
+    new_edges = new_edges[order]
+    new_years = new_years[order]
+    group_keys = new_years * max(n_authors, 1) + source[new_edges]
+    group_start = numpy.flatnonzero(numpy.concatenate(([True], group_keys[1:] != group_keys[:-1]))) if len(group_keys) > 0 else numpy.zeros(0, dtype=numpy.int64)
+    group_ptr = numpy.append(group_start, len(group_keys))
+
+    _state.clear()
+    _state.update(indptr=indptr, neighbours=neighbours, keys=author * span + (first - min_date), span=span, min_date=min_date,
+                  group_ptr=group_ptr, group_source=source[new_edges][group_start],
+                  group_cutoff=numpy.array([dates.year_start(y) for y in new_years[group_start].tolist()], dtype=numpy.int64),
+                  new_target=target[new_edges], max_depth=max_depth)
+
+    #ranges of groups, in order of years
+    bounds = numpy.unique(numpy.concatenate((numpy.arange(0, len(group_start), max(int(chunk_size), 1)), [len(group_start)])))
+    group_ranges = zip(bounds[:-1].tolist(), bounds[1:].tolist())
+    try:
+        if processes == 1 or len(group_ranges) <= 1:
+            distances = map(_distances_range, group_ranges)
+        else:
+            pool = multiprocessing.Pool(processes)
+            try:
+                distances = pool.map(_distances_range, group_ranges)
+            finally:
+                pool.close()
+                pool.join()
+    finally:
+        _state.clear()
+
+    distances = numpy.concatenate(distances) if len(distances) > 0 else numpy.zeros(0, dtype=numpy.int32)
+    return edges[new_edges], new_years.astype(numpy.int32), distances.astype(numpy.int32)
@@ -0,0 +1,177 @@
+#!/usr/bin/python
+
+##Author: Rene Pfitzner
+##Updates: Vahan Nanumyan
+
+#This module implements the timelines of the aggregated collaboration layer.
+#In aggregated mode the collaboration layer holds one edge per pair of authors (with edge properties count,
+#first_year_collaborated and last_year) instead of one parallel edge per pair and date. The dates of every pair are kept
+#in CSR form indexed by edge index: the dates of edge e are ordinals[ptr[e]:ptr[e+1]], sorted and distinct.
+#Dates added one at a time are kept in a small pending buffer and merged into the CSR arrays in bulk.
+
+import numpy
+
+import array_utils
+import dates
+
+
+class CollabTimeline():
+    'Collaboration dates per collaboration edge stored as CSR arrays of int32 day ordinals'
+
+################################################################
+    #Initialize empty timeline
+    def __init__(self,n_edges=0):
+        self.n_edges=int(n_edges)
+        self.ptr=numpy.zeros(self.n_edges+1,dtype=numpy.int64)
+        self.ordinals=numpy.zeros(0,dtype=numpy.int32)
+
+        #builder for incremental appends, merged into the CSR arrays by compact()
+        self._pending={}
+        self._n_pending=0
+        self.min_pending=1<<16
+
+
+################################################################
+    ##
+    #Functions to create a timeline from arrays
+    @classmethod
+    def from_edges(cls,edges,ordinals,n_edges=0):
+        '''Returns a timeline holding the day ordinals ordinals[i] of the edges edges[i] (edge indices), duplicates are dropped.'''
+        timeline=cls(n_edges)
+        timeline.add_many(edges,ordinals)
+        return timeline
+
+
+    @classmethod
+    def from_csr(cls,ptr,ordinals):
+        '''Returns a timeline using the given CSR arrays (e.g. memory mapped) without copying them.'''
+        timeline=cls()
+        timeline.ptr=ptr
+        timeline.ordinals=ordinals
+        timeline.n_edges=len(ptr)-1
+        return timeline
+
+
+################################################################
+    ##
+    #Function to enlarge the edge range
+    def resize(self,n_edges):
+        '''Enlarge the timeline to hold n_edges edges.'''
+        if n_edges>self.n_edges:
+            self.ptr=numpy.concatenate((self.ptr,numpy.repeat(self.ptr[-1],n_edges-self.n_edges)))
+            self.n_edges=int(n_edges)
+
+
+################################################################
+    ##
+    #Functions to add dates
+    def add(self,edge,date):
+        '''Add the day ordinal date to the edge with index edge. Returns False if the edge has the date already.'''
+        edge=int(edge)
+        date=int(date)
+        if self.has(edge,date):
+            return False
+        self._pending.setdefault(edge,[]).append(date)
+        self._n_pending+=1
+        if self._n_pending>max(self.min_pending,len(self.ordinals)//2):
+            self.compact()
+        return True
+
+
+    def add_many(self,edges,ordinals):
+        '''Add the day ordinals ordinals[i] to the edges edges[i]. Returns a boolean array, True for the dates the edges did not have before.'''
+        edges=numpy.asarray(edges,dtype=numpy.int64).ravel()
+        ordinals=numpy.asarray(ordinals,dtype=numpy.int64).ravel()
+        self.compact()
+        old_edges,old_ordinals=self.pairs()
+        n_edges=max(self.n_edges,int(edges.max())+1 if len(edges)>0 else 0)
+
+        #sort old and new (edge, date) pairs together, a new pair following an equal one exists already
+        all_edges=numpy.concatenate((old_edges,edges))
+        all_ordinals=numpy.concatenate((old_ordinals,ordinals))
+        is_new=numpy.concatenate((numpy.zeros(len(old_edges),dtype=bool),numpy.ones(len(edges),dtype=bool)))
+        order=numpy.lexsort((all_ordinals,all_edges))
+        keep=numpy.ones(len(order),dtype=bool)
+        keep[1:]=(all_edges[order][1:]!=all_edges[order][:-1])|(all_ordinals[order][1:]!=all_ordinals[order][:-1])
+        added=numpy.zeros(len(edges),dtype=bool)
+        added[order[keep&is_new[order]]-len(old_edges)]=True
+
+        order=order[keep]
+        self.ordinals=all_ordinals[order].astype(numpy.int32)
+        self.ptr=array_utils.indptr_of(all_edges[order],n_edges)
+        self.n_edges=n_edges
+        return added
+
+
+    def compact(self):
+        '''Merge all pending dates into the CSR arrays.'''
+        if self._n_pending>0:
+            edges=numpy.repeat(numpy.fromiter(self._pending.keys(),dtype=numpy.int64,count=len(self._pending)),
+                               [len(x) for x in self._pending.values()])
+            ordinals=numpy.fromiter((d for x in self._pending.values() for d in x),dtype=numpy.int64,count=self._n_pending)
+            self._pending={}
+            self._n_pending=0
+            self.add_many(edges,ordinals)
+
+
+################################################################
+    ##
+    #Functions to query dates
+    def has(self,edge,date):
+        '''True if the edge with index edge has the day ordinal date.'''
+        if edge<self.n_edges:
+            row=self.ordinals[self.ptr[edge]:self.ptr[edge+1]]
+            i=numpy.searchsorted(row,date)
+            if i<len(row) and row[i]==date:
+                return True
+        return date in self._pending.get(edge,())
+
+
+    def dates_of(self,edge):
+        '''Returns the sorted array of day ordinals of the edge with index edge.'''
+        edge=int(edge)
+        if edge in self._pending:
+            self.compact()
+        if edge<self.n_edges:
+            return self.ordinals[self.ptr[edge]:self.ptr[edge+1]]
+        return self.ordinals[:0]
+
+
+    def csr(self,n_edges=None):
+        '''Returns indptr and day ordinals of the CSR arrays, indptr padded to n_edges rows.'''
+        self.compact()
+        if n_edges is not None:
+            self.resize(n_edges)
+        return self.ptr,self.ordinals
+
+
+    def pairs(self):
+        '''Returns arrays of edges and day ordinals of all (edge, date) pairs held in the CSR arrays.'''
+        edges=numpy.repeat(numpy.arange(self.n_edges,dtype=numpy.int64),numpy.diff(self.ptr))
+        return edges,self.ordinals.astype(numpy.int64)
+
+
+    def summary(self,n_edges=None):
+        '''Returns arrays with the number of dates, the first and the last date of every edge (UNKNOWN_DATE for edges without dates).'''
+        ptr,ordinals=self.csr(n_edges)
+        count=numpy.diff(ptr)
+        first=numpy.zeros(len(count),dtype=numpy.int32)
+        last=numpy.zeros(len(count),dtype=numpy.int32)
+        first.fill(dates.UNKNOWN_DATE)
+        last.fill(dates.UNKNOWN_DATE)
+        dated=count>0
+        first[dated]=ordinals[ptr[:-1][dated]]
+        last[dated]=ordinals[ptr[1:][dated]-1]
+        return count,first,last
+
+
+    def edge_mask(self,start,end,n_edges=None):
+        '''Returns a boolean array marking the edges with a date in the range start <= date <= end (day ordinals).'''
+        ptr,ordinals=self.csr(n_edges)
+        inside=(ordinals>=start)&(ordinals<=end)
+        edges=numpy.repeat(numpy.arange(len(ptr)-1,dtype=numpy.int64),numpy.diff(ptr))
+        return numpy.bincount(edges[inside],minlength=len(ptr)-1)>0
+
+
+    def __len__(self):
+        return len(self.ordinals)+self._n_pending
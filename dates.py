@@ -0,0 +1,196 @@
+#!/usr/bin/python
+
+##Author: Rene Pfitzner
+##Updates: Vahan Nanumyan
+
+#This module implements the typed date representation used for 'year' property maps and the date parser.
+#Dates are stored as proleptic Gregorian day ordinals (datetime.date.toordinal()) in int32 property maps,
+#UNKNOWN_DATE marks papers, authors and collaborations without date.
+
+import datetime
+import collections
+import sys
+import numpy
+from dateutil import parser
+
+
+#property map value type of all date properties
+DATE_TYPE = 'int32_t'
+
+#sentinel for unknown dates; valid ordinals start at 1 (0001-01-01)
+UNKNOWN_DATE = 0
+
+_EPOCH = numpy.datetime64('0001-01-01', 'D')
+
+
+################################################################
+## Conversion of single values
+def to_ordinal(date):
+    '''Returns the day ordinal of a datetime.date (or datetime.datetime), UNKNOWN_DATE for None.'''
+    if date is None:
+        return UNKNOWN_DATE
+    return date.toordinal()
+
+
+def from_ordinal(ordinal):
+    '''Returns the datetime.date of a day ordinal, None for UNKNOWN_DATE.'''
+    if ordinal == UNKNOWN_DATE:
+        return None
+    return datetime.date.fromordinal(int(ordinal))
+
+
+def year_start(year):
+    '''Returns the day ordinal of January 1st of year.'''
+    return datetime.date(int(year), 1, 1).toordinal()
+
+
+def year_end(year):
+    '''Returns the day ordinal of December 31st of year.'''
+    return datetime.date(int(year), 12, 31).toordinal()
+
+
+################################################################
+## Conversion of arrays
+def years(ordinals):
+    '''Returns an int array with the calendar years of the day ordinals in ordinals, 0 for unknown dates.'''
+    ordinals = numpy.asarray(ordinals, dtype=numpy.int64)
+    y = (_EPOCH + (ordinals - 1)).astype('datetime64[Y]').astype(numpy.int64) + 1970
+    y[ordinals == UNKNOWN_DATE] = 0
+    return y
+
+
+def known(ordinals):
+    '''Returns a boolean mask of the known dates in ordinals.'''
+    return numpy.asarray(ordinals) != UNKNOWN_DATE
+
+
+def in_years(ordinals, first_year, last_year):
+    '''Returns a boolean mask of the day ordinals falling into the calendar years first_year to last_year (inclusive).'''
+    ordinals = numpy.asarray(ordinals)
+    return (ordinals >= year_start(first_year)) & (ordinals <= year_end(last_year))
+
+
+def window(start, end):
+    '''
+    Returns the day ordinals (first, last) of the window from start to end (any standard date format, inclusive).
+    Years given as int cover the whole year, None leaves the window open on that side.
+    '''
+    def bound(date, year_bound, open_bound):
+        if date is None:
+            return open_bound
+        if isinstance(date, (int, long, numpy.integer)) and not isinstance(date, bool) and 1000 <= date <= 9999:
+            return year_bound(date)
+        return parse_ordinal(date)
+    return bound(start, year_start, UNKNOWN_DATE + 1), bound(end, year_end, numpy.iinfo(numpy.int32).max)
+
+
+def in_window(ordinals, first, last):
+    '''Returns a boolean mask of the known day ordinals in ordinals with first <= ordinal <= last.'''
+    ordinals = numpy.asarray(ordinals)
+    return (ordinals != UNKNOWN_DATE) & (ordinals >= first) & (ordinals <= last)
+
+
+def year_span(ordinals):
+    '''Returns the first and last calendar year among the known dates in ordinals, (None,None) if there are none.'''
+    y = years(ordinals)
+    y = y[y != 0]
+    if len(y) == 0:
+        return None, None
+    return int(y.min()), int(y.max())
+
+
+################################################################
+## Date parser
+#
+#Common formats (date/datetime objects as returned by psycopg2, four digit years and ISO dates) are recognized directly,
+#all other strings are handed to dateutil. Parsed strings are kept in a bounded LRU cache.
+
+_cache = collections.OrderedDict()
+_cache_size = 100000
+
+
+def set_cache_size(size):
+    '''Sets the maximal number of parsed strings kept in the cache of parse_date.'''
+    global _cache_size
+    _cache_size = int(size)
+    while _cache and len(_cache) > _cache_size:
+        _cache.popitem(last=False)
+
+
+def _parse_iso(s):
+    #returns the date of s if it is a four digit year, YYYY-MM or YYYY-MM-DD (optionally followed by a time), None otherwise
+    n = len(s)
+    try:
+        if n == 4 and s.isdigit():
+            return datetime.date(int(s), 1, 1)
+        if n >= 7 and s[4] == '-' and s[:4].isdigit() and s[5:7].isdigit():
+            if n == 7:
+                return datetime.date(int(s[:4]), int(s[5:7]), 1)
+            if n >= 10 and s[7] == '-' and s[8:10].isdigit() and (n == 10 or (s[10] in 'T ' and s[11:13].isdigit())):
+                return datetime.date(int(s[:4]), int(s[5:7]), int(s[8:10]))
+    except ValueError: #e.g. day out of range, leave the error message to dateutil
+        pass
+    return None
+
+
+def _parse_dateutil(s):
+    try:
+        # if the year is not provided, this will assign '1', which will be detected in data analysis
+        d = parser.parse(s, default=datetime.datetime(1, 1, 1, 0, 0))
+        return d.date()
+    except:
+        print "Error when reading date:", sys.exc_info()[0]
+        print s
+        raise
+
+
+def parse_date(timestmp):
+    '''Returns the datetime.date of timestmp (any standard date format), None if timestmp is None.'''
+    if timestmp is None:
+        return None
+    if isinstance(timestmp, datetime.datetime):
+        return timestmp.date()
+    if isinstance(timestmp, datetime.date):
+        return timestmp
+    if isinstance(timestmp, (int, long, numpy.integer)) and not isinstance(timestmp, bool) and 1000 <= timestmp <= 9999:
+        return datetime.date(int(timestmp), 1, 1)
+    
+    s = str(timestmp)
+    try:
+        d = _cache.pop(s)
+    except KeyError:
+        d = _parse_iso(s.strip())
+        if d is None:
+            d = _parse_dateutil(s)
+        if _cache_size <= 0:
+            return d
+        while len(_cache) >= _cache_size:
+            _cache.popitem(last=False)
+    _cache[s] = d
+    return d
+
+
+def parse_ordinal(timestmp):
+    '''Returns the day ordinal of timestmp (any standard date format), UNKNOWN_DATE if timestmp is None.'''
+    return to_ordinal(parse_date(timestmp))
+
+
+def parse_ordinals(timestmps):
+    '''Returns an int32 array of the day ordinals of all dates in the sequence timestmps, parsing every distinct value once.'''
+    timestmps = numpy.asarray(timestmps)
+    if timestmps.dtype.kind in 'iuSU':
+        uniq, inverse = numpy.unique(timestmps, return_inverse=True)
+        ordinals = numpy.array([parse_ordinal(x) for x in uniq.tolist()], dtype=numpy.int32)
+        return ordinals[inverse].reshape(timestmps.shape)
+    
+    #object arrays (e.g. dates from psycopg2, possibly mixed with None) cannot be sorted, deduplicate with a dict
+    parsed = {}
+    ordinals = numpy.empty(timestmps.shape, dtype=numpy.int32)
+    flat = ordinals.reshape(-1)
+    for i, x in enumerate(timestmps.reshape(-1).tolist()):
+        try:
+            flat[i] = parsed[x]
+        except KeyError:
+            flat[i] = parsed[x] = parse_ordinal(x)
+    return ordinals
+
@@ -0,0 +1,73 @@
+#!/usr/bin/python
+
+##Author: Rene Pfitzner
+##Updates: Vahan Nanumyan
+
+#This module implements streaming reads of SQL query results.
+#Rows are fetched in batches from a named (server side) cursor, so that the result set is never held in client memory at once.
+#Connections are given either as keyword dictionary for psycopg2.connect or as an open DB-API connection.
+
+import itertools
+import time
+
+import psycopg2
+
+
+#running number of the named cursors of this process
+_cursor_count = itertools.count()
+
+
+################################################################
+## Function to open connections
+def connect(conn):
+    '''Returns an open connection for conn and True if it was opened here (and is to be closed by the caller).'''
+    if isinstance(conn, dict):
+        return psycopg2.connect(**conn), True
+    return conn, False
+
+
+################################################################
+## Function to create a streaming cursor
+def server_cursor(connection, batch_size):
+    '''
+    Returns a named server side cursor transferring batch_size rows per round trip.
+    Connections without named cursors (other DB-API modules) get a plain cursor.
+    '''
+    try:
+        cur = connection.cursor(name='scientometric_stream_%d' % next(_cursor_count))
+    except TypeError:
+        return connection.cursor()
+    cur.itersize = batch_size
+    return cur
+
+
+################################################################
+## Function to fetch query results in batches
+def fetch_batches(conn, sql, batch_size=100000):
+    '''
+    Generator of lists of at most batch_size rows of the query sql, fetched with fetchmany from a server side cursor.
+    Prints the number of rows read and the time passed after every batch.
+    '''
+    connection, owned = connect(conn)
+    cur = server_cursor(connection, batch_size)
+    try:
+        cur.execute(sql)
+        cou = 0
+        t_prev = time.time()
+        t_cum = 0
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if len(rows) == 0:
+                break
+            yield rows
+
+            cou += len(rows)
+            print 'Lines read: ' + str(cou)
+            t = time.time()
+            t_cum += t - t_prev
+            t_prev = t
+            print 'Time passed: ' + str(t_cum)
+    finally:
+        cur.close()
+        if owned:
+            connection.close()
@@ -0,0 +1,293 @@
+#!/usr/bin/python
+
+##Author: Rene Pfitzner
+##Updates: Vahan Nanumyan
+
+#This module implements tables of paper and author id strings.
+#The strings are stored in one contiguous byte buffer with an offsets array, string i is buffer[offsets[i]:offsets[i+1]].
+#IdTable is read-only (e.g. memory mapped from a snapshot) and resolves ids by binary search over their sorted order.
+#InternTable grows as vertices are added: it interns every id to the next integer (its vertex index) and resolves ids
+#through a sorted array of their hashes. Appended ids are kept in a small pending buffer and merged into the arrays in bulk.
+
+import numpy
+
+
+##################################################################################################################
+#Define module-wide functions
+
+def _key(s):
+    #ids are stored as byte strings, unicode as UTF-8
+    if isinstance(s,unicode):
+        return s.encode('utf-8')
+    if isinstance(s,str):
+        return s
+    return str(s)
+
+
+def _concatenate_strings(keys):
+    #buffer and offsets of a list of byte strings
+    offsets=numpy.zeros(len(keys)+1,dtype=numpy.int64)
+    numpy.cumsum([len(s) for s in keys],out=offsets[1:])
+    return numpy.frombuffer(''.join(keys),dtype=numpy.uint8),offsets
+
+
+##################################################################################################################
+
+class IdTable():
+    'Table of id strings in one byte buffer, with offsets and sorted order for lookups'
+
+################################################################
+    #Initialize table
+    def __init__(self,buffer=None,offsets=None,order=None):
+        '''
+        buffer (uint8) and offsets (int64) hold the strings, order lists the string indices in sorted string order
+        and is computed on the first lookup if not given. The arrays may be memory mapped.
+        '''
+        if buffer is None:
+            buffer=numpy.zeros(0,dtype=numpy.uint8)
+            offsets=numpy.zeros(1,dtype=numpy.int64)
+        self.buffer=buffer
+        self.offsets=offsets
+        self.order=order
+
+
+################################################################
+    ##
+    #Function to create a table from a sequence of strings
+    @classmethod
+    def from_strings(cls,strings):
+        '''Returns a table of the sequence strings (str or unicode, stored as UTF-8).'''
+        return cls(*_concatenate_strings([_key(s) for s in strings]))
+
+
+################################################################
+    ##
+    #Functions to access strings
+    def __len__(self):
+        return len(self.offsets)-1
+
+
+    def __getitem__(self,i):
+        '''Returns the string with index i.'''
+        return self.buffer[self.offsets[i]:self.offsets[i+1]].tostring()
+
+
+    def strings(self,indices=None):
+        '''Returns the list of strings with the given indices (all strings by default).'''
+        data=numpy.asarray(self.buffer).tostring()
+        offsets=numpy.asarray(self.offsets).tolist()
+        if indices is None:
+            indices=xrange(len(offsets)-1)
+        return [data[offsets[i]:offsets[i+1]] for i in indices]
+
+
+    def as_array(self):
+        '''Returns all strings as fixed width numpy string array.'''
+        return numpy.array(self.strings(),dtype=numpy.string_)
+
+
+    def sorted_order(self):
+        '''Returns the string indices in sorted string order.'''
+        if self.order is None:
+            self.order=numpy.argsort(self.as_array(),kind='mergesort')
+        return self.order
+
+
+################################################################
+    ##
+    #Functions to resolve strings to their index
+    def index(self,s):
+        '''Returns the index of the string s, -1 if it is not in the table.'''
+        s=_key(s)
+        order=self.sorted_order()
+        low=0
+        high=len(order)
+        while low<high:
+            middle=(low+high)//2
+            if self[order[middle]]<s:
+                low=middle+1
+            else:
+                high=middle
+        if low<len(order) and self[order[low]]==s:
+            return int(order[low])
+        return -1
+
+
+    def lookup_many(self,ids):
+        '''Returns an int64 array with the index of every string of the sequence ids, -1 for missing ones.'''
+        return numpy.fromiter((self.index(s) for s in ids),dtype=numpy.int64,count=len(ids))
+
+
+    def __contains__(self,s):
+        return self.index(s)>=0
+
+
+##################################################################################################################
+
+class InternTable(IdTable):
+    'Growable table interning id strings to consecutive integers, resolved through a hash index'
+
+################################################################
+    #Initialize table
+    def __init__(self,buffer=None,offsets=None):
+        IdTable.__init__(self,buffer,offsets)
+        #strings appended since the last compaction and their indices
+        self._pending=[]
+        self._pending_index={}
+        self.min_pending=1<<16
+        self._hash_strings(0)
+
+
+    #pickle the strings only, the hash index is rebuilt
+    def __getstate__(self):
+        self.compact()
+        return {'buffer':numpy.asarray(self.buffer),'offsets':numpy.asarray(self.offsets)}
+
+    def __setstate__(self,state):
+        self.__init__(state['buffer'],state['offsets'])
+
+
+################################################################
+    ##
+    #Functions to add strings
+    def append(self,s):
+        '''Append the string s, returns its index. Does not check whether s is in the table already.'''
+        s=_key(s)
+        i=len(self)
+        self._pending.append(s)
+        self._pending_index[s]=i
+        if len(self._pending)>max(self.min_pending,(len(self.offsets)-1)//2):
+            self.compact()
+        return i
+
+
+    def extend(self,strings):
+        '''Append the sequence strings, returns an int64 array of their indices. Does not check whether they are in the table already.'''
+        self.compact()
+        n_old=len(self)
+        buffer,offsets=_concatenate_strings([_key(s) for s in strings])
+        self.buffer=numpy.concatenate((numpy.asarray(self.buffer),buffer))
+        self.offsets=numpy.concatenate((numpy.asarray(self.offsets)[:-1],offsets+self.offsets[-1]))
+        self.order=None
+        self._hash_strings(n_old)
+        return numpy.arange(n_old,len(self),dtype=numpy.int64)
+
+
+    def compact(self):
+        '''Merge the pending strings into the arrays.'''
+        if len(self._pending)>0:
+            pending=self._pending
+            self._pending=[]
+            self._pending_index={}
+            self.extend(pending)
+
+
+    def _hash_strings(self,first):
+        #add the strings from index first on to the hash index
+        n=len(self.offsets)-1
+        data=self.buffer[self.offsets[first]:self.offsets[n]].tostring()
+        offsets=(numpy.asarray(self.offsets[first:])-self.offsets[first]).tolist()
+        hashes=numpy.fromiter((hash(data[offsets[i]:offsets[i+1]]) for i in xrange(n-first)),dtype=numpy.int64,count=n-first)
+        sort=numpy.argsort(hashes,kind='mergesort')
+        hashes=hashes[sort]
+        order=numpy.arange(first,n,dtype=numpy.int64)[sort]
+        if first==0:
+            self._hashes=hashes
+            self._hash_order=order
+        else:
+            #merge into the sorted hashes of the older strings
+            positions=self._hashes.searchsorted(hashes,side='right')
+            self._hashes=numpy.insert(self._hashes,positions,hashes)
+            self._hash_order=numpy.insert(self._hash_order,positions,order)
+
+
+################################################################
+    ##
+    #Functions to access strings
+    def __len__(self):
+        return len(self.offsets)-1+len(self._pending)
+
+
+    def __getitem__(self,i):
+        '''Returns the string with index i.'''
+        n=len(self.offsets)-1
+        if i>=n:
+            return self._pending[i-n]
+        return IdTable.__getitem__(self,i)
+
+
+    def strings(self,indices=None):
+        '''Returns the list of strings with the given indices (all strings by default).'''
+        if len(self._pending)>0:
+            self.compact()
+        return IdTable.strings(self,indices)
+
+
+################################################################
+    ##
+    #Functions to resolve strings to their index
+    def index(self,s):
+        '''Returns the index of the string s, -1 if it is not in the table.'''
+        s=_key(s)
+        i=self._pending_index.get(s,-1)
+        if i>=0:
+            return i
+        h=hash(s)
+        k=int(self._hashes.searchsorted(h))
+        while k<len(self._hashes) and self._hashes[k]==h:
+            i=int(self._hash_order[k])
+            if IdTable.__getitem__(self,i)==s:
+                return i
+            k+=1
+        return -1
+
+
+    def lookup_many(self,ids):
+        '''Returns an int64 array with the index of every string of the sequence ids, -1 for missing ones.'''
+        keys=[_key(s) for s in ids]
+        indices=-numpy.ones(len(keys),dtype=numpy.int64)
+        if len(keys)==0:
+            return indices
+        if len(self._hashes)>0:
+            hashes=numpy.fromiter((hash(s) for s in keys),dtype=numpy.int64,count=len(keys))
+            k=numpy.minimum(self._hashes.searchsorted(hashes),len(self._hashes)-1)
+            candidates=numpy.flatnonzero(self._hashes[k]==hashes)
+            found=[self.index(keys[j]) if IdTable.__getitem__(self,i)!=keys[j] else i #hash collision: resolve one by one
+                   for j,i in zip(candidates.tolist(),self._hash_order[k[candidates]].tolist())]
+            indices[candidates]=found
+        if len(self._pending)>0:
+            missing=numpy.flatnonzero(indices<0)
+            indices[missing]=[self._pending_index.get(keys[j],-1) for j in missing.tolist()]
+        return indices
+
+
+##################################################################################################################
+#Define module-wide functions
+
+def keys(ids):
+    '''Returns the list of byte strings under which the ids of the sequence ids are stored.'''
+    return [_key(s) for s in ids]
+
+
+def intern_table(ids,vertex_ids=None):
+    '''
+    Returns ids as InternTable, ids being an InternTable, a list of the ids in index order or a dictionary id -> index.
+    Indices missing from the dictionary (e.g. vertices created without an entry) get their string from the sequence vertex_ids
+    if given (e.g. the _graphml_vertex_id values of all vertices), the empty string otherwise. The table holds at least
+    len(vertex_ids) strings.
+    '''
+    if isinstance(ids,InternTable):
+        return ids
+    if not isinstance(ids,dict):
+        return InternTable.from_strings(ids)
+    n=max(ids.itervalues())+1 if len(ids)>0 else 0
+    if vertex_ids is not None:
+        vertex_ids=list(vertex_ids)
+        n=max(n,len(vertex_ids))
+    strings=[None]*n
+    for s,i in ids.iteritems():
+        strings[i]=s
+    for i in xrange(n):
+        if strings[i] is None:
+            strings[i]=vertex_ids[i] if vertex_ids is not None and i<len(vertex_ids) else ''
+    return InternTable.from_strings(strings)
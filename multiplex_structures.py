@@ -15,12 +15,30 @@ import time
 import pickle
 import copy
 import zipfile
+import io
 import os 
 import sys
 import datetime
-from dateutil import parser
 import psycopg2
 
+import dates
+import array_utils
+import bipartite_index
+import social_bias
+import snapshot
+import id_table
+import collab_builder
+import collab_distances
+import citation_trajectory
+import property_mapping
+import neighbourhood
+import time_views
+import collab_timeline
+import citation_net
+import db_stream
+import sharded_reader
+from pipeline import pipelined
+
 
 class PaperAuthorMultiplex():
     'Paper Citation and Author Collaboration Multiplex Structure'
@@ -33,20 +51,33 @@ class PaperAuthorMultiplex():
         self.collab = gt.Graph(directed=False)
         self.citation = gt.Graph(directed=True)
 
-        self.citation.vertex_properties['year']=self.citation.new_vertex_property('object')
+        self.citation.vertex_properties['year']=self.citation.new_vertex_property(dates.DATE_TYPE)
         self.citation.vertex_properties['_graphml_vertex_id']=self.citation.new_vertex_property('string')
-        self.citation.edge_properties['year']=self.citation.new_edge_property('object')
+        self.citation.edge_properties['year']=self.citation.new_edge_property(dates.DATE_TYPE)
         
-        self.collab.vertex_properties['year']=self.collab.new_vertex_property('object')
+        self.collab.vertex_properties['year']=self.collab.new_vertex_property(dates.DATE_TYPE)
         self.collab.vertex_properties['_graphml_vertex_id']=self.collab.new_vertex_property('string')
-        self.collab.edge_properties['first_year_collaborated']=self.collab.new_edge_property('object')
-        self.collab.edge_properties['year']=self.collab.new_edge_property('object')
+        self.collab.edge_properties['first_year_collaborated']=self.collab.new_edge_property(dates.DATE_TYPE)
+        self.collab.edge_properties['year']=self.collab.new_edge_property(dates.DATE_TYPE)
+        
+        #interlayer links paper<->author, by vertex index
+        self._multiplex = bipartite_index.BipartiteIndex()
+        
+        #paper and author ids -> vertex indices
+        self._collab_ids = id_table.InternTable()
+        self._citation_ids = id_table.InternTable()
+        
+        #collaboration dates per edge in aggregated mode, None for one parallel edge per date, see aggregate_collaborations()
+        self._collab_timeline = None
+        
+        #filters of recently used time windows, see between()
+        self._window_filters = time_views.LRUCache(16)
         
-        self._multiplex_collab = self.collab.new_vertex_property('object')
-        self._multiplex_citation = self.citation.new_vertex_property('object')
+        #citation counts kept up to date with added data, None if not tracked, see track_socially_biased_citations()
+        self._bias_counter = None
         
-        self._collab_graphml_vertex_id_to_gt_id = {}
-        self._citation_graphml_vertex_id_to_gt_id = {}
+        #sorted keys and dates of the collaboration edges for bulk inserts, see _collab_table()
+        self._collab_keys = None
 
 
 
@@ -55,16 +86,22 @@ class PaperAuthorMultiplex():
     ## HELPER FUNCTIONS
 
     def __new_author(self, author_id, year):
-        try:
-            gt_id=self._collab_graphml_vertex_id_to_gt_id[author_id]
+        gt_id=self._collab_ids.index(author_id)
+        if gt_id>=0:
             return self.collab.vertex(gt_id)    
-        except KeyError:
+        else:
             new_author = self.collab.add_vertex()
-            self._collab_graphml_vertex_id_to_gt_id[author_id]=self.collab.vertex_index[new_author]
-            self.collab.vertex_properties['year'][new_author]=parse_date(year)
+            self._collab_ids.append(author_id)
+            self.collab.vertex_properties['year'][new_author]=dates.parse_ordinal(year)
             self.collab.vertex_properties['_graphml_vertex_id'][new_author]=author_id
-            self._multiplex_collab[new_author]={}
             return new_author
+
+    #multiplex links of a vertex as lists of vertex objects of the other layer
+    def _paper_vertices_of(self, author):
+        return [self.citation.vertex(v) for v in self._multiplex.papers_of(int(author)).tolist()]
+
+    def _author_vertices_of(self, paper):
+        return [self.collab.vertex(v) for v in self._multiplex.authors_of(int(paper)).tolist()]
     
             
 ################################################################
@@ -78,18 +115,14 @@ class PaperAuthorMultiplex():
         '''
         
         #try whether paper exists already in citation network
-        try:
-            self._citation_graphml_vertex_id_to_gt_id[paper_id]
+        if paper_id in self._citation_ids:
             raise PaperIDExistsAlreadyError() #stop execution here with this error
-        except KeyError:
-            pass
         
         #add new paper to citation network and additional data structures
         new_paper=self.citation.add_vertex()
-        self._citation_graphml_vertex_id_to_gt_id[paper_id]=self.citation.vertex_index[new_paper]
+        self._citation_ids.append(paper_id)
         self.citation.vertex_properties['_graphml_vertex_id'][new_paper]=paper_id
-        self.citation.vertex_properties['year'][new_paper]=parse_date(year)
-        self._multiplex_citation[new_paper]={}
+        self.citation.vertex_properties['year'][new_paper]=dates.parse_ordinal(year)
         
         
         #add collaborations between authors on collab network
@@ -106,20 +139,73 @@ class PaperAuthorMultiplex():
     ##
     #Funtion to add multiplex interconnection
     def add_multiplex(self,paper_id,author_id,year):
-        try:
-            new_paper=self.citation.vertex(self._citation_graphml_vertex_id_to_gt_id[paper_id])
-        except KeyError:
+        paper_gt=self._citation_ids.index(paper_id)
+        if paper_gt>=0:
+            new_paper=self.citation.vertex(paper_gt)
+        else:
             new_paper=self.citation.add_vertex()
-            self._citation_graphml_vertex_id_to_gt_id[paper_id]=self.citation.vertex_index[new_paper]
+            self._citation_ids.append(paper_id)
             self.citation.vertex_properties['_graphml_vertex_id'][new_paper]=paper_id
-            self.citation.vertex_properties['year'][new_paper]=parse_date(year)
-            self._multiplex_citation[new_paper]={}            
+            self.citation.vertex_properties['year'][new_paper]=dates.parse_ordinal(year)
 
         new_author = self.__new_author(author_id, year)
 
         #add multiplex information
-        self._multiplex_collab[new_author][new_paper]=True
-        self._multiplex_citation[new_paper][new_author]=True
+        self._multiplex.add(int(new_paper),int(new_author))
+        if self._bias_counter is not None:
+            self._bias_counter.papers_changed([int(new_paper)])
+
+
+################################################################
+    ##
+    #Functions to add many papers and multiplex interconnections at once
+    def add_papers_many(self,paper_ids,years):
+        '''
+        Add the papers paper_ids (sequence of str) with publication dates years (sequence, any standard date format) to the citation network,
+        without authors. Raises PaperIDExistsAlreadyError, without adding any paper, if one of them exists already or is given twice.
+        Returns an int64 array of the vertex indices of the new papers.
+        '''
+        paper_ids=id_table.keys(paper_ids)
+        if len(set(paper_ids))<len(paper_ids) or numpy.any(self._citation_ids.lookup_many(paper_ids)>=0):
+            raise PaperIDExistsAlreadyError()
+        return self._vertices_many(self.citation,self._citation_ids,paper_ids,dates.parse_ordinals(years))
+
+
+    def add_multiplex_many(self,paper_ids,author_ids,years):
+        '''
+        Add the multiplex interconnections paper_ids[i]-author_ids[i] (sequences of str) of the rows (paper, author, date), see add_multiplex().
+        Missing papers and authors are created at once, with the date of the first row they appear in, and all links are added in bulk.
+        Returns int64 arrays of the vertex indices of the papers and of the authors of all rows.
+        '''
+        ordinals=dates.parse_ordinals(years)
+        papers=self._vertices_many(self.citation,self._citation_ids,paper_ids,ordinals)
+        authors=self._vertices_many(self.collab,self._collab_ids,author_ids,ordinals)
+        self._multiplex.add_many(papers,authors)
+        if self._bias_counter is not None:
+            self._bias_counter.papers_changed(papers)
+        return papers,authors
+
+
+    ##
+    #Helper function mapping ids (with day ordinals) to vertex indices of graph, missing vertices are added in order of first appearance
+    def _vertices_many(self,graph,ids,vertex_ids,ordinals):
+        vertex_ids=id_table.keys(vertex_ids)
+        if len(vertex_ids)==0:
+            return numpy.zeros(0,dtype=numpy.int64)
+        uniq,first,inverse=array_utils.unique_first(numpy.array(vertex_ids,dtype=numpy.string_))
+        uniq=uniq.tolist()
+        vertices=ids.lookup_many(uniq)
+        new=numpy.flatnonzero(vertices<0)
+        
+        if len(new)>0:
+            n_old=graph.num_vertices()
+            vertices[new]=ids.extend([uniq[k] for k in new.tolist()])
+            graph.add_vertex(len(new))
+            graph.vertex_properties['year'].a[n_old:]=ordinals[first[new]]
+            vertex_id=graph.vertex_properties['_graphml_vertex_id']
+            for v in xrange(n_old,n_old+len(new)):
+                vertex_id[graph.vertex(v)]=ids[v]
+        return vertices[inverse]
 
         
 
@@ -131,19 +217,16 @@ class PaperAuthorMultiplex():
         '''
         Add citation between two paper in citation network.
         '''
-        try:
-            cited_paper_gt=self._citation_graphml_vertex_id_to_gt_id[cited_paper]
-        except KeyError:
-            raise NoSuchPaperError()
-            
-        try:
-            citing_paper_gt=self._citation_graphml_vertex_id_to_gt_id[citing_paper]
-        except KeyError:
+        cited_paper_gt=self._citation_ids.index(cited_paper)
+        citing_paper_gt=self._citation_ids.index(citing_paper)
+        if cited_paper_gt<0 or citing_paper_gt<0:
             raise NoSuchPaperError()
 
         if self.citation.edge(cited_paper_gt,citing_paper_gt)==None:
             new_citation=self.citation.add_edge(cited_paper_gt,citing_paper_gt)
             self.citation.edge_properties['year'][new_citation]=self.citation.vertex_properties['year'][self.citation.vertex(citing_paper_gt)]
+            if self._bias_counter is not None:
+                self._bias_counter.add_citations([cited_paper_gt],[citing_paper_gt])
         else:
             raise CitationExistsAlreadyError()
                  
@@ -156,23 +239,30 @@ class PaperAuthorMultiplex():
         Add collaboration between two authors
         if provided `vpaper` (citations vertex), updates mutiplex structure
         '''
-        y = parse_date(year)
+        y = dates.parse_ordinal(year)
         if author1==author2: #simply add the author to the network, if not existing
             new_author = self.__new_author(author1, year)
             if vpaper:
-                self._multiplex_collab[new_author][vpaper]=True
-                self._multiplex_citation[vpaper][new_author]=True
+                self._multiplex.add(int(vpaper),int(new_author))
+                if self._bias_counter is not None:
+                    self._bias_counter.papers_changed([int(vpaper)])
             
         else: 
             for author in [author1,author2]:
                 new_author = self.__new_author(author, year)
             if vpaper:
-                self._multiplex_collab[new_author][vpaper]=True
-                self._multiplex_citation[vpaper][new_author]=True
+                self._multiplex.add(int(vpaper),int(new_author))
+                if self._bias_counter is not None:
+                    self._bias_counter.papers_changed([int(vpaper)])
 
             # add collaborations, if none exists FOR THAT DAY
-            a1_gt_id = self._collab_graphml_vertex_id_to_gt_id[author1]
-            a2_gt_id = self._collab_graphml_vertex_id_to_gt_id[author2]
+            a1_gt_id = self._collab_ids.index(author1)
+            a2_gt_id = self._collab_ids.index(author2)
+            if self._bias_counter is not None:
+                self._bias_counter.add_collaborations([a1_gt_id],[a2_gt_id],[y])
+            if self._collab_timeline is not None:
+                self._add_aggregated_collaboration(a1_gt_id, a2_gt_id, y)
+                return
             es = self.collab.edge(a1_gt_id, a2_gt_id, all_edges=True)
             
             if es == None:
@@ -192,14 +282,47 @@ class PaperAuthorMultiplex():
                     if first_collab == y:
                         for e in es:
                             self.collab.edge_properties['first_year_collaborated'][e]=first_collab
+
+    ##
+    #Helper function adding a collaboration at day ordinal y to the aggregated collaboration layer
+    def _add_aggregated_collaboration(self, a1_gt_id, a2_gt_id, y):
+        e = self.collab.edge(a1_gt_id, a2_gt_id)
+        if e == None:
+            e = self.collab.add_edge(a1_gt_id, a2_gt_id)
+            self.collab.edge_properties['count'][e] = 0
+            self.collab.edge_properties['first_year_collaborated'][e] = y
+            self.collab.edge_properties['last_year'][e] = y
+        if self._collab_timeline.add(self.collab.edge_index[e], y):
+            self.collab.edge_properties['count'][e] += 1
+            self.collab.edge_properties['first_year_collaborated'][e] = min(self.collab.edge_properties['first_year_collaborated'][e], y)
+            self.collab.edge_properties['last_year'][e] = max(self.collab.edge_properties['last_year'][e], y)
                         
 
 
 ###############################################################
 # MS - Function to read collab from db
-    def read_db_create_collab(self, conn, sql, paper_column=0,author_column=1):
-        '''Reads meta data from DB, adds these infos to the citation network and builds the collaboration network.'''
+    def read_db_create_collab(self, conn, sql, paper_column=0,author_column=1,stream=False,batch_size=100000,pipeline=False):
+        '''
+        Reads meta data from DB, adds these infos to the citation network and builds the collaboration network.
+        The rows are added in batches of batch_size rows at once (see add_authorships_many).
+        With stream=True the rows are fetched in batches of batch_size rows from a server side cursor,
+        conn may then also be an open DB-API connection.
+        With pipeline=True (implies stream=True) batches are fetched and their dates parsed by a producer thread 
+        while the previous batch is added.
+        '''
         print 'Make sure that the SQL query returns doi, author_id and date'
+        if stream==True or pipeline==True:
+            batches=db_stream.fetch_batches(conn,sql,batch_size)
+            decode=lambda rows: ([row[paper_column] for row in rows],[row[author_column] for row in rows],
+                                 dates.parse_ordinals([row[2] for row in rows]))
+            if pipeline==True:
+                batches=pipelined(batches,decode)
+            else:
+                batches=itertools.imap(decode,batches)
+            for paper_ids,author_ids,ordinals in batches:
+                self._add_meta_rows(paper_ids,author_ids,ordinals)
+            return
+
         conn = psycopg2.connect( **conn )
         cur = conn.cursor()
         cur.execute( sql )
@@ -207,50 +330,215 @@ class PaperAuthorMultiplex():
         t_prev=time.time()
         t_cum=0
 
-        for line in cur:
-
-            cou+=1
-            if cou-10000*(cou/10000)==0:
-                print 'Lines read: '+str(cou)
-                t=time.time()   
-                t_cum+=t-t_prev
-                t_prev=t
-                print 'Time passed: '+str(t_cum)
+        while True:
+            rows=list(itertools.islice(cur,batch_size))
+            if len(rows)==0:
+                break
+            # date is imported as datetime object
+            self._add_meta_rows([row[paper_column] for row in rows],[row[author_column] for row in rows],dates.parse_ordinals([row[2] for row in rows]))
 
-            tmp=list(line)
-            author_id=tmp[author_column]
-            paper_id=tmp[paper_column]
-            year=tmp[2]#.timetuple()[0]   # date is imported as datetime object
-
-            try:
-                #see whether paper is already in
-                paper = self.citation.vertex(self._citation_graphml_vertex_id_to_gt_id[paper_id])
-                self.citation.vertex_properties['year'][paper]=year
-                # add the citation dates to the citation network
-                for citation in paper.in_edges():
-                    self.citation.edge_properties['year'][citation]=year
-            except KeyError:
-                #otherwise add it
-                self.add_paper(paper_id,year,[author_id],update_collaborations=False)
-                paper = self.citation.vertex(self._citation_graphml_vertex_id_to_gt_id[paper_id])
-
-
-## TODO add collaboration weights with timestamps
-            coauth = self._multiplex_citation[paper].keys()
-            for i in coauth:
-                coauthor_id=self.collab.vertex_properties['_graphml_vertex_id'][i]
-                self.add_collaboration(author_id,coauthor_id,year)
-            self.add_multiplex(paper_id,author_id,year)
+            cou+=len(rows)
+            print 'Lines read: '+str(cou)
+            t=time.time()   
+            t_cum+=t-t_prev
+            t_prev=t
+            print 'Time passed: '+str(t_cum)
 
         cur.close()
         conn.close()
 
+    ##
+    #Function to add many rows of meta data at once
+    def add_authorships_many(self,paper_ids,author_ids,years):
+        '''
+        Add the meta data rows (paper_ids[i], author_ids[i], years[i]) at once, with the same result as adding them one by one in order:
+        missing papers and authors are created, the year of every paper (and of the citations it makes) is the date of its last row,
+        and the author of every row collaborates with all authors linked to the paper before, at the date of the row.
+        Collaborations are built by grouping the rows by paper, see module collab_builder.
+        '''
+        self._add_meta_rows(paper_ids,author_ids,dates.parse_ordinals(years))
+
+    ##
+    #Helper function adding rows of meta data with dates given as day ordinals
+    def _add_meta_rows(self,paper_ids,author_ids,ordinals):
+        ordinals=numpy.asarray(ordinals,dtype=numpy.int64)
+        if len(ordinals)==0:
+            return
+        papers=self._vertices_many(self.citation,self._citation_ids,paper_ids,ordinals)
+        authors=self._vertices_many(self.collab,self._collab_ids,author_ids,ordinals)
+        
+        #papers get the date of their last row, as do the citations they make
+        uniq,last=numpy.unique(papers[::-1],return_index=True)
+        self.citation.vertex_properties['year'].a[uniq]=ordinals[len(papers)-1-last]
+        row_of,index=array_utils.in_edge_arrays(self.citation,uniq)
+        self.citation.edge_properties['year'].a[index]=self.citation.vertex_properties['year'].a[uniq[row_of]]
+        
+        #collaborations with the authors linked to the papers before
+        paper_ptr,paper_authors=self._multiplex.paper_csr(self.citation.num_vertices())
+        author1,author2,date=collab_builder.collaboration_pairs(papers,authors,ordinals,paper_ptr,paper_authors)
+        self._add_collaboration_arrays(author1,author2,date)
+        self._multiplex.add_many(papers,authors)
+        if self._bias_counter is not None:
+            self._bias_counter.papers_changed(papers)
+
+    ##
+    #Helper function inserting collaborations (author1 < author2, date) as returned by collab_builder.collaboration_pairs
+    def _add_collaboration_arrays(self,author1,author2,date):
+        if self._bias_counter is not None:
+            self._bias_counter.add_collaborations(author1,author2,date)
+        if self._collab_timeline is not None:
+            self._add_aggregated_collaboration_arrays(author1,author2,date)
+            return
+        year=self.collab.edge_properties['year']
+        first_year=self.collab.edge_properties['first_year_collaborated']
+        
+        table_keys,table_dates,table_edges=self._collab_table()
+        new,pos,first,lowered_starts,lowered_ends,lowered_first=collab_builder.merge_collaborations(author1,author2,date,table_keys,table_dates)
+        row_of,lowered=array_utils.ranges(lowered_starts,lowered_ends)
+        first_year.a[table_edges[lowered]]=lowered_first[row_of]
+        author1,author2,date=author1[new],author2[new],date[new]
+        if len(author1)==0:
+            return
+        
+        n_old=self.collab.num_edges()
+        contiguous=self.collab.edge_index_range==n_old
+        self.collab.add_edge_list(numpy.column_stack((author1,author2)))
+        keys=collab_builder.collaboration_keys(author1,author2)
+        if contiguous:
+            edges=numpy.arange(n_old,n_old+len(keys),dtype=numpy.int64)
+        else:
+            #indices of removed edges are reused, parallel edges of a pair are alike but for their dates, match the new edges to the dates by pair
+            source,target,index=array_utils.edge_arrays(self.collab)
+            fresh=~array_utils.in_sorted(index,numpy.sort(table_edges))
+            edges=index[fresh][numpy.argsort(collab_builder.collaboration_keys(source[fresh],target[fresh]),kind='mergesort')]
+        year.a[edges]=date
+        first_year.a[edges]=first
+        
+        #merge the new collaborations into the table
+        self._collab_keys=numpy.insert(table_keys,pos,keys)
+        self._collab_dates=numpy.insert(table_dates,pos,date)
+        self._collab_edges=numpy.insert(table_edges,pos,edges)
+        self._collab_keys_state=(id(self.collab),self.collab.num_edges())
+
+    ##
+    #Helper function returning the table of collaboration edges (keys, dates and edge indices sorted by key and date, see collab_builder.collaboration_table),
+    #kept by _add_collaboration_arrays and rebuilt if the collaborations were changed otherwise
+    def _collab_table(self):
+        state=(id(self.collab),self.collab.num_edges())
+        if getattr(self,'_collab_keys',None) is None or self._collab_keys_state!=state:
+            source,target,index=array_utils.edge_arrays(self.collab)
+            self._collab_keys,self._collab_dates,order=collab_builder.collaboration_table(source,target,self.collab.edge_properties['year'].a[index])
+            self._collab_edges=index[order]
+            self._collab_keys_state=state
+        return self._collab_keys,self._collab_dates,self._collab_edges
+
+    ##
+    #Helper function inserting collaborations (author1 < author2, date) into the aggregated collaboration layer
+    def _add_aggregated_collaboration_arrays(self,author1,author2,date):
+        if len(author1)==0:
+            return
+        n_authors=max(self.collab.num_vertices(),1)
+        keys=array_utils.pair_keys(author1,author2,n_authors)
+        pair_keys,pair_edges=self._collab_pair_edges()
+        
+        #one new edge per new pair
+        new_keys=numpy.unique(keys[~array_utils.in_sorted(keys,pair_keys)])
+        if len(new_keys)>0:
+            self.collab.add_edge_list(numpy.column_stack((new_keys//n_authors,new_keys%n_authors)))
+            pair_keys,pair_edges=self._collab_pair_edges()
+        
+        edges=pair_edges[numpy.searchsorted(pair_keys,keys)]
+        self._collab_timeline.add_many(edges,date)
+        self._update_collab_summary(numpy.unique(edges))
+
+    ##
+    #Helper function returning the sorted pair keys of the aggregated collaboration edges and their edge indices
+    def _collab_pair_edges(self):
+        source,target,index=array_utils.edge_arrays(self.collab)
+        keys=array_utils.pair_keys(numpy.minimum(source,target),numpy.maximum(source,target),max(self.collab.num_vertices(),1))
+        order=numpy.argsort(keys)
+        return keys[order],index[order]
+
+    ##
+    #Helper function writing count, first and last date of the edges (indices) from the timeline
+    def _update_collab_summary(self,edges):
+        count,first,last=self._collab_timeline.summary(self.collab.edge_index_range)
+        self.collab.edge_properties['count'].a[edges]=count[edges]
+        self.collab.edge_properties['first_year_collaborated'].a[edges]=first[edges]
+        self.collab.edge_properties['last_year'].a[edges]=last[edges]
+
+    ##
+    #Function to switch the collaboration layer to aggregated mode
+    def aggregate_collaborations(self):
+        '''
+        Collapse the parallel collaboration edges (one per pair of authors and date) into one edge per pair of authors,
+        with edge properties count (number of dates), first_year_collaborated and last_year. The dates of every pair are kept
+        in CSR form (see module collab_timeline) and returned by collaboration_dates(). Other edge properties of the collaboration layer are dropped.
+        Collaborations added afterwards are aggregated as well. Call it on an empty multiplex to build the aggregated layer directly.
+        '''
+        if self._collab_timeline is not None:
+            return
+        n_authors=max(self.collab.num_vertices(),1)
+        source,target,index=array_utils.edge_arrays(self.collab)
+        years=self.collab.edge_properties['year'].a[index]
+        pairs,pair_of=numpy.unique(array_utils.pair_keys(numpy.minimum(source,target),numpy.maximum(source,target),n_authors),return_inverse=True)
+        
+        self.collab.clear_edges()
+        self._collab_keys=None
+        for name in list(self.collab.edge_properties.keys()):
+            del self.collab.edge_properties[name]
+        self.collab.edge_properties['count']=self.collab.new_edge_property('int32_t')
+        self.collab.edge_properties['first_year_collaborated']=self.collab.new_edge_property(dates.DATE_TYPE)
+        self.collab.edge_properties['last_year']=self.collab.new_edge_property(dates.DATE_TYPE)
+        self.collab.add_edge_list(numpy.column_stack((pairs//n_authors,pairs%n_authors)))
+        
+        pair_keys,pair_edges=self._collab_pair_edges()
+        edges=pair_edges[numpy.searchsorted(pair_keys,pairs)][pair_of]
+        self._collab_timeline=collab_timeline.CollabTimeline.from_edges(edges,years,self.collab.edge_index_range)
+        self._update_collab_summary(pair_edges)
+
+    ##
+    #Function to get the dates of the collaborations of two authors
+    def collaboration_dates(self,author1,author2):
+        '''Returns the sorted array of distinct day ordinals of the collaborations of the authors author1 and author2 (str).'''
+        a1_gt_id=self._collab_ids.index(author1)
+        a2_gt_id=self._collab_ids.index(author2)
+        if a1_gt_id<0 or a2_gt_id<0:
+            raise NoSuchAuthorError()
+        if self._collab_timeline is not None:
+            e=self.collab.edge(a1_gt_id,a2_gt_id)
+            if e == None:
+                return numpy.zeros(0,dtype=numpy.int32)
+            return self._collab_timeline.dates_of(self.collab.edge_index[e])
+        es=self.collab.edge(a1_gt_id,a2_gt_id,all_edges=True)
+        return numpy.unique(numpy.array([self.collab.edge_properties['year'][e] for e in es],dtype=numpy.int32))
+
+    ##
+    #Function to filter collaborations by date
+    def collab_edge_filter(self,start,end):
+        '''
+        Returns a boolean edge property map of the collaboration layer marking the edges with a collaboration in the range
+        start <= date <= end (any standard date format, years as int cover the whole year), for use with set_edge_filter() or GraphView.
+        In aggregated mode, pairs are marked if one of their dates is in the range.
+        '''
+        start,end=dates.window(start,end)
+        mask=self.collab.new_edge_property('bool')
+        if self._collab_timeline is not None:
+            mask.a=self._collab_timeline.edge_mask(start,end,self.collab.edge_index_range)
+        else:
+            mask.a=dates.in_window(self.collab.edge_properties['year'].a,start,end)
+        return mask
+
 
 
 ###############################################################
     # MS - Function to read meta data into a custom property map        
-    def read_prop(self, conn, sql, name, tp = 'object', p_or_a = 'p', v_or_e = 'v'):
-        '''Reads meta data from DB and adds as a property map'''
+    def read_prop(self, conn, sql, name, tp = 'object', p_or_a = 'p', v_or_e = 'v', stream=False, batch_size=100000):
+        '''
+        Reads meta data from DB and adds as a property map.
+        With stream=True the rows are fetched in batches of batch_size rows from a server side cursor and scalar vertex
+        properties are set per batch, conn may then also be an open DB-API connection.
+        '''
         print '''Make sure that the SQL query returns doi and 
         property in case of (v)ertex property and doi, doi, property in case of (e)dge property'''
 
@@ -263,6 +551,13 @@ class PaperAuthorMultiplex():
         elif v_or_e[0]=='e' and p_or_a[0]=='a':
             self.collab.edge_properties[name]=self.collab.new_edge_property(tp)
 
+        if stream==True:
+            for rows in db_stream.fetch_batches(conn,sql,batch_size):
+                if v_or_e[0]=='v':
+                    self._set_vertex_prop(name,p_or_a,[row[0] for row in rows],[row[1] for row in rows])
+                # (e)dge properties are yet to be written
+            return
+
         conn = psycopg2.connect( **conn )
         cur = conn.cursor()
         cur.execute( sql )
@@ -285,18 +580,16 @@ class PaperAuthorMultiplex():
             prop_value=tmp[1]
 
             if v_or_e[0]=='v' and p_or_a[0]=='p':
-                try:
-                    paper = self.citation.vertex(self._citation_graphml_vertex_id_to_gt_id[ elem ]) #see whether the elem is already in
-                    self.citation.vertex_properties[name][paper] = prop_value
-                except KeyError:
-                    pass #otherwise pass
+                paper_gt = self._citation_ids.index(elem) #see whether the elem is already in
+                if paper_gt>=0:
+                    self.citation.vertex_properties[name][self.citation.vertex(paper_gt)] = prop_value
+                #otherwise pass
 
             elif v_or_e[0]=='v' and p_or_a[0]=='a':
-                try:
-                    author = self.collab.vertex(self._collab_graphml_vertex_id_to_gt_id[ elem ]) #see whether the elem is already in
-                    self.collab.vertex_properties[name][author] = prop_value
-                except KeyError:
-                    pass #otherwise pass
+                author_gt = self._collab_ids.index(elem) #see whether the elem is already in
+                if author_gt>=0:
+                    self.collab.vertex_properties[name][self.collab.vertex(author_gt)] = prop_value
+                #otherwise pass
 
             if v_or_e[0]=='e' and p_or_a[0]=='p':   # yet to be written
                 pass 
@@ -305,49 +598,67 @@ class PaperAuthorMultiplex():
 
         cur.close()
         conn.close()
+    ##
+    #Helper function setting the vertex property name of the papers (p_or_a='p') or authors ('a') elems to values, unknown elems are skipped
+    def _set_vertex_prop(self,name,p_or_a,elems,values):
+        if p_or_a[0]=='p':
+            graph,ids=self.citation,self._citation_ids
+        else:
+            graph,ids=self.collab,self._collab_ids
+        prop=graph.vertex_properties[name]
+        
+        vertices=ids.lookup_many(elems)
+        found=numpy.flatnonzero(vertices>=0)
+        if len(found)==0:
+            return
+        if prop.value_type() in snapshot.SCALAR_TYPES:
+            prop.a[vertices[found]]=numpy.asarray(values)[found]
+            if graph is self.citation and name=='year' and self._bias_counter is not None:
+                self._bias_counter.papers_changed(vertices[found])
+        else:
+            for k in found.tolist():
+                prop[graph.vertex(int(vertices[k]))]=values[k]
+                
 ################################################################        
     ##
     #Function to read collab from meat-file
-    def read_meta_create_collab(self,meta_file, header=True,paper_column=0,author_column=1,delimiter=' '):
-        '''Reads meta data file, adds these infos to the citation network and builds the collaboration network.'''
+    def read_meta_create_collab(self,meta_file, header=True,paper_column=0,author_column=1,delimiter=' ',pipeline=False,chunk_size=100000,processes=1):
+        '''
+        Reads meta data file, adds these infos to the citation network and builds the collaboration network.
+        The file is read in chunks of chunk_size lines, the rows of every chunk are added at once (see add_authorships_many).
+        With pipeline=True the chunks are split and their dates parsed by a producer thread while the previous chunk is added.
+        With processes!=1 (None for all cores) the file is parsed in parallel by worker processes, see sharded_reader.parse_file.
+        '''
+        if processes!=1:
+            tables,indices,ordinals=sharded_reader.parse_file(meta_file,delimiter,[[paper_column],[author_column]],[2],header,processes)
+            self._add_meta_rows(tables[0][indices[0][:,0]],tables[1][indices[1][:,0]],ordinals[0])
+            return
+        
         with open(meta_file,'r') as f:
             
             if header==True:
                 f.readline()
             
+            def decode(lines):
+                paper_ids,author_ids,timestmps=array_utils.split_columns(lines,delimiter,[paper_column,author_column,2])
+                return paper_ids,author_ids,dates.parse_ordinals(timestmps)
+            if pipeline==True:
+                chunks=pipelined(array_utils.line_chunks(f,chunk_size),decode)
+            else:
+                chunks=itertools.imap(decode,array_utils.line_chunks(f,chunk_size))
+            
             cou=0
             t_prev=time.time()
             t_cum=0
-            
-            for line in f:
+            for paper_ids,author_ids,ordinals in chunks:
+                self._add_meta_rows(paper_ids,author_ids,ordinals)
                 
-                cou+=1
-                if cou-10000*(cou/10000)==0:
-                    print 'Lines read: '+str(cou)
-                    t=time.time()
-                    t_cum+=t-t_prev
-                    t_prev=t
-                    print 'Time passed: '+str(t_cum)
-                
-                tmp=line.split(delimiter)
-                author_id=tmp[author_column]
-                paper_id=tmp[paper_column]
-                year=parse_date(tmp[2].rstrip())
-                
-                try:
-                    paper = self.citation.vertex(self._citation_graphml_vertex_id_to_gt_id[paper_id]) #see whether paper is already in
-                    self.citation.vertex_properties['year'][paper]=year
-                except KeyError:
-                    self.add_paper(paper_id,year,[author_id],update_collaborations=False) #otherwise add it
-                    paper = self.citation.vertex(self._citation_graphml_vertex_id_to_gt_id[paper_id])
-                
-                
-                
-                coauth = self._multiplex_citation[paper].keys()
-                for i in coauth:
-                    coauthor_id=self.collab.vertex_properties['_graphml_vertex_id'][i]
-                    self.add_collaboration(author_id,coauthor_id,year)
-                self.add_multiplex(paper_id,author_id,year)
+                cou+=len(paper_ids)
+                print 'Lines read: '+str(cou)
+                t=time.time()
+                t_cum+=t-t_prev
+                t_prev=t
+                print 'Time passed: '+str(t_cum)
 
 ################################################################        
     ##
@@ -355,17 +666,15 @@ class PaperAuthorMultiplex():
     def read_citation_graphml(self,citation_file):
         '''Reads a citation graphml file and writes the citation layer.'''
         self.citation = gt.load_graph(citation_file)
+        self._bias_counter = None
         
-        self.citation.vertex_properties['year']=self.citation.new_vertex_property('object')
+        self.citation.vertex_properties['year']=self.citation.new_vertex_property(dates.DATE_TYPE)
         
-        for v in self.citation.vertices():
-            self._multiplex_citation[v]={}
-
-        #since I do not know how to address a node in graph_tool using his properties, create a dictionary to have this info:
-        self._citation_graphml_vertex_id_to_gt_id = {}
+        #links of the old citation layer are meaningless for the new one
+        self._multiplex = bipartite_index.BipartiteIndex(self.citation.num_vertices(),self.collab.num_vertices())
 
-        for v in self.citation.vertices(): 
-            self._citation_graphml_vertex_id_to_gt_id[self.citation.vertex_properties['_graphml_vertex_id'][v]]=int(self.citation.vertex_index[v])
+        #since I do not know how to address a node in graph_tool using his properties, create an id table to have this info:
+        self._citation_ids = id_table.InternTable.from_strings([self.citation.vertex_properties['_graphml_vertex_id'][v] for v in self.citation.vertices()])
         
 
 ################################################################        
@@ -383,27 +692,18 @@ class PaperAuthorMultiplex():
 
         #read data
         self.collab = gt.load_graph(collab_file)
+        self._collab_timeline = None
+        self._bias_counter = None
+        self._collab_keys = None
         self.citation = gt.load_graph(citation_file)
-        self.citation.vertex_properties['year']=self.citation.new_vertex_property('object')
-
-        #create the multiplex structure, implemented with property maps
-        self._multiplex_collab = self.collab.new_vertex_property('object')
-        self._multiplex_citation = self.citation.new_vertex_property('object')
-
-        for v in self.collab.vertices():
-            self._multiplex_collab[v]={}
-        for v in self.citation.vertices():
-            self._multiplex_citation[v]={}
+        self.citation.vertex_properties['year']=self.citation.new_vertex_property(dates.DATE_TYPE)
 
-        #since I do not know how to address a node in graph_tool using his properties, create a dictionary to have this info:
-        self._collab_graphml_vertex_id_to_gt_id = {}
-        self._citation_graphml_vertex_id_to_gt_id = {}
+        #create the multiplex structure, implemented as bipartite index
+        self._multiplex = bipartite_index.BipartiteIndex(self.citation.num_vertices(),self.collab.num_vertices())
 
-        for v in self.collab.vertices(): 
-            self._collab_graphml_vertex_id_to_gt_id[self.collab.vertex_properties['_graphml_vertex_id'][v]]=int(self.collab.vertex_index[v])
-
-        for v in self.citation.vertices(): 
-            self._citation_graphml_vertex_id_to_gt_id[self.citation.vertex_properties['_graphml_vertex_id'][v]]=int(self.citation.vertex_index[v])
+        #since I do not know how to address a node in graph_tool using his properties, create id tables to have this info:
+        self._collab_ids = id_table.InternTable.from_strings([self.collab.vertex_properties['_graphml_vertex_id'][v] for v in self.collab.vertices()])
+        self._citation_ids = id_table.InternTable.from_strings([self.citation.vertex_properties['_graphml_vertex_id'][v] for v in self.citation.vertices()])
 
         #fill the multiplex
         with open(mult_file,'r') as f:
@@ -419,58 +719,52 @@ class PaperAuthorMultiplex():
                 author_tmp = tmp[1]
                 year = parse_date(tmp[2].rstrip())
 
-                try:
-                    paper_obj = self.citation.vertex(self._citation_graphml_vertex_id_to_gt_id[paper_tmp])
-                except KeyError:
-                    v=self.citation.add_vertex()
-                    self.citation.vertex_properties['_graphml_vertex_id'][v]=paper_tmp
-                    self._multiplex_citation[v]={}
+                paper_gt = self._citation_ids.index(paper_tmp)
+                if paper_gt>=0:
+                    paper_obj = self.citation.vertex(paper_gt)
+                else:
                     paper_obj = self.add_paper(paper_tmp,year,author_tmp,update_collaborations=False)
 
-                try:
-                    author_obj = self.collab.vertex(self._collab_graphml_vertex_id_to_gt_id[author_tmp])
-                except KeyError:
+                author_gt = self._collab_ids.index(author_tmp)
+                if author_gt>=0:
+                    author_obj = self.collab.vertex(author_gt)
+                else:
                     v=self.collab.add_vertex()
+                    self._collab_ids.append(author_tmp)
                     self.collab.vertex_properties['_graphml_vertex_id'][v]=author_tmp
-                    self._multiplex_collab[v]={}
                     author_obj = v
                     
-                self.citation.vertex_properties['year'][paper_obj]=year
+                self.citation.vertex_properties['year'][paper_obj]=dates.to_ordinal(year)
 
-                self._multiplex_collab[author_obj][paper_obj] = True
-                self._multiplex_citation[paper_obj][author_obj] = True
+                self._multiplex.add(int(paper_obj),int(author_obj))
 
 ################################################################
     ##
     #Show all papers by one author
     def papers_by(self,author_id):
         '''Returns a list of paper (citation) vertex objects that specified author has (co)authored.'''
-        try:
-            author=self.collab.vertex(self._collab_graphml_vertex_id_to_gt_id[author_id])
-            return self._multiplex_collab[author].keys()
-        except KeyError:
+        author_gt=self._collab_ids.index(author_id)
+        if author_gt<0:
             raise NoSuchAuthorError()
+        return self._paper_vertices_of(author_gt)
         
 ################################################################
     ##
     #Show all papers by one author
     def authors_of(self,paper_id):
         '''Returns a list of author (collaboration) vertex objects that have (co)authored the specified paper.'''
-        try:
-            paper=self.citation.vertex(self._citation_graphml_vertex_id_to_gt_id[paper_id])
-            return self._multiplex_citation[paper].keys()
-        except KeyError:
+        paper_gt=self._citation_ids.index(paper_id)
+        if paper_gt<0:
             raise NoSuchPaperError()
+        return self._author_vertices_of(paper_gt)
             
 ################################################################
     ##
     #Degree sequence of citation->collaboration links = "distribution" of # authors/paper
     def distribution_authors(self,paper_vertex_iterator):
         '''Returns a list of the number of authors for the papers specified in the iterator'''
-        number_authors=[]
-        for v in paper_vertex_iterator:
-            number_authors.append(len(self._multiplex_citation[v].keys()))
-        return number_authors
+        papers=numpy.fromiter((int(v) for v in paper_vertex_iterator),dtype=numpy.int64)
+        return self._multiplex.n_authors_of(papers).tolist()
         
 
 ################################################################
@@ -478,16 +772,19 @@ class PaperAuthorMultiplex():
     #Degree sequence of collaboration->citation links = "distribution" of # papers/author
     def distribution_papers(self,author_vertex_iterator):
         '''Returns a list of the number of papers for the authors specified in the iterator'''
-        number_papers=[]
-        for v in author_vertex_iterator:
-            number_papers.append(len(self._multiplex_collab[v].keys()))
-        return number_papers
+        authors=numpy.fromiter((int(v) for v in author_vertex_iterator),dtype=numpy.int64)
+        return self._multiplex.n_papers_of(authors).tolist()
     
 ################################################################
     ##
     #Function to multiplex-map proeprty maps, eventually aggregating and aggregation function
-    def multiplex_property_mapping(self,origin_layer_iterator,origin_layer_property,target_layer_property,direction=None,aggregation_function=None):
-        '''Returns list of collaboration net properties for selection of nodes and their according multiplex-mapped property, aggregated using aggregation_function.'''
+    def multiplex_property_mapping(self,origin_layer_iterator,origin_layer_property,target_layer_property,direction=None,aggregation_function=None,as_arrays=False):
+        '''
+        Returns list of collaboration net properties for selection of nodes and their according multiplex-mapped property, aggregated using aggregation_function.
+        aggregation_function is one of the built-in reducers 'mean', 'max', 'min', 'sum', 'count', 'first', 'median', computed as segment reductions
+        over the paper<->author incidence (see module property_mapping), or a Python function of a list of values (slow path).
+        Vertices without multiplex links are left out. With as_arrays=True, returns aligned arrays (origin vertex indices, origin values, mapped values).
+        '''
     
         if direction == None:
             print "###################################"
@@ -495,105 +792,95 @@ class PaperAuthorMultiplex():
             print "USE direction='collab_to_citation' OR direction='citation_to_collab'"
             print "####################################"
             return
-    
+        
+        if aggregation_function==None:
+            print "##############################"
+            print "Assuming one-to-one multiplex!"
+            print "Consider checking this assumption using check_one_to_one()!"
+            print "Otherwise, specify aggregation function!"
+            print "##############################"
+            aggregation_function='first'
+        
+        origin=numpy.fromiter((int(v) for v in origin_layer_iterator),dtype=numpy.int64)
+        origin,target_layer_property_values=self._map_property(origin,target_layer_property,direction,aggregation_function)
+        origin_graph=self.collab if direction == 'collab_to_citation' else self.citation
+        origin_layer_property_values=_property_array(origin_graph,origin_layer_property)[origin]
+        
+        if as_arrays==True:
+            return origin,origin_layer_property_values,target_layer_property_values
+        return origin_layer_property_values.tolist(), target_layer_property_values.tolist()
+
+    ##
+    #Function to map a property map of one layer onto the other
+    def multiplex_property_map(self,target_layer_property,direction,aggregation_function='mean'):
+        '''
+        Returns a vertex property map of the origin layer of direction ('collab_to_citation' or 'citation_to_collab') holding,
+        for every vertex, the target_layer_property values of its multiplex linked vertices reduced by aggregation_function
+        (see multiplex_property_mapping). Vertices without links get 0 for 'count', nan otherwise.
+        '''
+        origin_graph=self.collab if direction == 'collab_to_citation' else self.citation
+        origin,values=self._map_property(numpy.arange(origin_graph.num_vertices()),target_layer_property,direction,aggregation_function)
+        if aggregation_function=='count':
+            prop=origin_graph.new_vertex_property('int64_t')
+        else:
+            prop=origin_graph.new_vertex_property('double')
+            prop.a[:]=numpy.nan
+        prop.a[origin]=values
+        return prop
+
+    ##
+    #Helper function reducing the target_layer_property values linked to the vertices origin, returns the vertices with links and their values
+    def _map_property(self,origin,target_layer_property,direction,aggregation_function):
         if direction == 'collab_to_citation':
-    
-            origin_layer_property_values=[]
-            target_layer_property_values=[]
-    
-            if aggregation_function==None:
-            
-                print "##############################"
-                print "Assuming one-to-one multiplex!"
-                print "Consider checking this assumption using check_one_to_one()!"
-                print "Otherwise, specify aggregation function!"
-                print "##############################"
-            
-                for v in origin_layer_iterator:
-                    try:
-                        target_vertex = self._multiplex_collab[v].keys()[0]
-                        origin_layer_property_values.append(origin_layer_property[v])
-                        target_layer_property_values.append(target_layer_property[target_vertex])
-                    except IndexError: #if there is no target vertex, simply don't consider it
-                        pass
-            else:
-                for v in origin_layer_iterator:
-                    try:
-                        target_vertex = self._multiplex_collab[v].keys()[0]
-                        origin_layer_property_values.append(origin_layer_property[v])
-                        target_layer_property_values_TMP=[]
-                        for target_vs in self._multiplex_collab[v].keys():
-                            target_layer_property_values_TMP.append(target_layer_property[target_vs])
-                        target_layer_property_values.append(aggregation_function(target_layer_property_values_TMP))
-                    except IndexError: #if there is no target vertex, simply don't consider it
-                        pass
-                    
-            return origin_layer_property_values, target_layer_property_values
-                    
-                    
-        if direction == 'citation_to_collab':
-            origin_layer_property_values=[]
-            target_layer_property_values=[]
-    
-            if aggregation_function==None:
-                print "Assuming one-to-one multiplex!"
-                print "Consider checking this assumption using check_one_to_one()!"
-                print "Otherwise, specify aggregation function!"
-                for v in origin_layer_iterator:
-                    try:
-                        target_vertex = self._multiplex_citation[v].keys()[0]
-                        origin_layer_property_values.append(origin_layer_property[v])
-                        target_layer_property_values.append(target_layer_property[target_vertex])
-                    except IndexError: #if there is no target vertex, simply don't consider it
-                        pass
-            else:
-                for v in origin_layer_iterator:
-                    try:
-                        self._multiplex_citation[v].keys()[0]
-                        origin_layer_property_values.append(origin_layer_property[v])
-                        target_layer_property_values_TMP=[]
-                        for target_vs in self._multiplex_citation[v].keys():
-                            target_layer_property_values_TMP.append(target_layer_property[target_vs])
-                        target_layer_property_values.append(aggregation_function(target_layer_property_values_TMP))
-                    except IndexError: #if there is no target vertex, simply don't consider it
-                        continue
-                
-            return origin_layer_property_values, target_layer_property_values
+            target_graph=self.citation
+            indptr,indices=self._multiplex.author_csr(self.collab.num_vertices())
+        elif direction == 'citation_to_collab':
+            target_graph=self.collab
+            indptr,indices=self._multiplex.paper_csr(self.citation.num_vertices())
+        else:
+            raise ValueError("direction must be 'collab_to_citation' or 'citation_to_collab'")
+        
+        segment_ptr,values=property_mapping.gather(indptr,indices,origin,_property_array(target_graph,target_layer_property))
+        values=property_mapping.reduce_segments(segment_ptr,values,aggregation_function)
+        #if there is no target vertex, simply don't consider it
+        return origin[numpy.diff(segment_ptr)>0],values
 
 
 
     ################################################################
     ## Function to calculate shortest path in collab network at time of publication
-    def shortest_path_collab_formation(self,new_collab_year):
-        '''Calculate shortest path at time of first collaboration'''
+    def shortest_path_collab_formation(self,new_collab_year,max_depth=None,processes=1):
+        '''
+        Calculate shortest path at time of first collaboration.
+        Returns {collaboration edge: distance} for the collaborations first made in new_collab_year, see collab_formation_distances().
+        In aggregated mode (see aggregate_collaborations) every pair of authors is one edge, and so one entry of the result.
+        '''
+        print new_collab_year
+        edges,years,distances=self.collab_formation_distances([new_collab_year],max_depth,processes)
+        distance_of=dict(itertools.izip(edges.tolist(),distances.tolist()))
     
         shortest_distances={}
-    
-        mask_collab = self.collab.new_edge_property('bool')
-
-        for year in [new_collab_year]:
-            print year
-            new_collabs=gt.graph_tool.util.find_edge(self.collab,self.collab.edge_properties['first_year_collaborated'],year)
-            #set filter of collabs younger than year
-            mask_collab.a = False
-            for e in gt.graph_tool.util.find_edge_range(self.collab,self.collab.edge_properties['first_year_collaborated'],[1892,year-1]):
-                mask_collab[e] = True
-        
-            #Set filters for analysis
-            self.collab.set_edge_filter(mask_collab)
-        
-            #calculate shortest distance for all first-time-collabs of year
-            for e in new_collabs:
-                source = e.source()
-                target = e.target()
-                shortest_distances[e] = gt.graph_tool.topology.shortest_distance(self.collab,source,target)
-            
-            #reset graph filters
-            self.collab.set_edge_filter(None)
-            self.collab.set_vertex_filter(None)
+        first_year_collaborated = self.collab.edge_properties['first_year_collaborated']
+        new_collabs=gt.graph_tool.util.find_edge_range(self.collab,first_year_collaborated,[dates.year_start(new_collab_year),dates.year_end(new_collab_year)])
+        for e in new_collabs:
+            shortest_distances[e] = distance_of[self.collab.edge_index[e]]
     
         return shortest_distances
 
+    ################################################################
+    ## Function to calculate shortest paths in collab network at the formation of collaborations over many years
+    def collab_formation_distances(self,years,max_depth=None,processes=1,chunk_size=1000):
+        '''
+        Returns typed arrays (edge indices, years, distances) with the distance between the authors of every collaboration
+        first made in one of the calendar years years, in the collaboration network of the collaborations first made before
+        (from 1892 on). Authors not connected within max_depth steps (None for no bound) get collab_distances.UNREACHABLE.
+        The years are walked in order on one date sorted adjacency, one breadth first search per author and year serves all of
+        the new collaborations of the author; chunks of chunk_size searches are run by processes worker processes.
+        '''
+        source,target,index=array_utils.edge_arrays(self.collab)
+        first=self.collab.edge_properties['first_year_collaborated'].a[index]
+        return collab_distances.formation_distances(source,target,index,first,self.collab.num_vertices(),years,max_depth,processes,chunk_size)
+
 
     ################################################################
     ## Function to calculate multiplex neighbourhood of v in layer 1. 
@@ -604,10 +891,10 @@ class PaperAuthorMultiplex():
         
         #define helper functions, necessary as using a lambda function would disabkle pickling of objects later ...
         def ret_multiplex_citation_key(x):
-            return self._multiplex_citation[x].keys()
+            return self._author_vertices_of(x)
         
         def ret_multiplex_collab_key(x):
-            return self._multiplex_collab[x].keys()
+            return self._paper_vertices_of(x)
         
         
         if layer==None:
@@ -618,16 +905,42 @@ class PaperAuthorMultiplex():
             return
                 
         if layer=='collab':
-            multiplex_neighbours_TMP=itertools.imap(ret_multiplex_citation_key,self._multiplex_collab[vertex_object].keys())
+            multiplex_neighbours_TMP=itertools.imap(ret_multiplex_citation_key,self._paper_vertices_of(vertex_object))
             multiplex_neighbours=itertools.chain.from_iterable(multiplex_neighbours_TMP)
             return multiplex_neighbours
         
         if layer=='citation':
-            multiplex_neighbours_TMP=itertools.imap(ret_multiplex_collab_key,self._multiplex_citation[vertex_object].keys())
+            multiplex_neighbours_TMP=itertools.imap(ret_multiplex_collab_key,self._author_vertices_of(vertex_object))
             multiplex_neighbours=itertools.chain.from_iterable(multiplex_neighbours_TMP)
             return multiplex_neighbours
 
 
+    ################################################################
+    ## Function to calculate the multiplex neighbourhoods of many vertices at once
+    def multiplex_neighbours_many(self,vertices,layer,exclude_self=False,counts=False,processes=1,chunk_size=10000):
+        '''
+        Returns CSR arrays (indptr, neighbours) of the distinct multiplex neighbours (vertex indices in layer) of every vertex
+        in the sequence vertices of layer ('collab' or 'citation'): the neighbours of vertices[i] are neighbours[indptr[i]:indptr[i+1]], sorted.
+        With exclude_self=True the vertices are not their own neighbours. With counts=True, also returns the array
+        of the number of shared papers (authors) with every neighbour.
+        Computed as sparse product over the paper<->author incidence in chunks of chunk_size vertices by processes workers, see module neighbourhood.
+        '''
+        vertices=numpy.fromiter((int(v) for v in vertices),dtype=numpy.int64)
+        paper_ptr,paper_authors=self._multiplex.paper_csr(self.citation.num_vertices())
+        author_ptr,author_papers=self._multiplex.author_csr(self.collab.num_vertices())
+        if layer=='collab':
+            indptr,neighbours,shared=neighbourhood.two_hop(author_ptr,author_papers,paper_ptr,paper_authors,vertices,self.collab.num_vertices(),
+                                                           exclude_self,processes,chunk_size)
+        elif layer=='citation':
+            indptr,neighbours,shared=neighbourhood.two_hop(paper_ptr,paper_authors,author_ptr,author_papers,vertices,self.citation.num_vertices(),
+                                                           exclude_self,processes,chunk_size)
+        else:
+            raise ValueError("layer must be 'collab' or 'citation'")
+        if counts==True:
+            return indptr,neighbours,shared
+        return indptr,neighbours
+
+
     ################################################################
     ## Function to get vertex_id's from vertex objects
     def vertex_id(self,iterable_of_vertices,layer=None):
@@ -635,10 +948,10 @@ class PaperAuthorMultiplex():
     
         #define helper functions, necessary as using a lambda function would disabkle pickling of objects later ...
         def ret_collab_vertex_prop(x):
-            return self.collab.vertex_properties['_graphml_vertex_id'][x]
+            return self._collab_ids[int(x)]
             
         def ret_citation_vertex_prop(x):
-            return self.citation.vertex_properties['_graphml_vertex_id'][x]
+            return self._citation_ids[int(x)]
         
         
         if layer==None:
@@ -656,100 +969,193 @@ class PaperAuthorMultiplex():
 
     ################################################################
     ## Function to calculate socially biased citations
-    def socially_biased_citations(self):
-        '''Calculate number of socially-biased citations'''
+    def socially_biased_citations(self,processes=1,chunk_size=1000000,as_arrays=False):
+        '''
+        Calculate number of socially-biased citations.
+        The citations are classified on integer arrays, split into chunks of about chunk_size citations that are processed by processes worker processes.
+        With as_arrays=True, returns arrays of citations, self citations and socially biased citations indexed by citation vertex index.
+        '''
         print 'Calculating socially biased citation statistics...'
         print '--------------'
         print 'Consider executing check_citation_causality() first!'
+        if self._bias_counter is not None:
+            self._refresh_bias_counter()
+            citations=self._bias_counter.citations.copy()
+            self_citations=self._bias_counter.self_citations.copy()
+            biased_citations=self._bias_counter.biased_citations.copy()
+        else:
+            cite_ptr,classes=self._citation_classes(processes,chunk_size)
+            citations,self_citations,biased_citations=social_bias.count_citations(cite_ptr,classes)
+        if as_arrays==True:
+            return citations,self_citations,biased_citations
+
         citation_dictionary={}
-        for paper in self.citation.vertices():
-            year = self.citation.vertex_properties['year'][paper]
-            biased_citations=0
-            self_citations=0
-            citations=0
-            authors = self._multiplex_citation[paper].keys()
-            earlier_collaborators = []
-
-            for a in authors:
-                for n in a.all_neighbours():
-                    if self.collab.edge_properties['first_year_collaborated'][self.collab.edge(a,n)]< year:
-                        earlier_collaborators.append(n)
-                
-            for citing_paper in paper.out_neighbours():
-                citations+=1
-                citing_authors = self._multiplex_citation[citing_paper].keys()
-                if set(authors).intersection(set(citing_authors)): #count self-citations
-                    self_citations+=1
-                    continue #if continue is not given, the three citation counts are not additive, i.e. a self-citation can additionally be a  socially biased citation
-                if earlier_collaborators and set(earlier_collaborators).intersection(set(citing_authors)).difference(authors): #add biased citation if citing author is former coauthor of at least one of the authors; exclude self-citations here
-                    biased_citations+=1
-            citation_dictionary[self.citation.vertex_properties['_graphml_vertex_id'][paper]]=[citations,self_citations,biased_citations]
-
-            # print '--------------'
-            # print 'paper: '+self.citation.vertex_properties['_graphml_vertex_id'][paper]
-            # print 'citations: '+str(citations)
-            # print 'self citation: '+str(self_citations)
-            # print 'socially biased citations: '+str(biased_citations)
+        citations=citations.tolist()
+        self_citations=self_citations.tolist()
+        biased_citations=biased_citations.tolist()
+        for i,paper_id in enumerate(self._citation_ids.strings()):
+            citation_dictionary[paper_id]=[citations[i],self_citations[i],biased_citations[i]]
         print 'Output Format: {paper:[citations,self citations, socially biased citations],... }'
         return citation_dictionary
 
+    ##
+    #Function to check the causality of the citation layer
+    def check_citation_causality(self,as_array=False,remove=False,resolution='date'):
+        '''
+        Checks the citation layer with citation_net.check_citation_causality(). Citations removed with remove=True
+        are recorded for the socially biased citation counts, see track_socially_biased_citations().
+        '''
+        return citation_net.check_citation_causality(self.citation,as_array,remove,resolution,self._bias_counter)
+
+    ##
+    #Function to keep socially biased citation counts up to date
+    def track_socially_biased_citations(self):
+        '''
+        Count citations, self citations and socially biased citations once and keep the counts up to date afterwards:
+        citations, collaborations and paper-author links added by add_citation(), add_collaboration(), add_paper(), add_multiplex()
+        and the batch loaders are recorded, and socially_biased_citations() recounts only the papers they affect
+        (see social_bias.BiasCounter), including earlier citations whose authors' first collaboration moved earlier.
+        Citations removed by check_citation_causality(remove=True) of the multiplex are recorded, the papers they cited are recounted.
+        Other changes of the citation layer are detected by the changed number of citations, an edge filter is ignored.
+        Reading a multiplex from files ends the tracking.
+        '''
+        counter=social_bias.BiasCounter()
+        source,target,index=array_utils.edge_arrays(self.collab)
+        counter.add_collaborations(source,target,self.collab.edge_properties['first_year_collaborated'].a[index])
+        source,target,index=array_utils.edge_arrays(self.citation)
+        counter.add_citations(source,target)
+        self._bias_counter=counter
+        self._refresh_bias_counter()
+
+    ##
+    #Helper function recounting the papers affected by the data added since the last refresh
+    def _refresh_bias_counter(self):
+        #citations removed or added without being recorded, the edges hidden by an edge filter of the caller count as well
+        if self.citation.num_edges(ignore_filter=True)!=self._bias_counter.n_citations():
+            edge_filter,inverted=self.citation.get_edge_filter()
+            self.citation.set_edge_filter(None)
+            source,target,index=array_utils.edge_arrays(self.citation)
+            if edge_filter is not None:
+                self.citation.set_edge_filter(edge_filter,inverted=inverted)
+            self._bias_counter.set_citations(source,target)
+        paper_ptr,paper_authors=self._multiplex.paper_csr(self.citation.num_vertices())
+        author_ptr,author_papers=self._multiplex.author_csr(self.collab.num_vertices())
+        return self._bias_counter.refresh(paper_ptr,paper_authors,author_ptr,author_papers,self.citation.vertex_properties['year'].a)
+
+    ##
+    #Helper function classifying all citations, returns the citation CSR row pointer and the class of every citation
+    def _citation_classes(self,processes,chunk_size):
+        n_papers=self.citation.num_vertices()
+        n_authors=self.collab.num_vertices()
+
+        paper_ptr,paper_authors=self._multiplex.paper_csr(n_papers)
+        source,target,index=array_utils.edge_arrays(self.collab)
+        collab_ptr,collab_nbr,collab_first=social_bias.collaborators(source,target,self.collab.edge_properties['first_year_collaborated'].a[index],n_authors)
+        source,target,index=array_utils.edge_arrays(self.citation)
+        cite_ptr,cite_tgt=social_bias.citations(source,target,n_papers)
+
+        classes=social_bias.classify_citations(paper_ptr,paper_authors,collab_ptr,collab_nbr,collab_first,cite_ptr,cite_tgt,
+                                               self.citation.vertex_properties['year'].a,processes,chunk_size)
+        return cite_ptr,classes
+
 
  
     ################################################################
     ## Function to calculate citations of papers in years yr after yd years
-    def citation_success(self,yr,yd,perc):
-        #create property map
-        citation_success=self.citation.new_vertex_property("double")
-        citation_success_perc=self.citation.new_vertex_property("bool")    
-        perc_cuts=[]
-            
-        for y in yr:
-            print y,'...'
-            #find vertices
-            y1_vertices = gt.find_vertex(self.citation,self.citation.vertex_properties['year'],y)
-            y1yd_vertices = gt.find_vertex_range(self.citation,self.citation.vertex_properties['year'],[y,y+yd])
-    
-            #set vertex filter property
-            print 'Set filter prop...'
-            y1yd_filter_prop=self.citation.new_vertex_property("bool")
-            y1_filter_prop=self.citation.new_vertex_property("bool")
-            y1yd_filter_prop.a=False
-            y1_filter_prop.a=False
-            for v in y1yd_vertices:
-                y1yd_filter_prop[v]=True
-            for v in y1_vertices:
-                y1_filter_prop[v]=True
-    
-            #calculate graph_view of the subgraph of y,y+yd
-            print 'Calc graph view ...'
-            sub_cite_degree = self.citation.new_vertex_property("double")
-            self.citation.set_vertex_filter(y1yd_filter_prop)
-            sub_cite_degree.fa = self.citation.degree_property_map('out').fa
-            #there are a lot of zeros ... so the percentile percentage has to be quite high
-            self.citation.set_vertex_filter(None)
-            self.citation.set_vertex_filter(y1_filter_prop)
-            tmp = sub_cite_degree.fa
-            percentile_cut = numpy.percentile(tmp,perc)
-            perc_cuts.append(percentile_cut)
-            print 'Percentile cut is ',percentile_cut
-            self.citation.set_vertex_filter(None)
-
-        
-            print 'Write success ...'
-
-            #write number of citations and success bool after yd years
-            self.citation.set_vertex_filter(y1_filter_prop)
-            citation_success.fa = tmp.copy()
-            print 'There are ',numpy.count_nonzero(tmp>percentile_cut),' nodes exceeding the percentile cut.'
-            citation_success_perc.fa = (tmp > percentile_cut).copy()
-            self.citation.set_vertex_filter(None)
+    def citation_success(self,yr,yd,perc,trajectory=None):
+        '''
+        For the papers published in the years yr, writes the number of citations received from papers published
+        up to yd years later into a property map, and marks the papers with more citations than the perc-th percentile
+        of their publication year. Returns (citation counts, success flags, percentile cuts per year of yr).
+        yd may be a sequence of windows: then lists of these results, one per window, are returned.
+        All windows and years are computed in one pass over the citation arrays,
+        or from the CitationTrajectory trajectory if given (see citation_trajectories) without touching the graph.
+        '''
+        many_windows=isinstance(yd,(list,tuple,numpy.ndarray))
+        windows=list(yd) if many_windows else [yd]
+        paper_years = dates.years(self.citation.vertex_properties['year'].a)
+        if trajectory is None:
+            counts=self._citations_within(paper_years,windows)
+        else:
+            counts=[trajectory.counts_within(w) for w in windows]
         
-            
-        return citation_success, citation_success_perc,perc_cuts
+        #papers of the cohorts yr grouped by year
+        cohort_years=numpy.array(yr,dtype=numpy.int64).ravel()
+        cohort=numpy.flatnonzero(array_utils.in_sorted(paper_years,numpy.unique(cohort_years)))
+        cohort=cohort[numpy.argsort(paper_years[cohort],kind='mergesort')]
+        bounds=numpy.searchsorted(paper_years[cohort],numpy.column_stack((cohort_years,cohort_years+1)))
         
+        results=[]
+        for w,count in enumerate(counts):
+            citation_success=self.citation.new_vertex_property("double")
+            citation_success_perc=self.citation.new_vertex_property("bool")
+            tmp=count[cohort]
+            perc_cuts=[]
+            for y,(first,last) in itertools.izip(cohort_years.tolist(),bounds.tolist()):
+                percentile_cut = numpy.percentile(tmp[first:last],perc)
+                perc_cuts.append(percentile_cut)
+                print y,'(',windows[w],'years): percentile cut is ',percentile_cut,', ',numpy.count_nonzero(tmp[first:last]>percentile_cut),' nodes exceed it.'
+                citation_success_perc.a[cohort[first:last]]=tmp[first:last]>percentile_cut
+            citation_success.a[cohort]=tmp
+            results.append((citation_success,citation_success_perc,perc_cuts))
         
+        if not many_windows:
+            return results[0]
+        return tuple(list(x) for x in zip(*results)) if len(results)>0 else ([],[],[])
+
+    ##
+    #Helper function counting for every paper the citations by papers published 0 to yd years after it, for every yd in windows
+    def _citations_within(self,paper_years,windows):
+        cited,citing,index=array_utils.edge_arrays(self.citation)
+        dy=paper_years[citing]-paper_years[cited]
+        valid=(paper_years[cited]!=0)&(paper_years[citing]!=0)&(dy>=0)&(dy<=max(windows+[-1]))
+        cited=cited[valid]
+        dy=dy[valid]
+        return [numpy.bincount(cited[dy<=yd],minlength=len(paper_years)) for yd in windows]
 
         
+
+        
+    ################################################################
+    ## Function to calculate the yearly citation counts of all papers
+    def citation_trajectories(self):
+        '''
+        Returns the CitationTrajectory (sparse paper x years since publication citation counts, see module citation_trajectory)
+        of all citations, dated by the year property of the citation edges. Later citation batches can be added with its append().
+        '''
+        cited,citing,index=array_utils.edge_arrays(self.citation)
+        return citation_trajectory.CitationTrajectory.from_citations(cited,self.citation.edge_properties['year'].a[index],
+                                                                     self.citation.vertex_properties['year'].a)
+
+    ################################################################
+    ## Functions to view the multiplex in a time window
+    def as_of(self,date):
+        '''Returns a MultiplexView of the multiplex as of date, see between().'''
+        return self.between(None,date)
+
+    def between(self,start,end):
+        '''
+        Returns a MultiplexView of the time window from start to end (any standard date format, years as int cover the whole year,
+        None for an open window): GraphViews of the papers published and citations made in the window (.citation),
+        of the authors appearing up to its end and the collaborations made in the window (.collab), and the paper-author links among them.
+        The shared graphs are not filtered, views of several windows can be used at the same time.
+        The filters are computed from the date arrays and cached for the 16 most recently used windows;
+        call clear_view_cache() after changing dates of existing vertices or edges.
+        '''
+        first,last=dates.window(start,end)
+        key=(first,last,id(self.citation),id(self.collab),self.citation.num_vertices(),self.citation.num_edges(),
+             self.collab.num_vertices(),self.collab.num_edges(),len(self._multiplex))
+        filters=self._window_filters.get(key)
+        if filters is None:
+            filters=time_views.window_filters(self,first,last)
+            self._window_filters.put(key,filters)
+        return time_views.view(self,first,last,filters)
+
+    def clear_view_cache(self):
+        '''Drop the cached filters of time windows.'''
+        self._window_filters.clear()
+
+
     ################################################################
     ## Pickle the multiplex structure
     def save(self,filename):
@@ -764,33 +1170,34 @@ class PaperAuthorMultiplex():
         #f.close()
 
         f = open(filename+'_citation_ids.pickle','wb')
-        pickle.dump(self._citation_graphml_vertex_id_to_gt_id,f)
+        pickle.dump(self._citation_ids.strings(),f,pickle.HIGHEST_PROTOCOL)
         f.close()
 
         f = open(filename+'_collab_ids.pickle','wb')
-        pickle.dump(self._collab_graphml_vertex_id_to_gt_id,f)
+        pickle.dump(self._collab_ids.strings(),f,pickle.HIGHEST_PROTOCOL)
         f.close()
+
+        if self._collab_timeline is not None:
+            ptr,ordinals=self._collab_timeline.csr(self.collab.edge_index_range)
+            numpy.save(filename+'_collab_timeline_ptr.npy',ptr)
+            numpy.save(filename+'_collab_timeline_dates.npy',ordinals)
     
         f = open(filename+'_citation_multiplex.pickle','wb')
         tmp={}
-        for v in self.citation.vertices():
-            v_id=self.citation.vertex_index[v]
+        for v_id in xrange(self.citation.num_vertices()):
             tmp[v_id]={}
-            for w in self._multiplex_citation[v].keys():
-                if self._multiplex_citation[v][w]==True:
-                    tmp[v_id][self.collab.vertex_index[w]]=True
+            for w_id in self._multiplex.authors_of(v_id).tolist():
+                tmp[v_id][w_id]=True
         pickle.dump(tmp,f)
         f.close()
 
 
         f = open(filename+'_collab_multiplex.pickle','w')
         tmp={}
-        for v in self.collab.vertices():
-            v_id=self.collab.vertex_index[v]
+        for v_id in xrange(self.collab.num_vertices()):
             tmp[v_id]={}
-            for w in self._multiplex_collab[v].keys():
-                if self._multiplex_collab[v][w]==True:
-                    tmp[v_id][self.citation.vertex_index[w]]=True
+            for w_id in self._multiplex.papers_of(v_id).tolist():
+                tmp[v_id][w_id]=True
         pickle.dump(tmp,f)
         f.close()
 
@@ -807,6 +1214,11 @@ class PaperAuthorMultiplex():
             os.remove(filename+'_citation_multiplex.pickle')
             saved.write(filename+'_collab_multiplex.pickle', os.path.basename(filename)+'_collab_multiplex.pickle')
             os.remove(filename+'_collab_multiplex.pickle')
+            if self._collab_timeline is not None:
+                saved.write(filename+'_collab_timeline_ptr.npy', os.path.basename(filename)+'_collab_timeline_ptr.npy')
+                os.remove(filename+'_collab_timeline_ptr.npy')
+                saved.write(filename+'_collab_timeline_dates.npy', os.path.basename(filename)+'_collab_timeline_dates.npy')
+                os.remove(filename+'_collab_timeline_dates.npy')
             
 
     ################################################################
@@ -820,26 +1232,56 @@ class PaperAuthorMultiplex():
         with zipfile.ZipFile(filename, 'r') as saved:
             self.citation = gt.load_graph(saved.open(f+'_citation.gt'))
             self.collab = gt.load_graph(saved.open(f+'_collaboration.gt'))
-            self._citation_graphml_vertex_id_to_gt_id = pickle.load(saved.open(f+'_citation_ids.pickle'))
-            self._collab_graphml_vertex_id_to_gt_id = pickle.load(saved.open(f+'_collab_ids.pickle'))
-
+            self._bias_counter = None
+            self._collab_keys = None
+            #the ids are saved as lists in vertex order, files written before the id tables hold dictionaries id -> vertex index
+            #whose gaps (vertices without entry) are filled from the vertex id property maps
+            self._citation_ids = id_table.intern_table(pickle.load(saved.open(f+'_citation_ids.pickle')),_vertex_ids(self.citation))
+            self._collab_ids = id_table.intern_table(pickle.load(saved.open(f+'_collab_ids.pickle')),_vertex_ids(self.collab))
+            #aggregated collaboration layers only, the timeline is saved as its CSR arrays
+            self._collab_timeline = None
+            if f+'_collab_timeline_ptr.npy' in saved.namelist():
+                self._collab_timeline = collab_timeline.CollabTimeline.from_csr(_zip_array(saved,f+'_collab_timeline_ptr.npy'),
+                                                                                _zip_array(saved,f+'_collab_timeline_dates.npy'))
+            #files written by earlier versions pickle the timeline object
+            elif f+'_collab_timeline.pickle' in saved.namelist():
+                self._collab_timeline = pickle.load(saved.open(f+'_collab_timeline.pickle'))
+
+            #both pickles hold the same links, the citation side suffices to rebuild the index
             tmp = pickle.load(saved.open(f+'_citation_multiplex.pickle'))
-            for v_id in tmp.keys():
-                v=self.citation.vertex(v_id)
-                self._multiplex_citation[v]={}
-                for w_id in tmp[v_id].keys():
-                    if tmp[v_id][w_id]==True:
-                        w=self.collab.vertex(w_id)
-                        self._multiplex_citation[v][w]=True
-
-            tmp = pickle.load(saved.open(f+'_collab_multiplex.pickle'))
-            for v_id in tmp.keys():
-                v=self.collab.vertex(v_id)
-                self._multiplex_collab[v]={}
-                for w_id in tmp[v_id].keys():
-                    if tmp[v_id][w_id]==True:
-                        w=self.citation.vertex(w_id)
-                        self._multiplex_collab[v][w]=True
+            papers=[v_id for v_id in tmp.keys() for w_id in tmp[v_id].keys() if tmp[v_id][w_id]==True]
+            authors=[w_id for v_id in tmp.keys() for w_id in tmp[v_id].keys() if tmp[v_id][w_id]==True]
+            self._multiplex = bipartite_index.BipartiteIndex.from_pairs(papers,authors,self.citation.num_vertices(),self.collab.num_vertices())
+
+
+    ################################################################
+    ## Write the multiplex structure as binary snapshot
+    def save_snapshot(self,path):
+        '''Write the multiplex into the directory path as binary columnar snapshot (numpy arrays), see module snapshot.'''
+        snapshot.save(self,path)
+
+    ################################################################
+    ## Read Multiplex Structure from a binary snapshot
+    def load_snapshot(self,path):
+        '''Read the multiplex from the snapshot directory path and its delta segments, arrays are memory mapped if there are no segments.'''
+        snapshot.load(self,path)
+        self._window_filters.clear()
+        self._bias_counter = None
+        self._collab_keys = None
+
+    ################################################################
+    ## Append the changes to a binary snapshot
+    def append_snapshot(self,path,max_deltas=None):
+        '''
+        Append the changes since the multiplex was saved to or loaded from the snapshot directory path as delta segment,
+        see module snapshot. With max_deltas, the snapshot is compacted into a new base once it has more segments.
+        Returns the number of delta segments of the snapshot.
+        '''
+        n_deltas=snapshot.save_delta(self,path)
+        if max_deltas is not None and n_deltas>max_deltas:
+            snapshot.compact(self,path)
+            n_deltas=0
+        return n_deltas
 
 
     def copy(self):
@@ -851,22 +1293,180 @@ class PaperAuthorMultiplex():
     def __copy__(self):
         return self.copy()                        
 
+
+##################################################################################################################
+##################################################################################################################
+#Define read-only multiplex
+
+class ReadOnlyMultiplex():
+    'Read-only paper-author multiplex backed by the memory mapped arrays of a snapshot, see module snapshot'
+
+################################################################
+    #Open snapshot
+    def __init__(self,path):
+        '''
+        Open the snapshot directory path. Edge lists, property maps, vertex id tables and the bipartite index stay memory mapped,
+        so that processes working on the same snapshot share their pages. No graphs and no dictionaries are built.
+        Arrays with delta segments are merged in memory, compact the snapshot to map them again.
+        '''
+        self._open(path)
+
+    def _open(self,path):
+        self.path=path
+        snapshot.recover(path)
+        self.header=snapshot.read_header(path)
+        self.paper_ids=snapshot.read_ids(path,'citation')
+        self.author_ids=snapshot.read_ids(path,'collab')
+        self.citation_edges=snapshot.read_edges(path,'citation')
+        self.collab_edges=snapshot.read_edges(path,'collab')
+        #collaboration dates per row of collab_edges for aggregated collaboration layers, None otherwise
+        self.collab_timeline=snapshot.read_timeline(path,self.header)
+        self._multiplex=snapshot.read_links(path,self.header)
+
+    #pickle the path only, e.g. when passed to pool workers
+    def __getstate__(self):
+        return {'path':self.path}
+
+    def __setstate__(self,state):
+        self._open(state['path'])
+
+
+################################################################
+    ##
+    #Functions to access property maps
+    def vertex_property(self,layer,name):
+        '''Returns the array of the scalar vertex property map name of layer ('citation' or 'collab'), e.g. vertex_property('citation','year').'''
+        if name not in self.header[layer]['properties']['vertex']:
+            raise KeyError(name)
+        return snapshot.read_property(self.path,layer,'vertex',name)
+
+    def edge_property(self,layer,name):
+        '''Returns the array of the scalar edge property map name of layer, in the order of the rows of the edge list.'''
+        if name not in self.header[layer]['properties']['edge']:
+            raise KeyError(name)
+        return snapshot.read_property(self.path,layer,'edge',name)
+
+
+################################################################
+    ##
+    #Functions to resolve vertex ids
+    def _id_table(self,layer):
+        if layer=='citation':
+            return self.paper_ids
+        if layer=='collab':
+            return self.author_ids
+        raise ValueError("layer must be 'citation' or 'collab'")
+
+    def vertex_index(self,vertex_id,layer):
+        '''Returns the vertex index of the vertex id string vertex_id in layer, -1 if there is no such vertex.'''
+        return self._id_table(layer).index(vertex_id)
+
+    def vertex_id(self,iterable_of_vertices,layer):
+        '''Returns an iterator of vertex id strings of the vertex indices in iterable_of_vertices, being members of layer.'''
+        return itertools.imap(self._id_table(layer).__getitem__,iterable_of_vertices)
+
+
+################################################################
+    ##
+    #Show all papers by one author
+    def papers_by(self,author_id):
+        '''Returns an array of paper (citation) vertex indices that specified author has (co)authored.'''
+        author=self.author_ids.index(author_id)
+        if author<0:
+            raise NoSuchAuthorError()
+        return self._multiplex.papers_of(author)
+
+    ##
+    #Show all authors of one paper
+    def authors_of(self,paper_id):
+        '''Returns an array of author (collaboration) vertex indices that have (co)authored the specified paper.'''
+        paper=self.paper_ids.index(paper_id)
+        if paper<0:
+            raise NoSuchPaperError()
+        return self._multiplex.authors_of(paper)
+
+
+################################################################
+    ##
+    #Function to calculate socially biased citations
+    def socially_biased_citations(self,processes=1,chunk_size=1000000,as_arrays=False):
+        '''Calculate number of socially-biased citations, see PaperAuthorMultiplex.socially_biased_citations.'''
+        n_papers=self.header['citation']['vertices']
+        n_authors=self.header['collab']['vertices']
+
+        collab_ptr,collab_nbr,collab_first=social_bias.collaborators(self.collab_edges[:,0],self.collab_edges[:,1],
+                                                                     self.edge_property('collab','first_year_collaborated'),n_authors)
+        cite_ptr,cite_tgt=social_bias.citations(self.citation_edges[:,0],self.citation_edges[:,1],n_papers)
+        classes=social_bias.classify_citations(self._multiplex.paper_ptr,self._multiplex.paper_authors,collab_ptr,collab_nbr,collab_first,
+                                               cite_ptr,cite_tgt,self.vertex_property('citation','year'),processes,chunk_size)
+        citations,self_citations,biased_citations=social_bias.count_citations(cite_ptr,classes)
+        if as_arrays==True:
+            return citations,self_citations,biased_citations
+        return dict(itertools.izip(self.paper_ids.strings(),
+                                   [list(x) for x in itertools.izip(citations.tolist(),self_citations.tolist(),biased_citations.tolist())]))
+
     
 ##################################################################################################################
 ##################################################################################################################
 #Define module-wide functions
 
         
+########## VALUES OF A PROPERTY MAP
+def _property_array(graph,prop):
+    '''Returns the values of the vertex property map prop of graph as array indexed by vertex index.'''
+    if prop.value_type() in snapshot.SCALAR_TYPES:
+        return prop.a
+    values=numpy.empty(graph.num_vertices(),dtype=object)
+    values[:]=[prop[v] for v in graph.vertices()]
+    return values
+
+
+########## VERTEX IDS OF A GRAPH
+def _vertex_ids(graph):
+    '''Returns the list of the _graphml_vertex_id values of all vertices of graph, None if graph has no such property map.'''
+    if '_graphml_vertex_id' not in graph.vertex_properties:
+        return None
+    vertex_id=graph.vertex_properties['_graphml_vertex_id']
+    return [vertex_id[v] for v in graph.vertices()]
+
+
+def _zip_array(saved,name):
+    '''Returns the numpy array stored in the .npy member name of the open ZipFile saved.'''
+    return numpy.load(io.BytesIO(saved.read(name)))
+
+
 ########## LOAD A MULTILAYER NETWORK
 def load(filename):
     '''
-    Create a `multiplex` object and populate it from a ZIP pickle
+    Create a `multiplex` object and populate it from a ZIP pickle or a snapshot directory
     '''
 
     M = PaperAuthorMultiplex()
-    M.load(filename)
+    snapshot.recover(filename)
+    if snapshot.is_snapshot(filename):
+        M.load_snapshot(filename)
+    else:
+        M.load(filename)
     return M
-    
+
+
+########## OPEN A SNAPSHOT READ-ONLY
+def open_snapshot(path):
+    '''
+    Returns a ReadOnlyMultiplex on the snapshot directory path (see PaperAuthorMultiplex.save_snapshot).
+    The arrays are memory mapped and shared between processes opening or forking from the same snapshot.
+    '''
+    return ReadOnlyMultiplex(path)
+
+
+########## COMPACT A SNAPSHOT
+def compact_snapshot(path):
+    '''
+    Merge the delta segments of the snapshot directory path (see PaperAuthorMultiplex.append_snapshot) into a new base snapshot.
+    '''
+    M = load(path)
+    snapshot.compact(M,path)
+
 
 ################################################################
 #Function to check whether multiplex is one-to-one
@@ -876,43 +1476,27 @@ def check_one_to_one(multiplex):
     print '#####################'
     
     multiplex_citation_is_OneToOne=True
-    for v in multiplex.citation.vertices():
-        if len(multiplex._multiplex_citation[v].keys())>1:
-            multiplex_citation_is_OneToOne=False
-            print 'citation->collaboration is NOT one-to-one!'
-            break
+    if numpy.any(multiplex._multiplex.n_authors_of(numpy.arange(multiplex.citation.num_vertices()))>1):
+        multiplex_citation_is_OneToOne=False
+        print 'citation->collaboration is NOT one-to-one!'
     if multiplex_citation_is_OneToOne==True:
         print 'citation->collaboration is one-to-one.'
             
     multiplex_collab_is_OneToOne=True
-    for v in multiplex.collab.vertices():
-        if len(multiplex._multiplex_collab[v].keys())>1:
-            multiplex_collab_is_OneToOne=False
-            print 'collaboration->citation is NOT one-to-one!'
-            break
+    if numpy.any(multiplex._multiplex.n_papers_of(numpy.arange(multiplex.collab.num_vertices()))>1):
+        multiplex_collab_is_OneToOne=False
+        print 'collaboration->citation is NOT one-to-one!'
     if multiplex_collab_is_OneToOne==True:
         print 'collaboration->citation is one-to-one.'
     print '#####################'
 
 
 #################################################
-#date parser
-def parse_date(timestmp):
-    if timestmp is None:
-        return None
-    try:
-        # if the year is not provided, this will assign '1', which will be detected in data analysis
-        d = parser.parse(str(timestmp), default=datetime.datetime(1, 1, 1, 0, 0))
-        return d.date()
-    except:  
-        print "Error when reading date:", sys.exc_info()[0]
-        print timestmp
-        raise
-
-
-
+#date parser, see dates.parse_date for the recognized formats
+parse_date = dates.parse_date
 
 
+            
 #################################################
 #define Error Classes
 
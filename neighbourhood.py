@@ -0,0 +1,80 @@
+#!/usr/bin/python
+
+##Author: Rene Pfitzner
+##Updates: Vahan Nanumyan
+
+#This module implements the bulk computation of multiplex neighbourhoods.
+#The multiplex neighbours of an author are the authors of its papers, those of a paper the papers of its authors:
+#two hops over the paper<->author incidence. For a set of vertices they are the rows of the sparse product of the incidence
+#with its transpose, computed here from the two CSR arrays of the bipartite index: both hops are expanded as ragged ranges,
+#the (vertex, neighbour) pairs are deduplicated by sorting their keys, the multiplicity of a pair being the number of shared
+#papers (authors). Large vertex sets are split into chunks processed by a pool of worker processes.
+
+import multiprocessing
+import numpy
+
+import array_utils
+
+
+#arrays of the current computation, inherited by forked pool workers
+_state = {}
+
+
+################################################################
+## Function to compute the neighbourhoods of a range of vertices
+def _two_hop_range(row_range):
+    first_row, last_row = row_range
+    rows = _state['rows'][first_row:last_row]
+    n = max(_state['n_targets'], 1)
+
+    #first hop (e.g. papers of the authors), second hop (authors of these papers)
+    row_of, pos = array_utils.ragged_ranges(_state['first_ptr'], rows)
+    middle_of, pos = array_utils.ragged_ranges(_state['second_ptr'], _state['first_idx'][pos])
+    row_of = row_of[middle_of]
+    neighbours = _state['second_idx'][pos].astype(numpy.int64)
+    if _state['exclude_self']:
+        other = neighbours != rows[row_of]
+        row_of = row_of[other]
+        neighbours = neighbours[other]
+
+    keys, counts = numpy.unique(row_of * n + neighbours, return_counts=True)
+    indptr = array_utils.indptr_of(keys // n, len(rows))
+    return indptr, (keys % n).astype(numpy.int32), counts.astype(numpy.int32)
+
+
+################################################################
+## Function to compute the neighbourhoods of many vertices
+def two_hop(first_ptr, first_idx, second_ptr, second_idx, rows, n_targets, exclude_self=False, processes=1, chunk_size=10000):
+    '''
+    Returns CSR arrays (indptr, neighbours, counts) of the distinct two hop neighbours of every vertex in rows,
+    first_ptr, first_idx being the CSR arrays of the first hop (e.g. author->papers) and second_ptr, second_idx those of
+    the second hop (paper->authors) into n_targets vertices. Neighbours of a row are sorted, counts holds the number of
+    paths (shared papers or authors) to every neighbour. With exclude_self=True the vertices are not their own neighbours.
+    The rows are split into chunks of chunk_size vertices, which are processed by a pool of processes workers.
+    '''
+    rows = numpy.asarray(rows, dtype=numpy.int64)
+    _state.clear()
+    _state.update(first_ptr=first_ptr, first_idx=first_idx, second_ptr=second_ptr, second_idx=second_idx,
+                  rows=rows, n_targets=n_targets, exclude_self=exclude_self)
+
+    bounds = numpy.unique(numpy.concatenate((numpy.arange(0, len(rows), max(int(chunk_size), 1)), [len(rows)])))
+    row_ranges = zip(bounds[:-1].tolist(), bounds[1:].tolist())
+    try:
+        if processes == 1 or len(row_ranges) <= 1:
+            chunks = map(_two_hop_range, row_ranges)
+        else:
+            pool = multiprocessing.Pool(processes)
+            try:
+                chunks = pool.map(_two_hop_range, row_ranges)
+            finally:
+                pool.close()
+                pool.join()
+    finally:
+        _state.clear()
+
+    if len(chunks) == 0:
+        return numpy.zeros(1, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int32), numpy.zeros(0, dtype=numpy.int32)
+    #concatenate the chunks, shifting their row pointers
+    offsets = numpy.cumsum([0] + [chunk[0][-1] for chunk in chunks])
+    indptr = numpy.concatenate([[0]] + [chunk[0][1:] + offset for chunk, offset in zip(chunks, offsets[:-1])]).astype(numpy.int64)
+    return indptr, numpy.concatenate([chunk[1] for chunk in chunks]), numpy.concatenate([chunk[2] for chunk in chunks])
@@ -0,0 +1,71 @@
+#!/usr/bin/python
+
+##Author: Rene Pfitzner
+##Updates: Vahan Nanumyan
+
+#This module implements pipelined ingestion.
+#A producer thread reads batches (file or DB I/O) and prepares them (splitting, decoding, date parsing into typed arrays),
+#while the caller applies the prepared batches to the graph. A bounded queue between both stages provides backpressure,
+#so that at most depth prepared batches are held in memory.
+
+import Queue
+import sys
+import threading
+
+
+#marker of the end of the batches
+_DONE = object()
+
+
+################################################################
+## Function to run reading and preparing of batches in a producer thread
+def pipelined(batches, prepare=None, depth=4):
+    '''
+    Generator of prepare(batch) for every batch of the iterable batches (batch itself if prepare is None).
+    Iterating batches and prepare run in a producer thread, at most depth prepared batches wait in the queue.
+    Exceptions of the producer are raised in the caller.
+    '''
+    queue = Queue.Queue(max(int(depth), 1))
+    stop = threading.Event()
+
+    def put(item):
+        #blocks while the queue is full, gives up once the consumer stopped
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for batch in batches:
+                if prepare is not None:
+                    batch = prepare(batch)
+                if not put((batch, None)):
+                    break
+            else:
+                put((_DONE, None))
+        except Exception:
+            put((_DONE, sys.exc_info()))
+        finally:
+            #e.g. close cursors of generators left early
+            close = getattr(batches, 'close', None)
+            if close is not None:
+                close()
+
+    producer = threading.Thread(target=produce)
+    producer.daemon = True
+    producer.start()
+    try:
+        while True:
+            batch, error = queue.get()
+            if batch is _DONE:
+                if error is not None:
+                    raise error[0], error[1], error[2]
+                return
+            yield batch
+    finally:
+        stop.set()
+        producer.join()
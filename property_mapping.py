@@ -0,0 +1,73 @@
+#!/usr/bin/python
+
+##Author: Rene Pfitzner
+##Updates: Vahan Nanumyan
+
+#This module implements the array based mapping of property values over the paper<->author incidence.
+#The values of the linked vertices of every origin vertex form one segment of a CSR array, segments are reduced at once
+#with numpy ufunc reduceat (sum, max, min, mean), segment sorting (median) or indexing (count, first).
+#Other (Python) reducers are applied segment by segment.
+
+import numpy
+
+import array_utils
+
+
+#built-in reducers
+REDUCERS = ['mean', 'max', 'min', 'sum', 'count', 'first', 'median']
+
+
+################################################################
+## Function to gather the linked values of vertices
+def gather(indptr, indices, rows, target_values):
+    '''
+    Returns the CSR arrays (segment pointer, values) of the target_values of the linked vertices of every vertex in rows,
+    indptr, indices being the CSR arrays of the links (e.g. paper->authors).
+    '''
+    rows = numpy.asarray(rows, dtype=numpy.int64)
+    row_of, pos = array_utils.ragged_ranges(indptr, rows)
+    segment_ptr = numpy.zeros(len(rows) + 1, dtype=numpy.int64)
+    numpy.cumsum(indptr[rows + 1] - indptr[rows], out=segment_ptr[1:])
+    return segment_ptr, numpy.asarray(target_values)[indices[pos]]
+
+
+################################################################
+## Function to reduce segments
+def reduce_segments(segment_ptr, values, reducer):
+    '''
+    Returns an array with the reduction of every non-empty segment values[segment_ptr[i]:segment_ptr[i+1]],
+    reducer being one of REDUCERS or a Python function of a list of values.
+    '''
+    lengths = numpy.diff(segment_ptr)
+    starts = segment_ptr[:-1][lengths > 0]
+    lengths = lengths[lengths > 0]
+
+    if reducer == 'count':
+        return lengths
+    if reducer == 'first':
+        return values[starts]
+    if reducer == 'sum':
+        return _reduceat(numpy.add, values, starts)
+    if reducer == 'max':
+        return _reduceat(numpy.maximum, values, starts)
+    if reducer == 'min':
+        return _reduceat(numpy.minimum, values, starts)
+    if reducer == 'mean':
+        return _reduceat(numpy.add, values.astype(numpy.float64), starts) / lengths
+    if reducer == 'median':
+        #sort the values within their segments, average the middle ones
+        segment_of = numpy.repeat(numpy.arange(len(starts), dtype=numpy.int64), lengths)
+        values = values[numpy.lexsort((values, segment_of))].astype(numpy.float64)
+        lower = starts + (lengths - 1) // 2
+        upper = starts + lengths // 2
+        return (values[lower] + values[upper]) / 2
+    if callable(reducer):
+        values = values.tolist()
+        return numpy.array([reducer(values[s:s+l]) for s, l in zip(starts.tolist(), lengths.tolist())])
+    raise ValueError('unknown reducer %r, use one of %s or a function' % (reducer, ', '.join(REDUCERS)))
+
+
+def _reduceat(ufunc, values, starts):
+    if len(starts) == 0:
+        return values[:0]
+    return ufunc.reduceat(values, starts)
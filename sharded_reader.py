@@ -0,0 +1,98 @@
+#!/usr/bin/python
+
+##Author: Rene Pfitzner
+##Updates: Vahan Nanumyan
+
+#This module implements parallel parsing of large delimited text files (edge lists, meta data files).
+#The file is split into byte ranges aligned to line boundaries (shards). Worker processes read and tokenize one shard each
+#and map its ids to a local id table. The local tables are merged into global ones and the index arrays are concatenated.
+#Ids get their global index in order of first appearance in the file, as with the sequential readers.
+
+import multiprocessing
+import os
+import numpy
+
+import array_utils
+import dates
+
+
+################################################################
+## Function to split a file into shards
+def shard_ranges(filename, shard_size, header=True):
+    '''Returns a list of (start, end) byte ranges of about shard_size bytes, each starting at the beginning of a line.'''
+    size = os.path.getsize(filename)
+    with open(filename, 'rb') as f:
+        if header == True:
+            f.readline()
+        bounds = [f.tell()]
+        while bounds[-1] < size:
+            f.seek(max(bounds[-1] + int(shard_size) - 1, bounds[-1]))
+            f.readline() #move to the start of the next line
+            bounds.append(min(f.tell(), size))
+    return zip(bounds[:-1], bounds[1:])
+
+
+################################################################
+## Function to parse one shard
+def _parse_shard(args):
+    filename, start, end, delimiter, id_columns, date_columns = args
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        #blank lines are skipped, as by array_utils.line_chunks and the line by line readers
+        lines = [line for line in f.read(end - start).split('\n') if line.strip() != '']
+
+    columns = [c for group in id_columns for c in group] + list(date_columns)
+    values = dict(zip(columns, array_utils.split_columns(lines, delimiter, columns)))
+
+    #local id table per group of id columns, ids of a row are taken from left to right
+    tables = []
+    indices = []
+    for group in id_columns:
+        ids = numpy.column_stack([values[c] for c in group]).ravel()
+        table, first, inverse = array_utils.unique_first(ids)
+        tables.append(table)
+        indices.append(inverse.reshape(-1, len(group)).astype(numpy.int32))
+    ordinals = [dates.parse_ordinals(values[c]) for c in date_columns]
+    return tables, indices, ordinals
+
+
+################################################################
+## Function to parse a file in parallel
+def parse_file(filename, delimiter, id_columns, date_columns=(), header=True, processes=None, shard_size=1<<26):
+    '''
+    Parses the delimited text file filename with a pool of processes worker processes (all cores for None),
+    each tokenizing shards of about shard_size bytes.
+    id_columns is a list of groups of column indices sharing one id table, e.g. [[cited, citing]] or [[paper], [author]].
+    Returns (tables, indices, ordinals):
+    tables holds per group the string array of distinct ids in order of first appearance,
+    indices per group an int64 array (rows x columns of the group) of indices into its table and
+    ordinals per column in date_columns an int32 array of day ordinals.
+    '''
+    ranges = shard_ranges(filename, shard_size, header)
+    tasks = [(filename, start, end, delimiter, id_columns, date_columns) for start, end in ranges]
+    if processes == 1 or len(tasks) <= 1:
+        shards = map(_parse_shard, tasks)
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            shards = pool.map(_parse_shard, tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+    tables = []
+    indices = []
+    for g, group in enumerate(id_columns):
+        if len(shards) == 0:
+            tables.append(numpy.zeros(0, dtype=numpy.string_))
+            indices.append(numpy.zeros((0, len(group)), dtype=numpy.int64))
+            continue
+        #shards are in file order, so are the local tables: first appearance in the concatenation is first appearance in the file
+        local_tables = [shard[0][g] for shard in shards]
+        table, first, inverse = array_utils.unique_first(numpy.concatenate(local_tables))
+        offsets = numpy.cumsum([0] + [len(t) for t in local_tables])
+        tables.append(table)
+        indices.append(numpy.concatenate([inverse[offsets[k] + shard[1][g]] for k, shard in enumerate(shards)]))
+    ordinals = [numpy.concatenate([shard[2][d] for shard in shards]) if len(shards) > 0 else numpy.zeros(0, dtype=numpy.int32)
+                for d in xrange(len(date_columns))]
+    return tables, indices, ordinals
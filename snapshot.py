@@ -0,0 +1,488 @@
+#!/usr/bin/python
+
+##Author: Rene Pfitzner
+##Updates: Vahan Nanumyan
+
+#This module implements a binary columnar snapshot format for PaperAuthorMultiplex structures.
+#A snapshot is a directory holding one uncompressed .npy file per array and a header (header.json)
+#with format version and counts. Arrays are memory mapped on load, no temporary files are written.
+#
+#   <layer>.edges.npy                   source and target of all edges (int32, E x 2)
+#   <layer>.vertex.<property>.npy       scalar vertex property maps, e.g. year
+#   <layer>.edge.<property>.npy         scalar edge property maps, in the order of the edges
+#   <layer>.ids.bytes.npy/.offsets.npy  vertex id strings (_graphml_vertex_id) as one byte buffer and offsets
+#   <layer>.ids.order.npy               vertex indices in sorted order of their id strings, see id_table
+#   multiplex.<csr array>.npy           bipartite index of paper-author links
+#   collab.timeline.ptr/.ordinals.npy   collaboration dates per edge of aggregated collaboration layers, see collab_timeline
+#
+#String and object property maps other than the vertex ids are not stored. Edges are stored in the order of their edge index.
+#
+#Changes made after saving or loading a snapshot are appended as delta segments, subdirectories delta.000001, delta.000002, ...
+#with a header of their own, holding only what is new:
+#   <layer>.edges.npy, <layer>.vertex|edge.<property>.npy, <layer>.ids.*   the new edges and vertices, as above
+#   <layer>.vertex|edge.<property>.changed.index/.values.npy            new values of existing vertices or edges
+#   multiplex.links.npy                                                 new paper-author links (int32, L x 2)
+#   collab.timeline.pairs.npy                                           new (edge row, day ordinal) pairs (int64, P x 2)
+#The readers below merge the base arrays with all segments, compact() rewrites them as a new base.
+
+import graph_tool.all as gt
+import itertools
+import json
+import os
+import shutil
+import numpy
+
+import array_utils
+import bipartite_index
+import collab_timeline
+import id_table
+
+
+FORMAT = 'scientometric-graph-tool snapshot'
+FORMAT_VERSION = 2
+
+#property map value types stored in snapshots
+SCALAR_TYPES = ['bool', 'uint8_t', 'int16_t', 'int32_t', 'int64_t', 'double', 'long double']
+
+MULTIPLEX_ARRAYS = ['paper_ptr', 'paper_authors', 'author_ptr', 'author_papers']
+
+DELTA_PREFIX = 'delta.'
+
+
+################################################################
+## Functions to write and read single arrays
+def write_array(path, name, array):
+    '''
+    Store array as path/name.npy. The file is written under a temporary name and renamed into place,
+    so that arrays memory mapped from the file being replaced (e.g. of a loaded snapshot) stay valid.
+    '''
+    filename = os.path.join(path, name + '.npy')
+    with open(filename + '.tmp', 'wb') as f:
+        numpy.save(f, numpy.ascontiguousarray(array))
+    os.rename(filename + '.tmp', filename)
+
+
+def read_array(path, name, mmap=True):
+    '''Returns the array name of the snapshot in path, memory mapped read-only unless mmap=False.'''
+    return numpy.load(os.path.join(path, name + '.npy'), mmap_mode='r' if mmap else None)
+
+
+################################################################
+## Functions to write and read string tables
+def write_strings(path, name, strings):
+    '''Store the sequence strings (or an IdTable) as one byte buffer, an offsets array and their sorted order.'''
+    if isinstance(strings, id_table.IdTable):
+        strings.strings() #merges pending strings of intern tables
+        table = id_table.IdTable(strings.buffer, strings.offsets)
+    else:
+        table = id_table.IdTable.from_strings(strings)
+    write_array(path, name + '.bytes', table.buffer)
+    write_array(path, name + '.offsets', table.offsets)
+    write_array(path, name + '.order', table.sorted_order())
+
+
+def read_strings(path, name, mmap=True):
+    '''Returns the string table name as IdTable, the order is computed if the snapshot does not hold it.'''
+    order = None
+    if os.path.isfile(os.path.join(path, name + '.order.npy')):
+        order = read_array(path, name + '.order', mmap)
+    return id_table.IdTable(read_array(path, name + '.bytes', mmap), read_array(path, name + '.offsets', mmap), order)
+
+
+################################################################
+## Functions to write and read graphs
+def write_graph(path, layer, graph, ids=None):
+    '''
+    Store edges, scalar property maps and vertex ids of graph under the name layer, returns its header entry.
+    The vertex ids are taken from the IdTable ids if given, from the property map _graphml_vertex_id otherwise.
+    '''
+    source, target, index = _sorted_edge_arrays(graph)
+    write_array(path, layer + '.edges', numpy.column_stack((source, target)).astype(numpy.int32))
+
+    properties = {'vertex': {}, 'edge': {}}
+    for name, prop in graph.vertex_properties.items():
+        if prop.value_type() in SCALAR_TYPES:
+            write_array(path, layer + '.vertex.' + name, prop.a)
+            properties['vertex'][name] = prop.value_type()
+    for name, prop in graph.edge_properties.items():
+        if prop.value_type() in SCALAR_TYPES:
+            write_array(path, layer + '.edge.' + name, prop.a[index])
+            properties['edge'][name] = prop.value_type()
+
+    if ids is None:
+        ids = [graph.vertex_properties['_graphml_vertex_id'][v] for v in graph.vertices()]
+    write_strings(path, layer + '.ids', ids)
+
+    return {'directed': graph.is_directed(), 'vertices': graph.num_vertices(), 'edges': graph.num_edges(), 'properties': properties}
+
+
+def read_graph(path, layer, header):
+    '''Returns the graph stored under the name layer, delta segments included, and the IdTable of its vertex ids.'''
+    entry = header[layer]
+    graph = gt.Graph(directed=entry['directed'])
+    graph.add_vertex(entry['vertices'])
+    graph.add_edge_list(read_edges(path, layer))
+
+    for name, value_type in entry['properties']['vertex'].items():
+        graph.vertex_properties[name] = graph.new_vertex_property(str(value_type))
+        graph.vertex_properties[name].a[:] = read_property(path, layer, 'vertex', name)
+    for name, value_type in entry['properties']['edge'].items():
+        graph.edge_properties[name] = graph.new_edge_property(str(value_type))
+        graph.edge_properties[name].a[:] = read_property(path, layer, 'edge', name)
+
+    ids = read_ids(path, layer)
+    graph.vertex_properties['_graphml_vertex_id'] = graph.new_vertex_property('string')
+    for v, vertex_id in itertools.izip(graph.vertices(), ids.strings()):
+        graph.vertex_properties['_graphml_vertex_id'][v] = vertex_id
+    return graph, ids
+
+
+def _sorted_edge_arrays(graph):
+    #source, target and index arrays of the edges in the order of their edge index
+    source, target, index = array_utils.edge_arrays(graph)
+    order = numpy.argsort(index, kind='mergesort')
+    return source[order], target[order], index[order]
+
+
+################################################################
+## Functions to read arrays merged with the delta segments
+def delta_paths(path):
+    '''Returns the directories of the delta segments of the snapshot in path, in the order they were written.'''
+    names = [name for name in os.listdir(path) if name.startswith(DELTA_PREFIX) and os.path.isdir(os.path.join(path, name))]
+    return [os.path.join(path, name) for name in sorted(names)]
+
+
+def _merged_array(path, name):
+    arrays = [read_array(path, name)] + [read_array(delta, name) for delta in delta_paths(path)]
+    if len(arrays) == 1:
+        return arrays[0]
+    return numpy.concatenate(arrays)
+
+
+def read_edges(path, layer):
+    '''Returns the edges (int32, E x 2) of layer, delta segments included. Memory mapped if there are no delta segments.'''
+    return _merged_array(path, layer + '.edges')
+
+
+def read_property(path, layer, kind, name):
+    '''
+    Returns the array of the scalar vertex (kind='vertex') or edge (kind='edge') property map name of layer,
+    delta segments included. Memory mapped if there are no delta segments.
+    '''
+    name = layer + '.' + kind + '.' + name
+    values = _merged_array(path, name)
+    for delta in delta_paths(path):
+        if os.path.isfile(os.path.join(delta, name + '.changed.index.npy')):
+            values[read_array(delta, name + '.changed.index')] = read_array(delta, name + '.changed.values')
+    return values
+
+
+def read_ids(path, layer):
+    '''Returns the IdTable of the vertex ids of layer, delta segments included. Memory mapped if there are no delta segments.'''
+    tables = [read_strings(path, layer + '.ids')] + [read_strings(delta, layer + '.ids') for delta in delta_paths(path)]
+    if len(tables) == 1:
+        return tables[0]
+    #shift the offsets of every table by the bytes before it
+    sizes = numpy.cumsum([0] + [len(table.buffer) for table in tables])
+    offsets = [tables[0].offsets] + [numpy.asarray(table.offsets[1:]) + size for table, size in zip(tables[1:], sizes[1:-1])]
+    return id_table.IdTable(numpy.concatenate([table.buffer for table in tables]), numpy.concatenate(offsets).astype(tables[0].offsets.dtype))
+
+
+def read_links(path, header):
+    '''Returns the BipartiteIndex of the paper-author links, delta segments included. Memory mapped if there are no delta segments.'''
+    links = bipartite_index.BipartiteIndex.from_csr(*[read_array(path, 'multiplex.' + name) for name in MULTIPLEX_ARRAYS])
+    pairs = [read_array(delta, 'multiplex.links') for delta in delta_paths(path)]
+    if len(pairs) > 0:
+        pairs = numpy.concatenate(pairs)
+        links.resize(header['citation']['vertices'], header['collab']['vertices'])
+        links.add_many(pairs[:, 0], pairs[:, 1])
+        links.compact()
+    return links
+
+
+################################################################
+## Functions to write and read collaboration timelines
+def write_timeline(path, graph, timeline):
+    '''Store the CollabTimeline timeline of the aggregated collaboration layer graph, rows in the order of the stored edges.'''
+    source, target, index = _sorted_edge_arrays(graph)
+    ptr, ordinals = timeline.csr(graph.edge_index_range)
+    row_of, pos = array_utils.ragged_ranges(ptr, index)
+    write_array(path, 'collab.timeline.ptr', array_utils.indptr_of(row_of, len(index)))
+    write_array(path, 'collab.timeline.ordinals', ordinals[pos])
+
+
+def read_timeline(path, header):
+    '''
+    Returns the CollabTimeline of the snapshot, delta segments included, None if the collaboration layer is not aggregated.
+    Memory mapped if there are no delta segments.
+    '''
+    if not header['collab'].get('timeline', False):
+        return None
+    timeline = collab_timeline.CollabTimeline.from_csr(read_array(path, 'collab.timeline.ptr'), read_array(path, 'collab.timeline.ordinals'))
+    pairs = [read_array(delta, 'collab.timeline.pairs') for delta in delta_paths(path)]
+    if len(pairs) > 0:
+        pairs = numpy.concatenate(pairs)
+        timeline.resize(header['collab']['edges'])
+        timeline.add_many(pairs[:, 0], pairs[:, 1])
+    return timeline
+
+
+################################################################
+## Functions to write and read headers
+def write_header(path, header):
+    header = dict(header, format=FORMAT, version=FORMAT_VERSION)
+    with open(os.path.join(path, 'header.json'), 'w') as f:
+        json.dump(header, f, indent=1, sort_keys=True)
+
+
+def _read_header(path):
+    try:
+        with open(os.path.join(path, 'header.json'), 'r') as f:
+            header = json.load(f)
+    except (IOError, ValueError):
+        raise SnapshotFormatError(path)
+    if header.get('format') != FORMAT or header.get('version') > FORMAT_VERSION:
+        raise SnapshotFormatError(path)
+    return header
+
+
+def read_header(path):
+    '''
+    Returns the header of the snapshot in path, raises SnapshotFormatError for unknown formats.
+    Counts include the delta segments, whose own headers are listed under 'deltas'.
+    '''
+    header = _read_header(path)
+    header['deltas'] = []
+    for delta in delta_paths(path):
+        entry = _read_header(delta)
+        header['deltas'].append(entry)
+        for layer in ['citation', 'collab']:
+            header[layer]['vertices'] += entry[layer]['vertices']
+            header[layer]['edges'] += entry[layer]['edges']
+        header['multiplex']['links'] += entry['multiplex']['links']
+    return header
+
+
+def is_snapshot(path):
+    '''True if path is a snapshot directory.'''
+    return os.path.isfile(os.path.join(path, 'header.json'))
+
+
+################################################################
+## Functions to save and load multiplex structures
+def save(multiplex, path):
+    '''
+    Write the PaperAuthorMultiplex multiplex as snapshot into the directory path.
+    A snapshot in path, delta segments included, is replaced: the new one is written next to it and swapped in,
+    so that path always holds a complete snapshot and arrays memory mapped from the old one stay valid.
+    '''
+    if is_snapshot(path):
+        _replace(multiplex, path)
+        return
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    for delta in delta_paths(path):
+        shutil.rmtree(delta)
+    _write_base(multiplex, path)
+    _mark(multiplex, path)
+
+
+def _replace(multiplex, path):
+    path = os.path.normpath(path)
+    new_path = path + '.saving'
+    old_path = path + '.old'
+    for p in [new_path, old_path]:
+        if os.path.isdir(p):
+            shutil.rmtree(p)
+    os.makedirs(new_path)
+    _write_base(multiplex, new_path)
+    os.rename(path, old_path)
+    os.rename(new_path, path)
+    shutil.rmtree(old_path)
+    _mark(multiplex, path)
+
+
+def recover(path):
+    '''
+    Finish a save() interrupted while swapping the snapshot in path: if path is missing, the complete new snapshot
+    (path.saving) is moved into place and the old one (path.old) removed, or the old one is moved back if the new one is incomplete.
+    Called before reading a snapshot, does nothing if path exists.
+    '''
+    path = os.path.normpath(path)
+    new_path = path + '.saving'
+    old_path = path + '.old'
+    if os.path.exists(path) or not os.path.isdir(old_path):
+        return
+    try:
+        if is_snapshot(new_path):
+            os.rename(new_path, path)
+            shutil.rmtree(old_path)
+        else:
+            os.rename(old_path, path)
+            if os.path.isdir(new_path):
+                shutil.rmtree(new_path)
+    except OSError:
+        #finished concurrently by the writer or another reader
+        if not is_snapshot(path):
+            raise
+
+
+def _write_base(multiplex, path):
+    header = {}
+    header['citation'] = write_graph(path, 'citation', multiplex.citation, multiplex._citation_ids)
+    header['collab'] = write_graph(path, 'collab', multiplex.collab, multiplex._collab_ids)
+    if multiplex._collab_timeline is not None:
+        write_timeline(path, multiplex.collab, multiplex._collab_timeline)
+        header['collab']['timeline'] = True
+
+    csr = multiplex._multiplex
+    paper_ptr, paper_authors = csr.paper_csr(multiplex.citation.num_vertices())
+    author_ptr, author_papers = csr.author_csr(multiplex.collab.num_vertices())
+    for name, array in zip(MULTIPLEX_ARRAYS, [paper_ptr, paper_authors, author_ptr, author_papers]):
+        write_array(path, 'multiplex.' + name, array)
+    header['multiplex'] = {'links': len(paper_authors)}
+
+    write_header(path, header)
+
+
+def load(multiplex, path):
+    '''Populate the PaperAuthorMultiplex multiplex from the snapshot in the directory path, delta segments included.'''
+    recover(path)
+    header = read_header(path)
+
+    multiplex.citation, citation_ids = read_graph(path, 'citation', header)
+    multiplex.collab, collab_ids = read_graph(path, 'collab', header)
+    multiplex._citation_ids = id_table.InternTable(citation_ids.buffer, citation_ids.offsets)
+    multiplex._collab_ids = id_table.InternTable(collab_ids.buffer, collab_ids.offsets)
+
+    multiplex._multiplex = read_links(path, header)
+    multiplex._collab_timeline = read_timeline(path, header)
+    _mark(multiplex, path)
+
+
+def _mark(multiplex, path):
+    #what the snapshot in path holds of multiplex, save_delta() writes the rest
+    multiplex._snapshot_marks = {'path': os.path.abspath(path)}
+    for layer, graph in [('citation', multiplex.citation), ('collab', multiplex.collab)]:
+        multiplex._snapshot_marks[layer] = {'vertices': graph.num_vertices(), 'edges': graph.num_edges(),
+                                            'edge_index_range': graph.edge_index_range}
+
+
+################################################################
+## Functions to append and merge delta segments
+def save_delta(multiplex, path):
+    '''
+    Append the changes of the PaperAuthorMultiplex multiplex since it was last saved to, loaded from or appended to the
+    snapshot in path as new delta segment: new vertices, edges and paper-author links, changed scalar property values of
+    existing vertices and edges, new dates of aggregated collaborations. Returns the number of delta segments.
+    Raises SnapshotFormatError if the multiplex does not extend the snapshot, e.g. after removing edges or aggregating
+    the collaboration layer, in which case it has to be saved as new snapshot.
+    '''
+    marks = getattr(multiplex, '_snapshot_marks', None)
+    if marks is None or marks['path'] != os.path.abspath(path):
+        raise SnapshotFormatError('%s: the multiplex was not saved to or loaded from this snapshot' % path)
+    header = read_header(path)
+    if header['collab'].get('timeline', False) != (multiplex._collab_timeline is not None):
+        raise SnapshotFormatError('%s: the collaboration layer was aggregated after saving' % path)
+
+    #check everything before writing the segment
+    edges = {}
+    for layer, graph in [('citation', multiplex.citation), ('collab', multiplex.collab)]:
+        edges[layer] = _sorted_edge_arrays(graph)
+        _check_extends(path, layer, graph, edges[layer], marks[layer])
+
+    #written under a temporary name and renamed when complete, unfinished segments are never read
+    delta = os.path.join(path, 'partial.' + DELTA_PREFIX.rstrip('.'))
+    if os.path.isdir(delta):
+        shutil.rmtree(delta)
+    os.makedirs(delta)
+    entry = {}
+    entry['citation'] = _write_graph_delta(path, delta, 'citation', multiplex.citation, multiplex._citation_ids, edges['citation'], header, marks['citation'])
+    entry['collab'] = _write_graph_delta(path, delta, 'collab', multiplex.collab, multiplex._collab_ids, edges['collab'], header, marks['collab'])
+    entry['multiplex'] = {'links': _write_links_delta(path, delta, multiplex, header)}
+    if multiplex._collab_timeline is not None:
+        entry['collab']['timeline'] = _write_timeline_delta(path, delta, multiplex, edges['collab'][2], header)
+    write_header(delta, entry)
+    os.rename(delta, os.path.join(path, DELTA_PREFIX + '%06d' % (len(header['deltas']) + 1)))
+
+    #snapshots of format version 1 cannot be read without the segments
+    base = _read_header(path)
+    if base['version'] < FORMAT_VERSION:
+        write_header(path, base)
+    _mark(multiplex, path)
+    return len(header['deltas']) + 1
+
+
+def _check_extends(path, layer, graph, edges, mark):
+    source, target, index = edges
+    n_old = mark['edges']
+    if graph.num_vertices() < mark['vertices'] or numpy.count_nonzero(index < mark['edge_index_range']) != n_old:
+        raise SnapshotFormatError('%s: vertices or edges of %s were removed after saving' % (path, layer))
+    stored = read_edges(path, layer)
+    if (stored[:, 0] != source[:n_old]).any() or (stored[:, 1] != target[:n_old]).any():
+        raise SnapshotFormatError('%s: edges of %s were replaced after saving' % (path, layer))
+
+
+def _write_graph_delta(path, delta, layer, graph, ids, edges, header, mark):
+    source, target, index = edges
+    n_vertices = mark['vertices']
+    n_edges = mark['edges']
+    write_array(delta, layer + '.edges', numpy.column_stack((source[n_edges:], target[n_edges:])).astype(numpy.int32))
+
+    #values of new elements, changed values of stored ones
+    changed = {'vertex': {}, 'edge': {}}
+    for kind, properties, positions, n_old in [('vertex', graph.vertex_properties, None, n_vertices), ('edge', graph.edge_properties, index, n_edges)]:
+        for name in header[layer]['properties'][kind]:
+            values = properties[name].a if positions is None else properties[name].a[positions]
+            prefix = layer + '.' + kind + '.' + name
+            write_array(delta, prefix, values[n_old:])
+            stored = read_property(path, layer, kind, name)
+            differ = numpy.flatnonzero(_differ(values[:n_old], stored))
+            if len(differ) > 0:
+                write_array(delta, prefix + '.changed.index', differ)
+                write_array(delta, prefix + '.changed.values', values[differ])
+                changed[kind][name] = len(differ)
+
+    write_strings(delta, layer + '.ids', ids.strings(xrange(n_vertices, graph.num_vertices())))
+    return {'vertices': graph.num_vertices() - n_vertices, 'edges': len(index) - n_edges, 'changed': changed}
+
+
+def _differ(values, stored):
+    differ = values != stored
+    if values.dtype.kind == 'f':
+        differ &= ~(numpy.isnan(values) & numpy.isnan(stored))
+    return differ
+
+
+def _write_links_delta(path, delta, multiplex, header):
+    papers, authors = multiplex._multiplex.pairs()
+    stored_papers, stored_authors = read_links(path, header).pairs()
+    n = max(multiplex.collab.num_vertices(), 1)
+    new = ~array_utils.in_sorted(papers * n + authors, numpy.sort(stored_papers * n + stored_authors))
+    write_array(delta, 'multiplex.links', numpy.column_stack((papers[new], authors[new])).astype(numpy.int32))
+    return int(numpy.count_nonzero(new))
+
+
+def _write_timeline_delta(path, delta, multiplex, index, header):
+    #(edge row, date) pairs of the in-memory timeline not in the stored one, rows being ranks of the edge indices
+    timeline = multiplex._collab_timeline
+    timeline.compact()
+    edges, ordinals = timeline.pairs()
+    rows = numpy.searchsorted(index, edges)
+    known = (rows < len(index)) & (index[numpy.minimum(rows, len(index) - 1)] == edges) if len(index) > 0 else numpy.zeros(len(edges), dtype=bool)
+    stored = read_timeline(path, header)
+    new = stored.add_many(rows[known], ordinals[known])
+    write_array(delta, 'collab.timeline.pairs', numpy.column_stack((rows[known][new], ordinals[known][new])).astype(numpy.int64))
+    return int(numpy.count_nonzero(new))
+
+
+def compact(multiplex, path):
+    '''Rewrite the snapshot in path as new base snapshot of multiplex, replacing the base and its delta segments, see save().'''
+    save(multiplex, path)
+
+
+#################################################
+#define Error Classes
+
+class SnapshotFormatError(Exception):
+    pass
@@ -0,0 +1,331 @@
+#!/usr/bin/python
+
+##Author: Rene Pfitzner
+##Updates: Vahan Nanumyan
+
+#This module implements the array based computation of socially biased citations.
+#A citation of paper P by paper C is
+#   - a self citation, if P and C share an author,
+#   - socially biased, if otherwise an author of C collaborated with an author of P before the publication of P.
+#All structures are integer arrays indexed by vertex index, the work is split into ranges of cited papers.
+#A BiasCounter keeps the counts of all papers and recounts only the papers whose citations can have changed class
+#with added citations, paper-author links, paper dates or collaborations.
+
+import multiprocessing
+import numpy
+
+import array_utils
+import bipartite_index
+
+
+#citation classes as returned by classify_citations
+OTHER_CITATION = 0
+SELF_CITATION = 1
+BIASED_CITATION = 2
+
+#arrays of the current computation, inherited by forked pool workers
+_state = {}
+
+
+################################################################
+## Function to build the collaborator lists of all authors
+def collaborators(source, target, first_collaborated, n_authors):
+    '''
+    Returns CSR arrays (indptr, collaborators, first date) listing every collaborator of every author once,
+    together with the day ordinal of their first collaboration.
+    source, target and first_collaborated describe the (possibly parallel) collaboration edges.
+    '''
+    source = numpy.asarray(source, dtype=numpy.int64)
+    target = numpy.asarray(target, dtype=numpy.int64)
+    first_collaborated = numpy.asarray(first_collaborated, dtype=numpy.int64)
+
+    #collaborations are undirected, list them from both ends
+    author = numpy.concatenate((source, target))
+    coauthor = numpy.concatenate((target, source))
+    first = numpy.concatenate((first_collaborated, first_collaborated))
+
+    #keep the earliest date of parallel collaborations
+    keys = array_utils.pair_keys(author, coauthor, max(n_authors, 1))
+    order = numpy.lexsort((first, keys))
+    keys = keys[order]
+    keep = numpy.ones(len(keys), dtype=bool)
+    keep[1:] = keys[1:] != keys[:-1]
+    keys = keys[keep]
+    first = first[order][keep]
+
+    indptr = array_utils.indptr_of(keys // max(n_authors, 1), n_authors)
+    return indptr, (keys % max(n_authors, 1)).astype(numpy.int32), first.astype(numpy.int32)
+
+
+################################################################
+## Function to build the lists of citing papers
+def citations(cited, citing, n_papers):
+    '''Returns CSR arrays (indptr, citing papers) of the citations received by every paper, parallel citations are kept.'''
+    cited = numpy.asarray(cited, dtype=numpy.int64)
+    order = numpy.argsort(cited, kind='mergesort')
+    return array_utils.indptr_of(cited[order], n_papers), numpy.asarray(citing, dtype=numpy.int64)[order].astype(numpy.int32)
+
+
+################################################################
+## Function to classify citations of a range of cited papers
+def _classify_range(paper_range):
+    first_paper, last_paper = paper_range
+    cite_ptr = _state['cite_ptr']
+    cited = numpy.repeat(numpy.arange(first_paper, last_paper, dtype=numpy.int64), numpy.diff(cite_ptr[first_paper:last_paper+1]))
+    citing = _state['cite_tgt'][cite_ptr[first_paper]:cite_ptr[last_paper]]
+
+    def collaborators_of(authors):
+        row, pos = array_utils.ragged_ranges(_state['collab_ptr'], authors)
+        return row, _state['collab_nbr'][pos], _state['collab_first'][pos]
+
+    return _classify(cited, citing, _state['paper_ptr'], _state['paper_authors'], collaborators_of, _state['paper_year'], _state['n_authors'])
+
+
+################################################################
+## Function to classify citations
+def _classify(cited, citing, paper_ptr, paper_authors, collaborators_of, paper_year, n_authors):
+    #collaborators_of(authors) returns, for every collaborator of the authors, the index of the author, the collaborator and the date of the first collaboration
+    classes = numpy.zeros(len(cited), dtype=numpy.int8)
+    if len(cited) == 0:
+        return classes
+    n_authors = max(n_authors, 1)
+
+    #(cited paper, citing author) pair of every citation and author of the citing paper
+    citation_of, pos = array_utils.ragged_ranges(paper_ptr, citing)
+    citing_keys = cited[citation_of] * n_authors + paper_authors[pos]
+
+    #(paper, author) pairs of the cited papers, sorted as the CSR arrays are
+    papers = numpy.unique(cited)
+    author_row, pos = array_utils.ragged_ranges(paper_ptr, papers)
+    papers = papers[author_row]
+    authors = paper_authors[pos].astype(numpy.int64)
+    is_self = numpy.bincount(citation_of[array_utils.in_sorted(citing_keys, papers * n_authors + authors)], minlength=len(cited)) > 0
+
+    #(paper, earlier collaborator) pairs: collaborators of the authors, first collaboration before publication of the paper
+    collaborator_row, collaborator, first = collaborators_of(authors)
+    earlier = first < paper_year[papers[collaborator_row]]
+    earlier_keys = numpy.unique(papers[collaborator_row[earlier]] * n_authors + collaborator[earlier])
+    is_biased = numpy.bincount(citation_of[array_utils.in_sorted(citing_keys, earlier_keys)], minlength=len(cited)) > 0
+
+    classes[is_biased] = BIASED_CITATION
+    classes[is_self] = SELF_CITATION
+    return classes
+
+
+################################################################
+## Function to classify all citations
+def classify_citations(paper_ptr, paper_authors, collab_ptr, collab_nbr, collab_first, cite_ptr, cite_tgt, paper_year, processes=1, chunk_size=1000000):
+    '''
+    Returns an int8 array classifying every citation (in the order of the citation CSR arrays cite_ptr, cite_tgt)
+    as OTHER_CITATION, SELF_CITATION or BIASED_CITATION.
+    paper_ptr, paper_authors: paper->authors CSR arrays
+    collab_ptr, collab_nbr, collab_first: collaborator CSR arrays, see collaborators()
+    paper_year: day ordinals of the papers
+    The cited papers are split into ranges of about chunk_size citations, which are processed by a pool of processes workers.
+    '''
+    n_papers = len(cite_ptr) - 1
+    _state.clear()
+    _state.update(paper_ptr=paper_ptr, paper_authors=paper_authors, n_authors=len(collab_ptr)-1,
+                  collab_ptr=collab_ptr, collab_nbr=collab_nbr, collab_first=collab_first,
+                  cite_ptr=cite_ptr, cite_tgt=cite_tgt, paper_year=numpy.asarray(paper_year))
+
+    #ranges of cited papers with about chunk_size citations each
+    bounds = numpy.searchsorted(cite_ptr, numpy.arange(0, cite_ptr[-1], max(int(chunk_size), 1)), side='right') - 1
+    bounds = numpy.unique(numpy.concatenate((bounds, [0, n_papers])))
+    paper_ranges = zip(bounds[:-1].tolist(), bounds[1:].tolist())
+
+    try:
+        if processes == 1 or len(paper_ranges) <= 1:
+            classes = map(_classify_range, paper_ranges)
+        else:
+            pool = multiprocessing.Pool(processes)
+            try:
+                classes = pool.map(_classify_range, paper_ranges)
+            finally:
+                pool.close()
+                pool.join()
+    finally:
+        _state.clear()
+
+    if len(classes) == 0:
+        return numpy.zeros(0, dtype=numpy.int8)
+    return numpy.concatenate(classes)
+
+
+################################################################
+## Function to count citation classes per paper
+def count_citations(cite_ptr, classes):
+    '''Returns arrays with the number of citations, self citations and socially biased citations of every paper.'''
+    n_papers = len(cite_ptr) - 1
+    cited = numpy.repeat(numpy.arange(n_papers, dtype=numpy.int64), numpy.diff(cite_ptr))
+    n_citations = numpy.diff(cite_ptr)
+    n_self = numpy.bincount(cited[classes == SELF_CITATION], minlength=n_papers)
+    n_biased = numpy.bincount(cited[classes == BIASED_CITATION], minlength=n_papers)
+    return n_citations, n_self, n_biased
+
+
+################################################################
+## Counts maintained while data is added
+class BiasCounter():
+    'Numbers of citations, self citations and socially biased citations per paper, recounted for the papers affected by added data'
+
+    def __init__(self):
+        self.citations = numpy.zeros(0, dtype=numpy.int64)
+        self.self_citations = numpy.zeros(0, dtype=numpy.int64)
+        self.biased_citations = numpy.zeros(0, dtype=numpy.int64)
+
+        #citations as links cited paper -> citing paper
+        self._citations = bipartite_index.BipartiteIndex()
+        #first collaboration date of every pair of collaborators, sorted keys author << 32 | collaborator in both directions
+        self._collab_keys = numpy.zeros(0, dtype=numpy.int64)
+        self._collab_first = numpy.zeros(0, dtype=numpy.int64)
+
+        #data added since the last refresh
+        self._pending_collaborations = []
+        self._dirty_cited = []
+        self._dirty_citing = []
+
+
+################################################################
+    ##
+    #Functions to record added data
+    def add_citations(self, cited, citing):
+        '''Record the citations of the papers cited[i] by the papers citing[i] (vertex indices).'''
+        cited = numpy.asarray(cited, dtype=numpy.int64).ravel()
+        citing = numpy.asarray(citing, dtype=numpy.int64).ravel()
+        if len(cited) == 0:
+            return
+        n_papers = max(self._citations.n_papers, int(cited.max()) + 1, int(citing.max()) + 1)
+        self._citations.resize(n_papers, n_papers)
+        self._citations.add_many(cited, citing)
+        self._dirty_cited.append(cited)
+
+    def remove_citations(self, cited, citing):
+        '''Record that the citations of the papers cited[i] by the papers citing[i] (vertex indices) were removed.'''
+        cited = numpy.asarray(cited, dtype=numpy.int64).ravel()
+        citing = numpy.asarray(citing, dtype=numpy.int64).ravel()
+        if len(cited) == 0:
+            return
+        n_papers = max(self._citations.n_papers, int(cited.max()) + 1, int(citing.max()) + 1)
+        old_cited, old_citing = self._citations.pairs()
+        removed = array_utils.in_sorted(array_utils.pair_keys(old_cited, old_citing, n_papers),
+                                        numpy.unique(array_utils.pair_keys(cited, citing, n_papers)))
+        self._citations = bipartite_index.BipartiteIndex.from_pairs(old_cited[~removed], old_citing[~removed], n_papers, n_papers)
+        self._dirty_cited.append(cited)
+
+    def set_citations(self, cited, citing):
+        '''
+        Record that the citations are exactly those of the papers cited[i] by the papers citing[i] (vertex indices),
+        e.g. after citations were removed or added without being recorded. Papers cited by removed or added citations are recounted.
+        '''
+        cited = numpy.asarray(cited, dtype=numpy.int64).ravel()
+        citing = numpy.asarray(citing, dtype=numpy.int64).ravel()
+        n_papers = max(self._citations.n_papers, int(cited.max()) + 1 if len(cited) > 0 else 0, int(citing.max()) + 1 if len(citing) > 0 else 0)
+        old_cited, old_citing = self._citations.pairs()
+        old_keys = array_utils.pair_keys(old_cited, old_citing, max(n_papers, 1))
+        keys = array_utils.pair_keys(cited, citing, max(n_papers, 1))
+        removed = ~array_utils.in_sorted(old_keys, numpy.unique(keys))
+        added = ~array_utils.in_sorted(keys, numpy.sort(old_keys))
+        if numpy.count_nonzero(removed) == 0 and numpy.count_nonzero(added) == 0:
+            return
+        self._citations = bipartite_index.BipartiteIndex.from_pairs(cited, citing, n_papers, n_papers)
+        self._dirty_cited.append(old_cited[removed])
+        self._dirty_cited.append(cited[added])
+
+    def n_citations(self):
+        '''Returns the number of recorded citations.'''
+        return len(self._citations)
+
+    def add_collaborations(self, author1, author2, ordinals):
+        '''Record collaborations of the authors author1[i] and author2[i] (vertex indices) at the day ordinals ordinals[i].'''
+        author1 = numpy.asarray(author1, dtype=numpy.int64).ravel()
+        author2 = numpy.asarray(author2, dtype=numpy.int64).ravel()
+        ordinals = numpy.asarray(ordinals, dtype=numpy.int64).ravel()
+        pair = author1 != author2
+        if numpy.count_nonzero(pair) > 0:
+            self._pending_collaborations.append((author1[pair], author2[pair], ordinals[pair]))
+
+    def papers_changed(self, papers):
+        '''Record that the authors or the dates of the papers (vertex indices) changed.'''
+        papers = numpy.asarray(papers, dtype=numpy.int64).ravel()
+        self._dirty_cited.append(papers)
+        self._dirty_citing.append(papers)
+
+
+################################################################
+    ##
+    #Function to recount the affected papers
+    def refresh(self, paper_ptr, paper_authors, author_ptr, author_papers, paper_year):
+        '''
+        Recount the papers whose citations can have changed class since the last refresh: cited papers of added citations,
+        papers with new authors or dates and the papers they cite, papers of authors whose first collaboration with someone
+        moved earlier. paper_ptr, paper_authors and author_ptr, author_papers are the CSR arrays of the paper-author links,
+        paper_year the day ordinals of the papers. Returns the int64 array of the recounted papers.
+        '''
+        n_papers = len(paper_ptr) - 1
+        if len(self.citations) < n_papers:
+            grow = numpy.zeros(n_papers - len(self.citations), dtype=numpy.int64)
+            self.citations = numpy.concatenate((self.citations, grow))
+            self.self_citations = numpy.concatenate((self.self_citations, grow))
+            self.biased_citations = numpy.concatenate((self.biased_citations, grow))
+        self._citations.resize(n_papers, n_papers)
+        dirty = self._dirty_cited
+
+        #papers of the authors with earlier first collaborations
+        authors = self._merge_collaborations()
+        row_of, pos = array_utils.ragged_ranges(author_ptr, authors[authors < len(author_ptr) - 1])
+        dirty.append(numpy.asarray(author_papers[pos], dtype=numpy.int64))
+        #papers cited by changed papers
+        if len(self._dirty_citing) > 0:
+            cited_ptr, cited = self._citations.author_csr(n_papers)
+            row_of, pos = array_utils.ragged_ranges(cited_ptr, numpy.unique(numpy.concatenate(self._dirty_citing)))
+            dirty.append(numpy.asarray(cited[pos], dtype=numpy.int64))
+        papers = numpy.unique(numpy.concatenate(dirty)) if len(dirty) > 0 else numpy.zeros(0, dtype=numpy.int64)
+        self._dirty_cited = []
+        self._dirty_citing = []
+
+        #classify all citations of these papers
+        cite_ptr, cite_tgt = self._citations.paper_csr(n_papers)
+        row_of, pos = array_utils.ragged_ranges(cite_ptr, papers)
+        classes = _classify(papers[row_of], numpy.asarray(cite_tgt[pos], dtype=numpy.int64), paper_ptr, paper_authors,
+                            self._collaborators_of, numpy.asarray(paper_year), len(author_ptr) - 1)
+        self.citations[papers] = numpy.diff(cite_ptr)[papers]
+        self.self_citations[papers] = numpy.bincount(row_of[classes == SELF_CITATION], minlength=len(papers))
+        self.biased_citations[papers] = numpy.bincount(row_of[classes == BIASED_CITATION], minlength=len(papers))
+        return papers
+
+    ##
+    #Helper function merging the pending collaborations into the table of first dates, returns the authors of changed pairs
+    def _merge_collaborations(self):
+        if len(self._pending_collaborations) == 0:
+            return numpy.zeros(0, dtype=numpy.int64)
+        author1, author2, first = [numpy.concatenate(x) for x in zip(*self._pending_collaborations)]
+        self._pending_collaborations = []
+
+        #earliest new date of every pair, listed from both ends
+        keys = numpy.concatenate(((author1 << 32) | author2, (author2 << 32) | author1))
+        first = numpy.concatenate((first, first))
+        order = numpy.lexsort((first, keys))
+        keys = keys[order]
+        first = first[order]
+        keep = numpy.ones(len(keys), dtype=bool)
+        keep[1:] = keys[1:] != keys[:-1]
+        keys = keys[keep]
+        first = first[keep]
+
+        pos = numpy.searchsorted(self._collab_keys, keys)
+        known = array_utils.in_sorted(keys, self._collab_keys)
+        earlier = numpy.zeros(len(keys), dtype=bool)
+        earlier[known] = first[known] < self._collab_first[pos[known]]
+        self._collab_first[pos[earlier]] = first[earlier]
+        self._collab_keys = numpy.insert(self._collab_keys, pos[~known], keys[~known])
+        self._collab_first = numpy.insert(self._collab_first, pos[~known], first[~known])
+        return numpy.unique(keys[earlier | ~known] >> 32)
+
+    ##
+    #Helper function listing the collaborators of authors from the table of first dates
+    def _collaborators_of(self, authors):
+        starts = numpy.searchsorted(self._collab_keys, authors << 32)
+        ends = numpy.searchsorted(self._collab_keys, (authors + 1) << 32)
+        row_of, pos = array_utils.ranges(starts, ends)
+        return row_of, self._collab_keys[pos] & 0xffffffff, self._collab_first[pos]
@@ -0,0 +1,64 @@
+#!/usr/bin/python
+
+##Author: Rene Pfitzner
+##Updates: Vahan Nanumyan
+
+#Tests of the citation shuffling of Molloy-Reed instances, run with python -m unittest test_citation_net
+
+import random
+import unittest
+
+import numpy
+
+import citation_net
+
+
+def random_citations(seed, n_papers=60, n_citations=300):
+    '''Returns arrays (cited, citing) of distinct citations going forward in time and the years of the papers.'''
+    rng = random.Random(seed)
+    years = numpy.array([rng.randint(1990, 2000) for i in range(n_papers)], dtype=numpy.int64)
+    pairs = set()
+    while len(pairs) < n_citations:
+        cited, citing = rng.randrange(n_papers), rng.randrange(n_papers)
+        if years[cited] < years[citing]:
+            pairs.add((cited, citing))
+    pairs = sorted(pairs)
+    return numpy.array([p[0] for p in pairs]), numpy.array([p[1] for p in pairs]), years
+
+
+class ShuffleCitationsTest(unittest.TestCase):
+
+    def check_shuffled(self, cited, citing, years, new_cited, new_citing):
+        n = len(years)
+        self.assertEqual(numpy.bincount(new_cited, minlength=n).tolist(), numpy.bincount(cited, minlength=n).tolist())
+        self.assertEqual(numpy.bincount(new_citing, minlength=n).tolist(), numpy.bincount(citing, minlength=n).tolist())
+        self.assertTrue(numpy.all(years[new_cited] < years[new_citing]))
+        self.assertEqual(len(set(zip(new_cited.tolist(), new_citing.tolist()))), len(new_cited))
+
+    def test_constraints(self):
+        for seed in range(20):
+            cited, citing, years = random_citations(seed)
+            new_cited, new_citing = citation_net.shuffle_citations(cited, citing, years, seed=seed)
+            self.check_shuffled(cited, citing, years, new_cited, new_citing)
+
+    def test_dense_citations(self):
+        #few admissible stubs left, citations are cut and rewired
+        cited, citing, years = random_citations(3, n_papers=20, n_citations=120)
+        new_cited, new_citing = citation_net.shuffle_citations(cited, citing, years, seed=3)
+        self.check_shuffled(cited, citing, years, new_cited, new_citing)
+
+    def test_seed(self):
+        cited, citing, years = random_citations(1)
+        first = citation_net.shuffle_citations(cited, citing, years, seed=5)
+        second = citation_net.shuffle_citations(cited, citing, years, seed=random.Random(5))
+        self.assertEqual(first[0].tolist(), second[0].tolist())
+        self.assertEqual(first[1].tolist(), second[1].tolist())
+
+    def test_unknown_year(self):
+        cited, citing, years = random_citations(1)
+        years[cited[0]] = 0
+        self.assertRaises(citation_net.UnknownYearError, citation_net.shuffle_citations, cited, citing, years)
+
+
+if __name__ == '__main__':
+    unittest.main()
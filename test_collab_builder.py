@@ -0,0 +1,114 @@
+#!/usr/bin/python
+
+##Author: Rene Pfitzner
+##Updates: Vahan Nanumyan
+
+#Tests of the array based collaboration layer against adding the authorship rows one by one, run with python -m unittest test_collab_builder
+
+import random
+import unittest
+
+import numpy
+
+import array_utils
+import bipartite_index
+import collab_builder
+
+
+def row_by_row(rows):
+    '''Collaboration edges [author1, author2, date, first date] of the rows (paper, author, date), added as add_collaboration() does.'''
+    authors_of = {}
+    edges = []
+    for paper, author, date in rows:
+        for coauthor in authors_of.get(paper, []):
+            if coauthor == author:
+                continue
+            pair = [e for e in edges if set(e[:2]) == set([author, coauthor])]
+            dates = [e[2] for e in pair]
+            if date not in dates:
+                first = min(dates + [date])
+                edges.append([min(author, coauthor), max(author, coauthor), date, first])
+                if first == date:
+                    for e in pair:
+                        e[3] = first
+        if author not in authors_of.setdefault(paper, []):
+            authors_of[paper].append(author)
+    return sorted(tuple(e) for e in edges)
+
+
+def in_chunks(rows, chunk_sizes):
+    '''Collaboration edges of the rows, built chunk by chunk with collaboration_pairs and merge_collaborations.'''
+    links = bipartite_index.BipartiteIndex()
+    edges = []
+    table_keys = numpy.zeros(0, dtype=numpy.int64)
+    table_dates = numpy.zeros(0, dtype=numpy.int64)
+    table_edges = numpy.zeros(0, dtype=numpy.int64)
+    start = 0
+    for size in chunk_sizes:
+        chunk = rows[start:start + size]
+        start += size
+        papers = numpy.array([r[0] for r in chunk], dtype=numpy.int64)
+        authors = numpy.array([r[1] for r in chunk], dtype=numpy.int64)
+        ordinals = numpy.array([r[2] for r in chunk], dtype=numpy.int64)
+        paper_ptr, paper_authors = links.paper_csr()
+        author1, author2, date = collab_builder.collaboration_pairs(papers, authors, ordinals, paper_ptr, paper_authors)
+        new, pos, first, lowered_starts, lowered_ends, lowered_first = collab_builder.merge_collaborations(author1, author2, date,
+                                                                                                         table_keys, table_dates)
+        row_of, lowered = array_utils.ranges(lowered_starts, lowered_ends)
+        for e, f in zip(table_edges[lowered].tolist(), lowered_first[row_of].tolist()):
+            edges[e][3] = f
+        author1, author2, date = author1[new], author2[new], date[new]
+        new_edges = numpy.arange(len(edges), len(edges) + len(date))
+        edges.extend([list(e) for e in zip(author1.tolist(), author2.tolist(), date.tolist(), first.tolist())])
+        table_keys = numpy.insert(table_keys, pos, collab_builder.collaboration_keys(author1, author2))
+        table_dates = numpy.insert(table_dates, pos, date)
+        table_edges = numpy.insert(table_edges, pos, new_edges)
+        links.add_many(papers, authors)
+    return sorted(tuple(e) for e in edges), table_keys, table_dates
+
+
+class CollaborationPairsTest(unittest.TestCase):
+
+    def test_pairs_of_one_paper(self):
+        papers = numpy.array([0, 0, 0])
+        authors = numpy.array([2, 1, 2])
+        author1, author2, date = collab_builder.collaboration_pairs(papers, authors, numpy.array([5, 6, 7]),
+                                                                    numpy.zeros(1, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int32))
+        #the repeated row of author 2 collaborates again at its own date
+        self.assertEqual(zip(author1.tolist(), author2.tolist(), date.tolist()), [(1, 2, 6), (1, 2, 7)])
+
+    def test_pairs_with_existing_links(self):
+        #paper 0 has author 3 already
+        index = bipartite_index.BipartiteIndex.from_pairs([0], [3])
+        paper_ptr, paper_authors = index.paper_csr()
+        author1, author2, date = collab_builder.collaboration_pairs(numpy.array([0, 1]), numpy.array([1, 1]), numpy.array([4, 4]),
+                                                                    paper_ptr, paper_authors)
+        self.assertEqual(zip(author1.tolist(), author2.tolist(), date.tolist()), [(1, 3, 4)])
+
+
+class MergeCollaborationsTest(unittest.TestCase):
+
+    def test_against_row_by_row(self):
+        for seed in range(300):
+            rng = random.Random(seed)
+            n_papers, n_authors = rng.randint(1, 6), rng.randint(2, 9)
+            rows = [(rng.randrange(n_papers), rng.randrange(n_authors), rng.randint(1, 7)) for i in range(rng.randint(0, 30))]
+            chunk_sizes = [rng.randint(1, 8) for i in range(len(rows))]
+            edges, table_keys, table_dates = in_chunks(rows, chunk_sizes)
+            self.assertEqual(edges, row_by_row(rows), 'seed %d' % seed)
+            #the table stays sorted by key and date
+            order = numpy.lexsort((table_dates, table_keys))
+            self.assertEqual(order.tolist(), range(len(order)))
+
+    def test_one_chunk_equals_single_rows(self):
+        rng = random.Random(1)
+        rows = [(rng.randrange(4), rng.randrange(6), rng.randint(1, 5)) for i in range(40)]
+        self.assertEqual(in_chunks(rows, [len(rows)])[0], in_chunks(rows, [1] * len(rows))[0])
+
+    def test_earlier_date_lowers_first_collaboration(self):
+        edges = in_chunks([(0, 0, 5), (0, 1, 5), (1, 0, 3), (1, 1, 3)], [2, 2])[0]
+        self.assertEqual(edges, [(0, 1, 3, 3), (0, 1, 5, 3)])
+
+
+if __name__ == '__main__':
+    unittest.main()
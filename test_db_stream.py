@@ -0,0 +1,101 @@
+#!/usr/bin/python
+
+##Author: Rene Pfitzner
+##Updates: Vahan Nanumyan
+
+#Tests of the streaming SQL reads against stand-in DB-API connections, run with python -m unittest test_db_stream
+
+import unittest
+
+import db_stream
+
+
+class FakeCursor():
+    'DB-API cursor over a list of rows'
+
+    def __init__(self, rows, name=None):
+        self.rows = rows
+        self.name = name
+        self.position = 0
+        self.executed = None
+        self.closed = False
+        self.fetch_sizes = []
+
+    def execute(self, sql):
+        self.executed = sql
+
+    def fetchmany(self, size):
+        self.fetch_sizes.append(size)
+        rows = self.rows[self.position:self.position+size]
+        self.position += len(rows)
+        return rows
+
+    def close(self):
+        self.closed = True
+
+
+class PlainConnection():
+    'Connection of a DB-API module without named cursors'
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.cursors = []
+        self.closed = False
+
+    def cursor(self):
+        self.cursors.append(FakeCursor(self.rows))
+        return self.cursors[-1]
+
+    def close(self):
+        self.closed = True
+
+
+class NamedCursorConnection(PlainConnection):
+    'Connection supporting named (server side) cursors, as psycopg2'
+
+    def cursor(self, name=None):
+        self.cursors.append(FakeCursor(self.rows, name))
+        return self.cursors[-1]
+
+
+class FetchBatchesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [('p%d' % i, 'a%d' % (i % 3), 2000 + i % 5) for i in range(23)]
+
+    def check_batches(self, connection):
+        batches = list(db_stream.fetch_batches(connection, 'SELECT 1', batch_size=5))
+        self.assertEqual([len(batch) for batch in batches], [5, 5, 5, 5, 3])
+        self.assertEqual([row for batch in batches for row in batch], self.rows)
+        cursor = connection.cursors[-1]
+        self.assertEqual(cursor.executed, 'SELECT 1')
+        self.assertTrue(all(size == 5 for size in cursor.fetch_sizes))
+        self.assertTrue(cursor.closed)
+        #connections opened by the caller stay open
+        self.assertFalse(connection.closed)
+        return cursor
+
+    def test_plain_cursor(self):
+        cursor = self.check_batches(PlainConnection(self.rows))
+        self.assertEqual(cursor.name, None)
+
+    def test_named_cursor(self):
+        cursor = self.check_batches(NamedCursorConnection(self.rows))
+        self.assertTrue(cursor.name.startswith('scientometric_stream_'))
+        self.assertEqual(cursor.itersize, 5)
+
+    def test_empty_result(self):
+        connection = NamedCursorConnection([])
+        self.assertEqual(list(db_stream.fetch_batches(connection, 'SELECT 1', batch_size=5)), [])
+        self.assertTrue(connection.cursors[-1].closed)
+
+    def test_cursor_closed_when_stopped_early(self):
+        connection = PlainConnection(self.rows)
+        batches = db_stream.fetch_batches(connection, 'SELECT 1', batch_size=5)
+        self.assertEqual(next(batches), self.rows[:5])
+        batches.close()
+        self.assertTrue(connection.cursors[-1].closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+#!/usr/bin/python
+
+##Author: Rene Pfitzner
+##Updates: Vahan Nanumyan
+
+#Tests of the id tables, run with python -m unittest test_id_table
+
+import unittest
+
+import id_table
+
+
+class InternTableTest(unittest.TestCase):
+
+    def test_intern_table_from_dictionary(self):
+        table = id_table.intern_table({'a': 0, 'b': 1})
+        self.assertEqual(table.strings(), ['a', 'b'])
+        self.assertEqual(table.index('b'), 1)
+
+    def test_intern_table_with_gaps(self):
+        #legacy pickles of vertices created without dictionary entry
+        table = id_table.intern_table({'a': 0, 'b': 2})
+        self.assertEqual(table.strings(), ['a', '', 'b'])
+        self.assertEqual(table.index('a'), 0)
+        self.assertEqual(table.index('b'), 2)
+
+    def test_intern_table_gaps_from_vertex_ids(self):
+        table = id_table.intern_table({'a': 0, 'b': 2}, ['a', 'orphan', 'b', 'last'])
+        self.assertEqual(table.strings(), ['a', 'orphan', 'b', 'last'])
+        self.assertEqual(table.index('orphan'), 1)
+        self.assertEqual(table.index('last'), 3)
+
+    def test_intern_table_from_list(self):
+        table = id_table.intern_table(['a', 'b', u'c'])
+        self.assertEqual(table.strings(), ['a', 'b', 'c'])
+        self.assertEqual(table.index('c'), 2)
+
+    def test_intern_table_from_table(self):
+        table = id_table.InternTable.from_strings(['a'])
+        self.assertTrue(id_table.intern_table(table) is table)
+
+    def test_intern_table_empty(self):
+        self.assertEqual(len(id_table.intern_table({})), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
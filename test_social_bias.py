@@ -0,0 +1,91 @@
+#!/usr/bin/python
+
+##Author: Rene Pfitzner
+##Updates: Vahan Nanumyan
+
+#Tests of the array based social bias counts against the loop over papers they replace, run with python -m unittest test_social_bias
+
+import random
+import unittest
+
+import numpy
+
+import bipartite_index
+import social_bias
+
+
+def loop_counts(n_papers, links, collaborations, citations, paper_year):
+    '''Counts of the original loop of socially_biased_citations(): links (paper, author), collaborations (author, author, first date), citations (cited, citing).'''
+    authors_of = dict((p, set()) for p in range(n_papers))
+    for p, a in links:
+        authors_of[p].add(a)
+    neighbours = {}
+    for a, b, first in collaborations:
+        neighbours.setdefault(a, {})[b] = min(first, neighbours.get(a, {}).get(b, first))
+        neighbours.setdefault(b, {})[a] = min(first, neighbours.get(b, {}).get(a, first))
+    counts = []
+    for paper in range(n_papers):
+        authors = authors_of[paper]
+        earlier_collaborators = set(n for a in authors for n, first in neighbours.get(a, {}).items() if first < paper_year[paper])
+        n_citations, n_self, n_biased = 0, 0, 0
+        for cited, citing in citations:
+            if cited != paper:
+                continue
+            n_citations += 1
+            if authors & authors_of[citing]:
+                n_self += 1
+            elif (earlier_collaborators & authors_of[citing]) - authors:
+                n_biased += 1
+        counts.append([n_citations, n_self, n_biased])
+    return counts
+
+
+def random_instance(seed):
+    rng = random.Random(seed)
+    n_papers = rng.randint(1, 12)
+    n_authors = rng.randint(1, 8)
+    links = [(rng.randrange(n_papers), rng.randrange(n_authors)) for i in range(rng.randint(0, 20))]
+    collaborations = [(rng.randrange(n_authors), rng.randrange(n_authors), rng.randint(1, 6)) for i in range(rng.randint(0, 12))]
+    collaborations = [c for c in collaborations if c[0] != c[1]]
+    citations = list(set((rng.randrange(n_papers), rng.randrange(n_papers)) for i in range(rng.randint(0, 25))))
+    paper_year = [rng.randint(1, 6) for i in range(n_papers)]
+    return n_papers, n_authors, links, collaborations, citations, paper_year
+
+
+def array_counts(n_papers, n_authors, links, collaborations, citations, paper_year, processes=1, chunk_size=3):
+    index = bipartite_index.BipartiteIndex.from_pairs([p for p, a in links], [a for p, a in links], n_papers, n_authors)
+    paper_ptr, paper_authors = index.paper_csr(n_papers)
+    collab_ptr, collab_nbr, collab_first = social_bias.collaborators([c[0] for c in collaborations], [c[1] for c in collaborations],
+                                                                     [c[2] for c in collaborations], n_authors)
+    cite_ptr, cite_tgt = social_bias.citations([c[0] for c in citations], [c[1] for c in citations], n_papers)
+    classes = social_bias.classify_citations(paper_ptr, paper_authors, collab_ptr, collab_nbr, collab_first, cite_ptr, cite_tgt,
+                                             paper_year, processes=processes, chunk_size=chunk_size)
+    n_citations, n_self, n_biased = social_bias.count_citations(cite_ptr, classes)
+    return numpy.column_stack((n_citations, n_self, n_biased)).tolist()
+
+
+class ClassifyCitationsTest(unittest.TestCase):
+
+    def test_against_loop(self):
+        for seed in range(200):
+            instance = random_instance(seed)
+            self.assertEqual(array_counts(*instance), loop_counts(instance[0], *instance[2:]), 'seed %d' % seed)
+
+    def test_self_citation_is_not_biased(self):
+        #papers 0 and 1 share author 0, author 1 of paper 1 collaborated with author 0 before
+        instance = (2, 2, [(0, 0), (1, 0), (1, 1)], [(0, 1, 1)], [(0, 1)], [5, 6])
+        self.assertEqual(array_counts(*instance), [[1, 1, 0], [0, 0, 0]])
+
+    def test_collaboration_after_publication(self):
+        instance = (2, 2, [(0, 0), (1, 1)], [(0, 1, 5)], [(0, 1)], [5, 6])
+        self.assertEqual(array_counts(*instance), [[1, 0, 0], [0, 0, 0]])
+        instance = (2, 2, [(0, 0), (1, 1)], [(0, 1, 4)], [(0, 1)], [5, 6])
+        self.assertEqual(array_counts(*instance), [[1, 0, 1], [0, 0, 0]])
+
+    def test_worker_processes(self):
+        instance = random_instance(7)
+        self.assertEqual(array_counts(*instance, processes=2, chunk_size=1), loop_counts(instance[0], *instance[2:]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/python
+
+##Author: Rene Pfitzner
+##Updates: Vahan Nanumyan
+
+#This module implements time sliced views of the paper-author multiplex.
+#A view of the window [first, last] (day ordinals) shows
+#   - the papers published and the citations made in the window,
+#   - the authors appearing up to the end of the window and the collaborations made in the window,
+#   - the paper-author links between the shown papers and authors.
+#The layers are graph-tool GraphViews with boolean vertex and edge filters, the shared graphs are never filtered,
+#so that views of several windows can be used at the same time. The filters are computed from the date arrays
+#and kept in a small LRU cache keyed by the window.
+
+import collections
+import graph_tool.all as gt
+import numpy
+
+import bipartite_index
+import dates
+
+
+################################################################
+## Least recently used cache
+class LRUCache():
+    'Dictionary keeping the maxsize most recently used entries'
+
+    def __init__(self,maxsize=16):
+        self.maxsize=int(maxsize)
+        self._entries=collections.OrderedDict()
+
+    def get(self,key):
+        '''Returns the entry of key, None if there is none.'''
+        try:
+            value=self._entries.pop(key)
+        except KeyError:
+            return None
+        self._entries[key]=value
+        return value
+
+    def put(self,key,value):
+        self._entries.pop(key,None)
+        self._entries[key]=value
+        while len(self._entries)>self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+################################################################
+## View of a time window
+class MultiplexView():
+    'Time sliced view of a paper-author multiplex: GraphViews of both layers and the paper-author links among their vertices'
+
+    def __init__(self,first,last,citation,collab,multiplex):
+        self.first=first
+        self.last=last
+        self.citation=citation
+        self.collab=collab
+        self._multiplex=multiplex
+
+    def authors_of(self,paper):
+        '''Returns an int32 array of the authors (vertex indices) of paper shown in the view.'''
+        return self._multiplex.authors_of(paper)
+
+    def papers_of(self,author):
+        '''Returns an int32 array of the papers (vertex indices) of author shown in the view.'''
+        return self._multiplex.papers_of(author)
+
+    def paper_csr(self):
+        '''Returns the paper->authors CSR arrays of the links shown in the view.'''
+        return self._multiplex.paper_csr()
+
+    def author_csr(self):
+        '''Returns the author->papers CSR arrays of the links shown in the view.'''
+        return self._multiplex.author_csr()
+
+
+################################################################
+## Function to compute the filters of a window
+def window_filters(multiplex,first,last):
+    '''
+    Returns the filters of the window [first, last] (day ordinals) of the PaperAuthorMultiplex multiplex:
+    boolean property maps (papers, citations, authors, collaborations) and the BipartiteIndex of the links among the shown vertices.
+    '''
+    citation=multiplex.citation
+    collab=multiplex.collab
+
+    papers=citation.new_vertex_property('bool')
+    papers.a=dates.in_window(citation.vertex_properties['year'].a,first,last)
+    citations=citation.new_edge_property('bool')
+    citations.a=dates.in_window(citation.edge_properties['year'].a,first,last)
+    authors=collab.new_vertex_property('bool')
+    authors.a=dates.in_window(collab.vertex_properties['year'].a,dates.UNKNOWN_DATE+1,last)
+    collaborations=collab.new_edge_property('bool')
+    if multiplex._collab_timeline is not None:
+        collaborations.a=multiplex._collab_timeline.edge_mask(first,last,collab.edge_index_range)
+    else:
+        collaborations.a=dates.in_window(collab.edge_properties['year'].a,first,last)
+
+    links=restrict_links(multiplex._multiplex,papers.a.astype(bool),authors.a.astype(bool))
+    return papers,citations,authors,collaborations,links
+
+
+################################################################
+## Function to restrict the paper-author links to vertex subsets
+def restrict_links(index,paper_mask,author_mask):
+    '''Returns a BipartiteIndex of the links of index between the papers and authors marked in paper_mask and author_mask.'''
+    paper_ptr,paper_authors=index.paper_csr(len(paper_mask))
+    author_ptr,author_papers=index.author_csr(len(author_mask))
+
+    def restrict(ptr,entries,row_mask,entry_mask):
+        rows=numpy.repeat(numpy.arange(len(ptr)-1,dtype=numpy.int64),numpy.diff(ptr))
+        keep=row_mask[rows]&entry_mask[entries]
+        new_ptr=numpy.zeros(len(ptr),dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(rows[keep],minlength=len(ptr)-1),out=new_ptr[1:])
+        return new_ptr,entries[keep]
+
+    paper_ptr,paper_authors=restrict(paper_ptr,paper_authors,paper_mask,author_mask)
+    author_ptr,author_papers=restrict(author_ptr,author_papers,author_mask,paper_mask)
+    return bipartite_index.BipartiteIndex.from_csr(paper_ptr,paper_authors,author_ptr,author_papers)
+
+
+################################################################
+## Function to create the view of a window
+def view(multiplex,first,last,filters):
+    '''Returns the MultiplexView of the window [first, last] of multiplex with the filters returned by window_filters.'''
+    papers,citations,authors,collaborations,links=filters
+    return MultiplexView(first,last,
+                         gt.GraphView(multiplex.citation,vfilt=papers,efilt=citations),
+                         gt.GraphView(multiplex.collab,vfilt=authors,efilt=collaborations),
+                         links)